@@ -1,7 +1,14 @@
-from typing import Callable
+from typing import Awaitable, Callable, Optional
 
-from app.domain.errors import InvalidActivationCode, InvalidCredentials
+from app.application.utils import maybe_await
+from app.domain.errors import (
+    InvalidActivationCode,
+    InvalidCredentials,
+    InvalidStatusTransition,
+    TooManyAttempts,
+)
 from app.domain.ports.activation_cache import ActivationCachePort
+from app.domain.ports.profile_invalidation import ProfileInvalidationPort
 from app.domain.ports.unit_of_work import UnitOfWorkPort
 
 
@@ -11,21 +18,58 @@ async def activate_user(
     email: str,
     password: str,
     code: str,
-    verify_password: Callable[[str, str], bool],
+    verify_password: Callable[[str, str], bool | Awaitable[bool]],
+    max_code_attempts: int = 5,
+    profile_invalidation: Optional[ProfileInvalidationPort] = None,
 ) -> None:
+    """
+    Optimistic activation: no row lock is held across bcrypt and Redis.
+
+    1. plain read of the user + hash
+    2. code check in Redis (counts wrong guesses, burns the code at
+       `max_code_attempts`), so a wrong code never costs a bcrypt verify
+    3. password check, then consume the code, outside any transaction
+    4. one conditional UPDATE ... WHERE status = 'pending'; if it matches no row,
+       a concurrent request already changed the status.
+
+    Because the code is checked first, a right code with a wrong password
+    raises InvalidCredentials where a wrong code raises InvalidActivationCode:
+    callers must answer both the same way, or the difference confirms a code
+    guessed without the password.
+
+    After each committed user write, cached `/me` profiles of the user are
+    invalidated (`profile_invalidation`).
+    """
     normalized_email = email.strip().lower()
 
     async with uow as transaction:
-        record = await transaction.db_users.get_by_email_with_hash_for_update(
-            normalized_email
-        )
-        if not record:
-            raise InvalidCredentials()
-        user, password_hash = record
-        if not verify_password(password, password_hash):
-            raise InvalidCredentials()
-        if not await activation_cache.verify_and_consume(user.id, code):
-            raise InvalidActivationCode()
-        user.activate()
-        await transaction.db_users.set_active(user.id)
+        record = await transaction.db_users.get_by_email_with_hash(normalized_email)
+        # ends the read without a rollback, which would drop prepared statements
+        await transaction.commit()
+    if not record:
+        raise InvalidCredentials()
+    user, password_hash = record
+
+    check = await activation_cache.check_code(user.id, code, max_code_attempts)
+    if check == "exhausted":
+        async with uow as transaction:
+            await transaction.db_users.add_failed_attempts(user.id, max_code_attempts)
+            await transaction.commit()
+        if profile_invalidation is not None:
+            await profile_invalidation.invalidate(user.id)
+        raise TooManyAttempts()
+    if check != "match":
+        raise InvalidActivationCode()
+
+    if not await maybe_await(verify_password(password, password_hash)):
+        raise InvalidCredentials()
+    if not await activation_cache.verify_and_consume(user.id, code):
+        raise InvalidActivationCode()
+    user.activate()
+
+    async with uow as transaction:
+        if not await transaction.db_users.activate_if_pending(user.id):
+            raise InvalidStatusTransition()
         await transaction.commit()
+    if profile_invalidation is not None:
+        await profile_invalidation.invalidate(user.id)
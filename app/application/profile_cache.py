@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from app.domain.entities import User
+
+
+@dataclass(frozen=True)
+class ProfileCacheStats:
+    size: int
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    invalidations: int
+
+
+class ProfileCache:
+    """
+    Bounded, process-local LRU of the `/me` projection (id, email, status).
+
+    - Entries expire `ttl_seconds` after they were filled, which also bounds
+      staleness if an invalidation message is missed.
+    - Past `max_entries`, the least recently used entry is evicted.
+    - A reader captures `version` before loading from the DB and passes it to
+      `put`; if anything was invalidated meanwhile the fill is dropped, so a
+      slow read can't re-cache a value an invalidation just removed.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = 10_000,
+        ttl_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+        self._max_entries = max_entries
+        self._ttl = ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, User]] = OrderedDict()
+        self._version = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self, user_id: str) -> Optional[User]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self._misses += 1
+            return None
+        expires_at, user = entry
+        if expires_at <= self._clock():
+            del self._entries[user_id]
+            self._expirations += 1
+            self._misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self._hits += 1
+        # callers get their own copy; the cached one is never mutated
+        return User(id=user.id, email=user.email, status=user.status)
+
+    def put(self, user: User, *, version: int) -> bool:
+        if version != self._version or user.id is None:
+            return False
+        projection = User(id=user.id, email=user.email, status=user.status)
+        self._entries[user.id] = (self._clock() + self._ttl, projection)
+        self._entries.move_to_end(user.id)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+        return True
+
+    def invalidate(self, user_id: str) -> None:
+        self._version += 1
+        self._invalidations += 1
+        self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._version += 1
+        self._entries.clear()
+
+    def stats(self) -> ProfileCacheStats:
+        return ProfileCacheStats(
+            size=len(self._entries),
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            expirations=self._expirations,
+            invalidations=self._invalidations,
+        )
@@ -1,40 +1,208 @@
-from datetime import datetime, timezone
-from typing import Callable
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
 
 import app.domain.services as domain_services
+from app.application.single_flight import SingleFlight
+from app.application.utils import maybe_await
 from app.domain.ports.activation_cache import ActivationCachePort
+from app.domain.ports.resend_throttle import ResendThrottlePort
 from app.domain.ports.unit_of_work import UnitOfWorkPort
 
+logger = logging.getLogger("app.application.register_user")
+
+VERIFICATION_TOPIC = "user.verification_code"
+
 
 async def register_user(
     uow: UnitOfWorkPort,
     activation_cache: ActivationCachePort,
     email: str,
     password: str,
-    hash_password: Callable[..., str],
+    hash_password: Callable[..., str | Awaitable[str]],
     code_ttl_seconds: int = 60,
+    fused_write: bool = False,
+    code_secret: str | None = None,
+    resend_throttle: ResendThrottlePort | None = None,
+    resend_throttle_seconds: int = 60,
+    single_flight: SingleFlight | None = None,
+    idempotency_key: str | None = None,
 ) -> None:
+    """
+    The activation digest is stored in Redis *before* the transaction, keyed by
+    the id the row will have, so the pooled connection is only held for SQL. A
+    short lookup finds the id of an already registered email (the row keeps
+    it); a new email gets an id generated here and used for the INSERT. If Redis
+    fails, nothing was written to Postgres; if Postgres fails, the orphan Redis
+    key just expires. Only when the email was registered concurrently since the
+    lookup is the digest stored again, under that id, inside the transaction,
+    so an email is never committed for a code Redis doesn't have.
+
+    With `code_secret`, the code is stored as a keyed digest bound to the user id
+    (no salt), which the cache can check in a single round trip.
+
+    With `resend_throttle`, a repeat registration of the same email within
+    `resend_throttle_seconds` returns right away: no bcrypt, no SQL write, no
+    new email. If the throttle can't be reached, `last_code_sent_at` decides.
+
+    With `single_flight`, concurrent registrations of one email share one
+    execution and its outcome: the leader's password is the one stored, as it
+    would be had it won the upsert race. The key is the email alone, so no
+    password-derived value reaches the (possibly Redis-held) lock key.
+
+    `idempotency_key` is stored on the outbox row: a registration whose key is
+    already there was done before and is not repeated (no new code, no email).
+    """
     normalized_email = email.strip().lower()
-    hashed_password = hash_password(password)
+
+    async def run() -> None:
+        throttled = False
+        if resend_throttle is not None and resend_throttle_seconds > 0:
+            try:
+                if not await resend_throttle.try_acquire(
+                    normalized_email, resend_throttle_seconds
+                ):
+                    return
+                throttled = True
+            except Exception:
+                logger.warning("resend throttle unavailable, using last_code_sent_at")
+                if await _code_sent_recently(
+                    uow, normalized_email, resend_throttle_seconds
+                ):
+                    return
+
+        try:
+            await _register(
+                uow,
+                activation_cache,
+                normalized_email,
+                password,
+                hash_password,
+                code_ttl_seconds,
+                fused_write,
+                code_secret,
+                idempotency_key,
+            )
+        except BaseException:
+            if throttled:
+                # let the client retry right away
+                try:
+                    await resend_throttle.release(normalized_email)
+                except Exception:
+                    logger.warning("could not release resend throttle")
+            raise
+
+    if single_flight is None:
+        await run()
+        return
+    await single_flight.do("register:" + normalized_email, run)
+
+
+async def _code_sent_recently(
+    uow: UnitOfWorkPort, normalized_email: str, window_seconds: int
+) -> bool:
+    async with uow as transaction:
+        record = await transaction.db_users.get_by_email_with_hash(normalized_email)
+        await transaction.commit()
+    if not record or record[0].last_code_sent_at is None:
+        return False
+    elapsed = datetime.now(timezone.utc) - record[0].last_code_sent_at
+    return elapsed < timedelta(seconds=window_seconds)
+
+
+async def _prior_registration(
+    uow: UnitOfWorkPort, normalized_email: str, idempotency_key: str | None
+) -> tuple[bool, str | None]:
+    """-> (whether `idempotency_key` was already done, id of the email's row)"""
+    async with uow as transaction:
+        done, record = False, None
+        if idempotency_key:
+            done = await transaction.outbox.has_idempotency_key(idempotency_key)
+        if not done:
+            record = await transaction.db_users.get_by_email_with_hash(normalized_email)
+        await transaction.commit()
+    return done, record[0].id if record else None
+
+
+async def _register(
+    uow: UnitOfWorkPort,
+    activation_cache: ActivationCachePort,
+    normalized_email: str,
+    password: str,
+    hash_password: Callable[..., str | Awaitable[str]],
+    code_ttl_seconds: int,
+    fused_write: bool,
+    code_secret: str | None,
+    idempotency_key: str | None,
+) -> None:
+    done, registered_id = await _prior_registration(
+        uow, normalized_email, idempotency_key
+    )
+    if done:
+        # keep the code that was emailed then
+        return
+
+    hashed_password = await maybe_await(hash_password(password))
     generated_code = domain_services.generate_4digit_code()
     salt_b64, digest_b64 = domain_services.make_code_digest(generated_code)
 
-    async with uow as transaction:
-        user = await transaction.db_users.create_or_update_pending(
-            normalized_email, hashed_password
-        )
-        await activation_cache.store_hashed_code(
-            user.id, salt_b64, digest_b64, code_ttl_seconds
-        )
-        await transaction.outbox.enqueue(
-            topic="user.verification_code",
-            payload={
-                "to": normalized_email,
-                "subject": "Your verification code",
-                "body": "Your code is " + generated_code,
-            },
-        )
-        await transaction.db_users.set_last_code_sent_at(
-            user.id, datetime.now(timezone.utc)
+    def code_digest(user_id: str) -> tuple[str, str]:
+        if not code_secret:
+            return salt_b64, digest_b64
+        keyed = domain_services.make_keyed_code_digest(
+            generated_code, user_id, code_secret
         )
+        return "", keyed
+
+    payload = {
+        "to": normalized_email,
+        "subject": "Your verification code",
+        "body": "Your code is " + generated_code,
+    }
+
+    user_id = registered_id or str(uuid.uuid4())
+    await activation_cache.store_hashed_code(
+        user_id, *code_digest(user_id), code_ttl_seconds
+    )
+
+    async with uow as transaction:
+        if idempotency_key and await transaction.outbox.has_idempotency_key(
+            idempotency_key
+        ):
+            # done concurrently since the lookup
+            return
+
+        if fused_write:
+            # upsert + last_code_sent_at + outbox row in one round trip
+            user = await transaction.db_users.create_or_update_pending_with_outbox(
+                normalized_email,
+                hashed_password,
+                user_id=user_id,
+                sent_at=datetime.now(timezone.utc),
+                topic=VERIFICATION_TOPIC,
+                payload=payload,
+                idempotency_key=idempotency_key,
+            )
+        else:
+            user = await transaction.db_users.create_or_update_pending(
+                normalized_email, hashed_password, user_id=user_id
+            )
+            # no row needed back: in pipeline mode this is queued and flushed
+            # together with the enqueue below
+            await transaction.db_users.set_last_code_sent_at(
+                user.id, datetime.now(timezone.utc)
+            )
+            await transaction.outbox.enqueue(
+                topic=VERIFICATION_TOPIC,
+                payload=payload,
+                idempotency_key=idempotency_key,
+            )
+
+        if user.id != user_id:
+            # registered concurrently since the lookup: the code must live
+            # under that id
+            await activation_cache.store_hashed_code(
+                user.id, *code_digest(user.id), code_ttl_seconds
+            )
         await transaction.commit()
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from app.domain.ports.distributed_lock import DistributedLockPort
+
+logger = logging.getLogger("app.application.single_flight")
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class SingleFlightStats:
+    in_flight: int
+    executed: int
+    coalesced: int
+    remote_coalesced: int
+    lock_timeouts: int
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the
+    function, callers arriving while it runs await the same outcome (result or
+    exception) instead of running it again.
+
+    With `lock`, the leader also takes a distributed lock on the key, so a call
+    already running in another process is not repeated either. A caller that
+    finds the lock held waits for its release and returns `None`: it only learns
+    that the other process finished, not its outcome. If the lock is not released
+    within `lock_wait_seconds`, the call runs anyway.
+    """
+
+    def __init__(
+        self,
+        *,
+        lock: Optional[DistributedLockPort] = None,
+        lock_ttl_seconds: float = 10.0,
+        lock_wait_seconds: float = 5.0,
+    ) -> None:
+        self._lock = lock
+        self._lock_ttl = lock_ttl_seconds
+        self._lock_wait = lock_wait_seconds
+        self._calls: dict[str, asyncio.Future] = {}
+
+        self._executed = 0
+        self._coalesced = 0
+        self._remote_coalesced = 0
+        self._lock_timeouts = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> Optional[T]:
+        call = self._calls.get(key)
+        if call is not None:
+            self._coalesced += 1
+            # shield: a follower giving up must not cancel the shared call
+            return await asyncio.shield(call)
+
+        call = asyncio.get_running_loop().create_future()
+        self._calls[key] = call
+        try:
+            result = await self._run(key, fn)
+        except BaseException as exc:
+            if isinstance(exc, asyncio.CancelledError):
+                call.cancel()
+            else:
+                call.set_exception(exc)
+                call.exception()  # retrieved: no warning when nobody waited
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[T]]) -> Optional[T]:
+        if self._lock is None:
+            self._executed += 1
+            return await fn()
+
+        token = await self._lock.acquire(key, self._lock_ttl)
+        if token is None:
+            if await self._lock.wait_released(key, self._lock_wait):
+                self._remote_coalesced += 1
+                return None
+            self._lock_timeouts += 1
+            logger.warning("single-flight lock wait timed out, running anyway")
+
+        self._executed += 1
+        try:
+            return await fn()
+        finally:
+            if token is not None:
+                try:
+                    await self._lock.release(key, token)
+                except Exception:
+                    # expires on its own after lock_ttl_seconds
+                    logger.warning("could not release single-flight lock")
+
+    def stats(self) -> SingleFlightStats:
+        return SingleFlightStats(
+            in_flight=len(self._calls),
+            executed=self._executed,
+            coalesced=self._coalesced,
+            remote_coalesced=self._remote_coalesced,
+            lock_timeouts=self._lock_timeouts,
+        )
@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+import inspect
+from typing import Awaitable, TypeVar
+
+T = TypeVar("T")
+
+
+async def maybe_await(value: T | Awaitable[T]) -> T:
+    """
+    Let use-cases accept both sync callables and async ones
+    (e.g. the pooled AsyncPasswordHasher) for the same dependency.
+    """
+    if inspect.isawaitable(value):
+        return await value
+    return value
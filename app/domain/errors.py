@@ -38,3 +38,9 @@ class InvalidActivationCode(DomainError):
     """Invalid activation code."""
 
     pass
+
+
+class TooManyAttempts(DomainError):
+    """Too many wrong activation codes; the code was burned."""
+
+    pass
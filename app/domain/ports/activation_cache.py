@@ -1,4 +1,10 @@
-from typing import Protocol
+from typing import Literal, Protocol
+
+# Outcome of a non-consuming code check:
+# - "match": code is right (still stored)
+# - "mismatch": wrong or missing code, attempt counted
+# - "exhausted": this attempt hit the limit and the code was burned
+CodeCheck = Literal["match", "mismatch", "exhausted"]
 
 
 class ActivationCachePort(Protocol):
@@ -7,6 +13,12 @@ class ActivationCachePort(Protocol):
     ) -> None:
         """Store/replace the hashed code with TTL=ttl_seconds."""
 
+    async def check_code(self, user_id: str, code: str, max_attempts: int) -> CodeCheck:
+        """
+        Compare without consuming. Every mismatch is counted atomically with the
+        code; the one reaching max_attempts deletes it.
+        """
+
     async def verify_and_consume(self, user_id: str, code: str) -> bool:
         """True if matches (and then delete it for single-use), else False."""
 
@@ -0,0 +1,12 @@
+from typing import Protocol
+
+
+class DistributedLockPort(Protocol):
+    async def acquire(self, key: str, ttl_seconds: float) -> str | None:
+        """Take the lock for at most ttl_seconds; return its token, or None if held."""
+
+    async def release(self, key: str, token: str) -> None:
+        """Release the lock, only if it is still held with this token."""
+
+    async def wait_released(self, key: str, timeout_seconds: float) -> bool:
+        """Wait until nobody holds the lock; False on timeout."""
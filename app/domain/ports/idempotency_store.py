@@ -0,0 +1,25 @@
+from dataclasses import dataclass
+from typing import Any, Optional, Protocol
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    # None while the first request with the key is still running
+    status_code: Optional[int]
+    body: Any = None
+
+
+class IdempotencyStorePort(Protocol):
+    async def reserve(self, key: str, ttl_seconds: int) -> Optional[StoredResponse]:
+        """
+        Claim key for a new request. Return None if claimed, else what is stored
+        under it (the response to replay, or an in-progress marker).
+        """
+
+    async def complete(
+        self, key: str, status_code: int, body: Any, ttl_seconds: int
+    ) -> None:
+        """Store the response of the request that claimed key."""
+
+    async def release(self, key: str) -> None:
+        """Drop the claim (the request failed; a retry should run again)."""
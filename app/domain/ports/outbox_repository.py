@@ -8,6 +8,12 @@ class OutboxRepositoryPort(Protocol):
     ) -> str:
         """
         Enqueue a message into the outbox with status='pending'.
+        A message with the same idempotency_key is not enqueued twice.
+        """
+
+    async def has_idempotency_key(self, idempotency_key: str) -> bool:
+        """
+        True if a message with this idempotency_key was already enqueued.
         """
 
     async def reserve_due(self, limit: int = 10) -> list[dict[str, Any]]:
@@ -25,6 +31,6 @@ class OutboxRepositoryPort(Protocol):
         self, msg_id: str, error: str, retry_in_seconds: int | None
     ) -> None:
         """
-        On failure, either schedule a retry (status back to 'pending' with next_attempt_at),
+        On failure, either schedule a retry (status back to 'pending' with available_at),
         or mark permanently 'failed' if retry_in_seconds is None.
         """
@@ -0,0 +1,6 @@
+from typing import Protocol
+
+
+class ProfileInvalidationPort(Protocol):
+    async def invalidate(self, user_id: str) -> None:
+        """Drop cached copies of the user's profile (API processes, sessions)."""
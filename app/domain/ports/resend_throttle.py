@@ -0,0 +1,9 @@
+from typing import Protocol
+
+
+class ResendThrottlePort(Protocol):
+    async def try_acquire(self, email: str, ttl_seconds: int) -> bool:
+        """Open a throttle window for email; False if one is already open."""
+
+    async def release(self, email: str) -> None:
+        """Close the window early (e.g. the registration that opened it failed)."""
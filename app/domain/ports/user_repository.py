@@ -7,14 +7,33 @@ from app.domain.entities import User
 
 
 class UserRepositoryPort(Protocol):
-    async def create_or_update_pending(self, email: str, password_hash: str) -> User:
+    async def create_or_update_pending(
+        self, email: str, password_hash: str, *, user_id: str | None = None
+    ) -> User:
         """
-        Create user as 'pending' if not exists.
+        Create user as 'pending' if not exists (with `user_id` if given).
         If exists and status == 'pending', update password_hash.
         If exists and status == 'active', leave unchanged.
         Return the current User record in all cases.
         """
 
+    async def create_or_update_pending_with_outbox(
+        self,
+        email: str,
+        password_hash: str,
+        *,
+        user_id: str | None = None,
+        sent_at: datetime,
+        topic: str,
+        payload: dict,
+        idempotency_key: str | None = None,
+    ) -> User:
+        """
+        Same as create_or_update_pending(), plus set_last_code_sent_at(sent_at)
+        and an outbox enqueue of (topic, payload, idempotency_key), in a single
+        round trip. Return the current User record in all cases.
+        """
+
     async def get_by_email_for_update(self, email: str) -> Optional[User]:
         """
         Fetch user by email and lock the row for update (transaction-scoped).
@@ -24,9 +43,24 @@ class UserRepositoryPort(Protocol):
     async def set_active(self, user_id: str) -> None:
         """Mark user as active."""
 
+    async def activate_if_pending(self, user_id: str) -> bool:
+        """
+        Mark user as active only if still 'pending' (single conditional UPDATE).
+        Return False if the status was changed by someone else in the meantime.
+        """
+
+    async def add_failed_attempts(self, user_id: str, count: int) -> None:
+        """Increment the user's failed_attempts counter by count."""
+
     async def set_last_code_sent_at(self, user_id: str, when: datetime) -> None:
         """Update last_code_sent_at for observability."""
 
+    async def get_by_email_with_hash(self, email: str) -> tuple[User, str] | None:
+        """
+        Fetch user by email with the password hash, without locking.
+        Return None if not found.
+        """
+
     async def get_by_email_with_hash_for_update(
         self, email: str
     ) -> tuple[User, str] | None:
@@ -44,6 +44,19 @@ def make_code_digest(code: str) -> tuple[str, str]:
     )
 
 
+def make_keyed_code_digest(code: str, user_id: str, secret: str) -> str:
+    """
+    Return digest_b64 where digest = HMAC-SHA256(secret, user_id || ":" || code).
+
+    There is no per-code salt: whoever holds the secret can compute the expected
+    digest from (user_id, code) alone, without reading anything from storage first.
+    """
+    mac = hmac.new(
+        secret.encode("utf-8"), f"{user_id}:{code}".encode("utf-8"), hashlib.sha256
+    )
+    return base64.b64encode(mac.digest()).decode("utf-8")
+
+
 def verify_code_digest(code: str, salt_b64: str, digest_b64: str) -> bool:
     """
     Verify code against (salt_b64, digest_b64) from make_code_digest().
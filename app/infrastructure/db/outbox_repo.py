@@ -9,6 +9,7 @@ from psycopg.rows import tuple_row
 from psycopg.types.json import Json
 
 from app.domain.ports.outbox_repository import OutboxRepositoryPort
+from app.infrastructure.db.prepared import PreparedStatements, get_prepared_statements
 
 
 @dataclass
@@ -31,25 +32,48 @@ class PgOutboxRepository(OutboxRepositoryPort):
     This class DOES NOT COMMIT; the caller (UoW / worker) controls transactions.
     """
 
-    def __init__(self, conn: psycopg.AsyncConnection) -> None:
+    def __init__(
+        self,
+        conn: psycopg.AsyncConnection,
+        statements: PreparedStatements | None = None,
+    ) -> None:
         self._conn = conn
+        self._stmts = statements or get_prepared_statements()
 
     async def enqueue(
         self, *, topic: str, payload: dict, idempotency_key: str | None = None
     ) -> str:
         """
-        Minimal enqueue
+        Minimal enqueue. On an idempotency_key conflict nothing is inserted and
+        the id of the existing message is returned.
         """
         sql = """
-        INSERT INTO outbox (topic, payload, status)
-        VALUES (%s, %s, 'pending')
+        WITH inserted AS (
+        INSERT INTO outbox (topic, payload, status, idempotency_key)
+        VALUES (%s, %s, 'pending', %s)
+        ON CONFLICT (idempotency_key) DO NOTHING
         RETURNING id
+        )
+        SELECT id FROM inserted
+        UNION ALL
+        SELECT id FROM outbox WHERE idempotency_key = %s
+        LIMIT 1
         """
+        params = (topic, Json(payload), idempotency_key, idempotency_key)
         async with self._conn.cursor() as cur:
-            await cur.execute(sql, (topic, Json(payload)))
+            await self._stmts.execute(cur, "outbox.enqueue", sql, params)
             row = await cur.fetchone()
             return str(row[0])
 
+    async def has_idempotency_key(self, idempotency_key: str) -> bool:
+        sql = "SELECT EXISTS (SELECT 1 FROM outbox WHERE idempotency_key = %s)"
+        async with self._conn.cursor() as cur:
+            await self._stmts.execute(
+                cur, "outbox.has_idempotency_key", sql, (idempotency_key,)
+            )
+            row = await cur.fetchone()
+            return bool(row[0])
+
     async def fetch_ready_for_dispatch(self, limit: int = 10) -> list[OutboxMessage]:
         """
         Grab up to `limit` messages that are ready to be dispatched.
@@ -62,12 +86,14 @@ class PgOutboxRepository(OutboxRepositoryPort):
         SELECT id, topic, payload, attempts
         FROM outbox
         WHERE status = 'pending' AND available_at <= now()
-        ORDER BY created_at
+        ORDER BY available_at, id
         LIMIT %s
         FOR UPDATE SKIP LOCKED
         """
         async with self._conn.cursor(row_factory=tuple_row) as cur:
-            await cur.execute(sql, (limit,))
+            await self._stmts.execute(
+                cur, "outbox.fetch_ready_for_dispatch", sql, (limit,)
+            )
             rows: Sequence[tuple] = await cur.fetchall()
 
         messages: list[OutboxMessage] = []
@@ -91,7 +117,7 @@ class PgOutboxRepository(OutboxRepositoryPort):
         WHERE id = %s
         """
         async with self._conn.cursor() as cur:
-            await cur.execute(sql, (message_id,))
+            await self._stmts.execute(cur, "outbox.mark_dispatched", sql, (message_id,))
 
     async def mark_failed(
         self,
@@ -116,4 +142,6 @@ class PgOutboxRepository(OutboxRepositoryPort):
         WHERE id = %s
         """
         async with self._conn.cursor() as cur:
-            await cur.execute(sql, (error[:1000], next_time, message_id))
+            await self._stmts.execute(
+                cur, "outbox.mark_failed", sql, (error[:1000], next_time, message_id)
+            )
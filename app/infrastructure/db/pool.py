@@ -1,10 +1,15 @@
 from __future__ import annotations
 
 from typing import Optional
+
+import psycopg
 from psycopg_pool import AsyncConnectionPool
+
+from app.infrastructure.db.replicas import ReplicaPools
 from app.settings import get_settings
 
 _pool: Optional[AsyncConnectionPool] = None
+_replicas: Optional[ReplicaPools] = None
 
 
 def _add_connect_timeout(dsn: str, seconds: int = 3) -> str:
@@ -14,6 +19,11 @@ def _add_connect_timeout(dsn: str, seconds: int = 3) -> str:
     return f"{dsn}{sep}connect_timeout={seconds}"
 
 
+async def _configure_connection(conn: psycopg.AsyncConnection) -> None:
+    # bound the per-connection cache used by the prepared-statement registry
+    conn.prepared_max = get_settings().db_prepared_max
+
+
 def get_pool() -> AsyncConnectionPool:
     """
     Create (if needed) and return the global pool WITHOUT opening it.
@@ -26,6 +36,7 @@ def get_pool() -> AsyncConnectionPool:
             min_size=1,
             max_size=10,
             timeout=5,
+            configure=_configure_connection,
             open=False,  # created closed; caller decides when to open
         )
     return _pool
@@ -42,3 +53,38 @@ async def close_pool() -> None:
     if _pool is not None:
         await _pool.close()
         _pool = None
+
+
+def get_replica_pools() -> Optional[ReplicaPools]:
+    """
+    Create (if needed) and return the read replica pools, unopened; None when
+    DATABASE_REPLICA_URLS is empty (everything goes to the primary).
+    """
+    global _replicas
+    settings = get_settings()
+    dsns = [d.strip() for d in settings.database_replica_urls.split(",") if d.strip()]
+    if _replicas is None and dsns:
+        _replicas = ReplicaPools(
+            [_add_connect_timeout(dsn) for dsn in dsns],
+            max_lag_seconds=settings.db_replica_max_lag_seconds,
+            check_interval=settings.db_replica_check_interval_seconds,
+            min_size=1,
+            max_size=10,
+            timeout=5,
+            configure=_configure_connection,
+        )
+    return _replicas
+
+
+async def open_replica_pools() -> Optional[ReplicaPools]:
+    replicas = get_replica_pools()
+    if replicas is not None:
+        await replicas.open()
+    return replicas
+
+
+async def close_replica_pools() -> None:
+    global _replicas
+    if _replicas is not None:
+        await _replicas.close()
+        _replicas = None
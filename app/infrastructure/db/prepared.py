@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Optional, Sequence
+from weakref import WeakKeyDictionary
+
+import psycopg
+
+from app.settings import get_settings
+
+
+@dataclass(frozen=True)
+class PreparedStatementStats:
+    enabled: bool
+    hits: int
+    misses: int
+    connections: int
+
+
+class PreparedStatements:
+    """
+    Registry of named repository queries, prepared server-side once per connection.
+
+    psycopg prepares a query (as `_pg3_N`) the first time it runs with
+    `prepare=True` on a connection and re-uses the plan after that. The registry
+    keeps track, per pooled connection, of which named queries were already
+    prepared there: the first execution is a miss (parse + plan), later ones
+    are hits (bind + execute only). Entries vanish with the connection.
+
+    The names are labels for this bookkeeping only: psycopg keys its cache by
+    query text, names the statements itself and evicts the least recently used
+    once a connection holds `prepared_max` of them. `stats()` is therefore an
+    estimate of what the server has prepared, not a reading of it: an evicted
+    query still counts as a hit.
+
+    psycopg deallocates every prepared statement on ROLLBACK, so whoever rolls
+    a connection back must call `forget(conn)` (PgUnitOfWork does).
+    """
+
+    def __init__(self, *, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._seen: WeakKeyDictionary[psycopg.AsyncConnection, set[str]] = (
+            WeakKeyDictionary()
+        )
+        self._hits = 0
+        self._misses = 0
+
+    async def execute(
+        self,
+        cur: psycopg.AsyncCursor,
+        name: str,
+        sql: str,
+        params: Optional[Sequence[Any]] = None,
+    ) -> psycopg.AsyncCursor:
+        if not self.enabled:
+            return await cur.execute(sql, params, prepare=False)
+
+        seen = self._seen.setdefault(cur.connection, set())
+        if name in seen:
+            self._hits += 1
+        else:
+            seen.add(name)
+            self._misses += 1
+        return await cur.execute(sql, params, prepare=True)
+
+    def forget(self, conn: psycopg.AsyncConnection) -> None:
+        self._seen.pop(conn, None)
+
+    def stats(self) -> PreparedStatementStats:
+        return PreparedStatementStats(
+            enabled=self.enabled,
+            hits=self._hits,
+            misses=self._misses,
+            connections=len(self._seen),
+        )
+
+
+_statements: Optional[PreparedStatements] = None
+
+
+def get_prepared_statements() -> PreparedStatements:
+    """Process-wide registry shared by all repositories."""
+    global _statements
+    if _statements is None:
+        _statements = PreparedStatements(enabled=get_settings().db_prepared_statements)
+    return _statements
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional, Sequence
+
+import psycopg
+from psycopg_pool import AsyncConnectionPool
+
+logger = logging.getLogger("app.infrastructure.db.replicas")
+
+# Replication lag in seconds, as seen by the replica. A standby that has replayed
+# everything its WAL receiver got is not lagging, however old its last replayed
+# transaction is (an idle primary writes nothing); without a running receiver
+# that can't be told apart from a broken stream, so the replay age counts. NULL
+# (nothing replayed yet) is treated as unhealthy. A server that is not in
+# recovery reports 0: it can only be a primary.
+_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+         AND EXISTS (SELECT 1 FROM pg_stat_wal_receiver) THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END::float8
+"""
+
+
+@dataclass(frozen=True)
+class ReplicaStats:
+    replicas: int
+    healthy: int
+    lag_seconds: tuple[Optional[float], ...]  # last measured, None if unknown
+    replica_reads: int  # units of work routed to a replica
+    primary_reads: int  # no healthy replica: sent to the primary instead
+    failures: int  # replicas marked unhealthy by a failed checkout or query
+
+
+class _Replica:
+    def __init__(self, pool: AsyncConnectionPool) -> None:
+        self.pool = pool
+        self.healthy = False
+        self.lag: Optional[float] = None
+
+
+class ReplicaPools:
+    """
+    One connection pool per Postgres read replica, and which of them may serve
+    reads right now.
+
+    A background task (`open`/`close`, run by the lifespan) measures each
+    replica's lag every `check_interval` seconds; a replica is usable while the
+    check succeeds and the lag is at most `max_lag_seconds`. `pick()` returns
+    the pool of the next usable replica (round robin), or None: the caller
+    then reads from the primary. A caller whose checkout or query on a replica
+    fails reports it with `mark_unhealthy`, which takes the replica out until
+    the next successful check.
+
+    Replicas start unhealthy: nothing is routed to them before a first check.
+    """
+
+    def __init__(
+        self,
+        dsns: Sequence[str],
+        *,
+        max_lag_seconds: float = 1.0,
+        check_interval: float = 1.0,
+        check_timeout: float = 1.0,
+        acquire_timeout: float = 0.5,
+        configure: Optional[
+            Callable[[psycopg.AsyncConnection], Awaitable[None]]
+        ] = None,
+        **pool_kwargs: Any,
+    ) -> None:
+        if not dsns:
+            raise ValueError("at least one replica DSN is required")
+        self.max_lag_seconds = max_lag_seconds
+        self.acquire_timeout = acquire_timeout
+        self._check_interval = check_interval
+        self._check_timeout = check_timeout
+        self._replicas = [
+            _Replica(
+                AsyncConnectionPool(dsn, configure=configure, open=False, **pool_kwargs)
+            )
+            for dsn in dsns
+        ]
+        self._next = itertools.cycle(range(len(self._replicas)))
+        self._task: Optional[asyncio.Task] = None
+
+        self._replica_reads = 0
+        self._primary_reads = 0
+        self._failures = 0
+
+    async def open(self) -> None:
+        """Open the pools (without waiting for connections), check once, start."""
+        for replica in self._replicas:
+            await replica.pool.open(wait=False)
+        await self.check()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self._replicas:
+            replica.healthy = False
+            await replica.pool.close()
+
+    def pick(self) -> Optional[AsyncConnectionPool]:
+        for _ in range(len(self._replicas)):
+            replica = self._replicas[next(self._next)]
+            if replica.healthy:
+                self._replica_reads += 1
+                return replica.pool
+        self._primary_reads += 1
+        return None
+
+    def mark_unhealthy(self, pool: AsyncConnectionPool) -> None:
+        for replica in self._replicas:
+            if replica.pool is pool and replica.healthy:
+                replica.healthy = False
+                self._failures += 1
+                logger.warning(
+                    "read replica failed, reads go to the primary until it recovers",
+                    extra={"replica": pool.name},
+                )
+
+    async def check(self) -> None:
+        """Measure every replica's lag once (concurrently) and update health."""
+        await asyncio.gather(*(self._check(r) for r in self._replicas))
+
+    async def _check(self, replica: _Replica) -> None:
+        try:
+            lag = await asyncio.wait_for(
+                self._measure_lag(replica.pool), self._check_timeout
+            )
+        except (psycopg.Error, asyncio.TimeoutError):
+            lag = None
+        was_healthy = replica.healthy
+        replica.lag = lag
+        replica.healthy = lag is not None and lag <= self.max_lag_seconds
+        if was_healthy and not replica.healthy:
+            logger.warning(
+                "read replica unhealthy or lagging",
+                extra={"replica": replica.pool.name, "lag_seconds": lag},
+            )
+
+    async def _measure_lag(self, pool: AsyncConnectionPool) -> Optional[float]:
+        async with pool.connection(timeout=self._check_timeout) as conn:
+            cur = await conn.execute(_LAG_SQL, prepare=False)
+            row = await cur.fetchone()
+        return row[0] if row else None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._check_interval)
+            await self.check()
+
+    def stats(self) -> ReplicaStats:
+        return ReplicaStats(
+            replicas=len(self._replicas),
+            healthy=sum(r.healthy for r in self._replicas),
+            lag_seconds=tuple(r.lag for r in self._replicas),
+            replica_reads=self._replica_reads,
+            primary_reads=self._primary_reads,
+            failures=self._failures,
+        )
@@ -6,13 +6,20 @@ import psycopg
 from psycopg_pool import AsyncConnectionPool
 
 from app.domain.ports.unit_of_work import UnitOfWorkPort
-from app.infrastructure.db.users_repo import PgUserRepository
 from app.infrastructure.db.outbox_repo import PgOutboxRepository
+from app.infrastructure.db.prepared import PreparedStatements, get_prepared_statements
+from app.infrastructure.db.replicas import ReplicaPools
+from app.infrastructure.db.users_repo import PgUserRepository
 
 
 class PgUnitOfWork(UnitOfWorkPort):
-    def __init__(self, pool: AsyncConnectionPool) -> None:
+    def __init__(
+        self,
+        pool: AsyncConnectionPool,
+        statements: Optional[PreparedStatements] = None,
+    ) -> None:
         self._pool = pool
+        self._statements = statements or get_prepared_statements()
         self._conn_cm: Optional[Any] = None
         self._conn: Optional[psycopg.AsyncConnection] = None
         self._committed: bool = False
@@ -20,13 +27,16 @@ class PgUnitOfWork(UnitOfWorkPort):
         self.outbox: PgOutboxRepository
 
     async def __aenter__(self) -> "PgUnitOfWork":
-        self._conn_cm = self._pool.connection()
-        self._conn = await self._conn_cm.__aenter__()
-        self.db_users = PgUserRepository(self._conn)
-        self.outbox = PgOutboxRepository(self._conn)
+        await self._connect()
+        self.db_users = PgUserRepository(self._conn, self._statements)
+        self.outbox = PgOutboxRepository(self._conn, self._statements)
         self._committed = False
         return self
 
+    async def _connect(self) -> None:
+        self._conn_cm = self._pool.connection()
+        self._conn = await self._conn_cm.__aenter__()
+
     async def __aexit__(
         self,
         exc_type: Type[BaseException] | None,
@@ -40,6 +50,8 @@ class PgUnitOfWork(UnitOfWorkPort):
                         await self._conn.rollback()
                     except Exception:
                         pass
+                    # psycopg drops its prepared statements on rollback
+                    self._statements.forget(self._conn)
         finally:
             if self._conn_cm:
                 await self._conn_cm.__aexit__(exc_type, exc_value, traceback)
@@ -56,4 +68,131 @@ class PgUnitOfWork(UnitOfWorkPort):
     async def rollback(self) -> None:
         if self._conn:
             await self._conn.rollback()
+            self._statements.forget(self._conn)
         self._committed = False
+
+
+class PgPipelinedUnitOfWork(PgUnitOfWork):
+    """
+    PgUnitOfWork with the connection in psycopg pipeline mode.
+
+    Statements are sent without waiting for their reply; the client only syncs
+    when a caller fetches a row (or at commit). Postgres still runs them in
+    order, and an error in any queued statement is raised at the next sync
+    point, which is inside the `async with` block, and the transaction is
+    rolled back as usual.
+    """
+
+    def __init__(
+        self,
+        pool: AsyncConnectionPool,
+        statements: Optional[PreparedStatements] = None,
+    ) -> None:
+        super().__init__(pool, statements)
+        self._pipeline_cm: Optional[Any] = None
+
+    async def __aenter__(self) -> "PgPipelinedUnitOfWork":
+        await super().__aenter__()
+        self._pipeline_cm = self._conn.pipeline()
+        await self._pipeline_cm.__aenter__()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: Any,
+    ) -> None:
+        # Leaving the pipeline flushes anything still queued; an error surfacing
+        # here must not leak the connection, so release first, then re-raise.
+        pipeline_error: Optional[BaseException] = None
+        if self._pipeline_cm is not None:
+            try:
+                await self._pipeline_cm.__aexit__(exc_type, exc_value, traceback)
+            except Exception as e:
+                pipeline_error = e
+            finally:
+                self._pipeline_cm = None
+        await super().__aexit__(exc_type, exc_value, traceback)
+        if pipeline_error is not None and exc_value is None:
+            raise pipeline_error
+
+
+class PgReadOnlyUnitOfWork(PgUnitOfWork):
+    """
+    PgUnitOfWork for lookups that run a single statement (login, /me).
+
+    The connection is switched to autocommit for the duration of the block: each
+    statement is its own implicit transaction, so there is no BEGIN before the
+    first query and no ROLLBACK/COMMIT on exit (one round trip for a single
+    SELECT instead of three). `commit()` has nothing to do. Not for writes, nor
+    for several reads that must see one snapshot.
+
+    Autocommit is a client-side switch (no round trip). It is turned off again
+    before the connection goes back to the pool; if that fails the connection is
+    closed so the pool discards it.
+
+    With `replicas`, the connection comes from a healthy read replica when there
+    is one, else from `pool` (the primary). A replica whose checkout fails is
+    marked unhealthy and the block runs on the primary; one whose connection
+    fails inside the block is marked unhealthy for the next callers.
+    """
+
+    def __init__(
+        self,
+        pool: AsyncConnectionPool,
+        statements: Optional[PreparedStatements] = None,
+        *,
+        replicas: Optional[ReplicaPools] = None,
+    ) -> None:
+        super().__init__(pool, statements)
+        self._replicas = replicas
+        self._replica: Optional[AsyncConnectionPool] = None
+
+    async def _connect(self) -> None:
+        self._replica = self._replicas.pick() if self._replicas is not None else None
+        if self._replica is not None:
+            conn_cm = self._replica.connection(timeout=self._replicas.acquire_timeout)
+            try:
+                self._conn = await conn_cm.__aenter__()
+                self._conn_cm = conn_cm
+                return
+            except psycopg.OperationalError:  # includes PoolTimeout
+                self._replicas.mark_unhealthy(self._replica)
+                self._replica = None
+        await super()._connect()
+
+    async def __aenter__(self) -> "PgReadOnlyUnitOfWork":
+        await super().__aenter__()
+        await self._conn.set_autocommit(True)
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: Any,
+    ) -> None:
+        if self._replica is not None and isinstance(
+            exc_value, psycopg.OperationalError
+        ):
+            self._replicas.mark_unhealthy(self._replica)
+        try:
+            if self._conn:
+                try:
+                    await self._conn.set_autocommit(False)
+                except Exception:
+                    await self._conn.close()
+        finally:
+            if self._conn_cm:
+                await self._conn_cm.__aexit__(exc_type, exc_value, traceback)
+            self._conn = None
+            self._conn_cm = None
+            self._replica = None
+
+    async def commit(self) -> None:
+        if not self._conn:
+            raise RuntimeError("No connection available to commit")
+
+    async def rollback(self) -> None:
+        return None
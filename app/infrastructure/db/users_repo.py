@@ -4,9 +4,11 @@ from datetime import datetime
 from typing import Optional
 
 import psycopg
+from psycopg.types.json import Json
 
 from app.domain.entities import User
 from app.domain.ports.user_repository import UserRepositoryPort
+from app.infrastructure.db.prepared import PreparedStatements, get_prepared_statements
 
 
 class PgUserRepository(UserRepositoryPort):
@@ -16,16 +18,24 @@ class PgUserRepository(UserRepositoryPort):
     NOTE:
     - This repo is constructed with an *active async connection* supplied by the UoW.
     - It does not commit; the UnitOfWork controls the transaction boundary.
+    - Queries go through the prepared-statement registry (named per method).
     """
 
-    def __init__(self, conn: psycopg.AsyncConnection) -> None:
+    def __init__(
+        self,
+        conn: psycopg.AsyncConnection,
+        statements: Optional[PreparedStatements] = None,
+    ) -> None:
         self._conn = conn
+        self._stmts = statements or get_prepared_statements()
 
-    async def create_or_update_pending(self, email: str, password_hash: str) -> User:
+    async def create_or_update_pending(
+        self, email: str, password_hash: str, *, user_id: str | None = None
+    ) -> User:
         sql = """
         WITH upsert AS (
-        INSERT INTO users (email, password_hash, status)
-        VALUES (LOWER(TRIM(%s)), %s, 'pending')
+        INSERT INTO users (id, email, password_hash, status)
+        VALUES (COALESCE(%s::uuid, gen_random_uuid()), LOWER(TRIM(%s)), %s, 'pending')
         ON CONFLICT (email) DO UPDATE
             SET password_hash = EXCLUDED.password_hash
             WHERE users.status = 'pending'
@@ -40,7 +50,12 @@ class PgUserRepository(UserRepositoryPort):
         LIMIT 1;
         """
         async with self._conn.cursor() as cur:
-            await cur.execute(sql, (email, password_hash, email))
+            await self._stmts.execute(
+                cur,
+                "users.create_or_update_pending",
+                sql,
+                (user_id, email, password_hash, email),
+            )
             row = await cur.fetchone()
 
         if not row:
@@ -55,6 +70,86 @@ class PgUserRepository(UserRepositoryPort):
             last_code_sent_at=last_code_sent_at,
         )
 
+    async def create_or_update_pending_with_outbox(
+        self,
+        email: str,
+        password_hash: str,
+        *,
+        user_id: str | None = None,
+        sent_at: datetime,
+        topic: str,
+        payload: dict,
+        idempotency_key: str | None = None,
+    ) -> User:
+        """
+        Registration write path fused into one statement:
+        upsert the user + stamp last_code_sent_at + insert the outbox row
+        (skipped if a row with the same idempotency_key exists).
+
+        Data-modifying CTEs share one snapshot, so the timestamp is folded into
+        the upsert for new/pending users; `touched` covers the existing
+        non-pending user that the upsert leaves alone (same as the multi-call path).
+        """
+        sql = """
+        WITH upsert AS (
+        INSERT INTO users (id, email, password_hash, status, last_code_sent_at)
+        VALUES (
+            COALESCE(%s::uuid, gen_random_uuid()), LOWER(TRIM(%s)), %s, 'pending', %s
+        )
+        ON CONFLICT (email) DO UPDATE
+            SET password_hash = EXCLUDED.password_hash,
+                last_code_sent_at = EXCLUDED.last_code_sent_at
+            WHERE users.status = 'pending'
+        RETURNING id, email, status, failed_attempts, last_code_sent_at
+        ),
+        touched AS (
+        UPDATE users
+        SET last_code_sent_at = %s
+        WHERE email = LOWER(TRIM(%s)) AND NOT EXISTS (SELECT 1 FROM upsert)
+        RETURNING id, email, status, failed_attempts, last_code_sent_at
+        ),
+        enqueued AS (
+        INSERT INTO outbox (topic, payload, status, idempotency_key)
+        VALUES (%s, %s, 'pending', %s)
+        ON CONFLICT (idempotency_key) DO NOTHING
+        RETURNING id
+        )
+        SELECT id, email, status, failed_attempts, last_code_sent_at
+        FROM upsert
+        UNION ALL
+        SELECT id, email, status, failed_attempts, last_code_sent_at
+        FROM touched
+        LIMIT 1;
+        """
+        params = (
+            user_id,
+            email,
+            password_hash,
+            sent_at,
+            sent_at,
+            email,
+            topic,
+            Json(payload),
+            idempotency_key,
+        )
+        async with self._conn.cursor() as cur:
+            await self._stmts.execute(
+                cur, "users.create_or_update_pending_with_outbox", sql, params
+            )
+            row = await cur.fetchone()
+
+        if not row:
+            raise RuntimeError("create_or_update_pending_with_outbox returned no row")
+
+        uid, eml, status, failed_attempts, last_code_sent_at = row
+        return User(
+            id=str(uid),
+            email=str(eml),
+            status=status,
+            failed_attempts=failed_attempts or 0,
+            last_code_sent_at=last_code_sent_at,
+        )
+
     async def get_by_email_with_hash_for_update(
         self, email: str
     ) -> Optional[tuple[User, str]]:
@@ -65,7 +160,9 @@ class PgUserRepository(UserRepositoryPort):
         FOR UPDATE
         """
         async with self._conn.cursor() as cur:
-            await cur.execute(sql, (email,))
+            await self._stmts.execute(
+                cur, "users.get_by_email_with_hash_for_update", sql, (email,)
+            )
             row = await cur.fetchone()
             if not row:
                 return None
@@ -98,7 +195,9 @@ class PgUserRepository(UserRepositoryPort):
         FOR UPDATE
         """
         async with self._conn.cursor() as cur:
-            await cur.execute(sql, (email,))
+            await self._stmts.execute(
+                cur, "users.get_by_email_for_update", sql, (email,)
+            )
             row = await cur.fetchone()
             if not row:
                 return None
@@ -115,28 +214,59 @@ class PgUserRepository(UserRepositoryPort):
         sql = "UPDATE users SET status = 'active' WHERE id = %s"
         async with self._conn.cursor() as cur:
             # cast to int for safety; DB id is bigserial
-            await cur.execute(sql, (user_id,))
+            await self._stmts.execute(cur, "users.set_active", sql, (user_id,))
+
+    async def activate_if_pending(self, user_id: str) -> bool:
+        # RETURNING rather than rowcount: in pipeline mode the reply is only
+        # read when a row is fetched
+        sql = """
+        UPDATE users SET status = 'active'
+        WHERE id = %s AND status = 'pending'
+        RETURNING id
+        """
+        async with self._conn.cursor() as cur:
+            await self._stmts.execute(cur, "users.activate_if_pending", sql, (user_id,))
+            return await cur.fetchone() is not None
+
+    async def add_failed_attempts(self, user_id: str, count: int) -> None:
+        sql = "UPDATE users SET failed_attempts = failed_attempts + %s WHERE id = %s"
+        async with self._conn.cursor() as cur:
+            await self._stmts.execute(
+                cur, "users.add_failed_attempts", sql, (count, user_id)
+            )
 
     async def set_last_code_sent_at(self, user_id: str, when: datetime) -> None:
         sql = "UPDATE users SET last_code_sent_at = %s WHERE id = %s"
         async with self._conn.cursor() as cur:
-            await cur.execute(sql, (when, user_id))
+            await self._stmts.execute(
+                cur, "users.set_last_code_sent_at", sql, (when, user_id)
+            )
 
     async def get_by_email_with_hash(self, email: str) -> tuple[User, str] | None:
         norm = email.strip().lower()
-        sql = "SELECT id, email, status, password_hash FROM users WHERE email = %s"
+        sql = """
+        SELECT id, email, status, password_hash, failed_attempts, last_code_sent_at
+        FROM users
+        WHERE email = %s
+        """
         async with self._conn.cursor() as cur:
-            await cur.execute(sql, (norm,))
+            await self._stmts.execute(cur, "users.get_by_email_with_hash", sql, (norm,))
             row = await cur.fetchone()
         if not row:
             return None
-        u = User(id=str(row[0]), email=row[1], status=row[2])
+        u = User(
+            id=str(row[0]),
+            email=row[1],
+            status=row[2],
+            failed_attempts=row[4] or 0,
+            last_code_sent_at=row[5],
+        )
         return u, row[3]
 
     async def get_by_id(self, user_id: str) -> User | None:
         sql = "SELECT id, email, status FROM users WHERE id = %s"
         async with self._conn.cursor() as cur:
-            await cur.execute(sql, (user_id,))
+            await self._stmts.execute(cur, "users.get_by_id", sql, (user_id,))
             row = await cur.fetchone()
         if not row:
             return None
@@ -1,12 +1,22 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import os
+import socket
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager, suppress
 from dataclasses import dataclass
-from typing import Any, Iterable
+from typing import Any, AsyncIterator, Iterable, Mapping, Optional
 
+import psycopg
 from psycopg import AsyncCursor
+from psycopg.sql import SQL, Identifier
 from psycopg_pool import AsyncConnectionPool
 
+from app.infrastructure.db.prepared import PreparedStatements, get_prepared_statements
+
 logger = logging.getLogger("app.infrastructure.outbox.dispatcher")
 
 
@@ -14,6 +24,7 @@ logger = logging.getLogger("app.infrastructure.outbox.dispatcher")
 class RetryPolicy:
     base: int = 2  # base delay (seconds)
     max_delay: int = 60  # cap (seconds)
+    max_attempts: int | None = None  # then 'failed' for good; None: retry forever
 
     def compute_delay(self, attempts: int) -> int:
         # attempts is the *current* number of attempts already made
@@ -21,11 +32,58 @@ class RetryPolicy:
         delay = self.base * (2**attempts)
         return delay if delay < self.max_delay else self.max_delay
 
+    def exhausted(self, attempts: int) -> bool:
+        return self.max_attempts is not None and attempts >= self.max_attempts
+
+
+# Messages of these topics with the same payload field value are sent one at a
+# time, in id order (a newer verification code must not overtake an older one).
+DEFAULT_ORDERED_BY: Mapping[str, str] = {"user.verification_code": "to"}
+
+
+@dataclass(frozen=True)
+class _Outcome:
+    id: int
+    dispatched: bool
+    attempts: int = 0  # failures only: attempts made so far, this one included
+    retry_in_seconds: int | None = 0  # None: out of attempts, 'failed' for good
+    error: str | None = None
+
+
+@dataclass(frozen=True)
+class DispatcherStats:
+    in_flight: int
+    in_flight_by_topic: Mapping[str, int]
+    dispatched: int
+    failed: int
+    listening: bool
+    leases_lost: int  # outcomes dropped: the row was reclaimed by another worker
+
 
 class OutboxDispatcher:
     """
     Polls the outbox table, claims due rows, dispatches them, and marks
     them as dispatched or reschedules for retry on failure.
+
+    A claimed batch is sent concurrently: at most `max_concurrency` sends at a
+    time overall, and at most `topic_limits[topic]` for a listed topic. Messages
+    sharing an ordering key (`ordered_by`: topic -> payload field) are sent one
+    after the other in id order; everything else is independent. After a failed
+    send, the rest of its group is not sent: it goes back to 'pending', due with
+    the failed message's retry and without spending an attempt.
+
+    With `listen_dsn`, a dedicated connection LISTENs on `channel` (an insert
+    trigger on the outbox NOTIFYs it) and an idle dispatcher claims as soon as a
+    notification arrives. `poll_interval` is then only the fallback for missed
+    notifications; an idle dispatcher also wakes up when the next scheduled
+    retry or lease expiry is due.
+
+    Claims are leases: a claimed row is 'processing', `locked_by` this worker,
+    until its available_at (now + `lease_seconds`), extended every third of
+    the lease while the batch is being sent. Once a lease has expired (the
+    worker died or lost its database connection) the row is claimable again by
+    any worker. Outcomes are only written to rows still leased to this worker,
+    so a worker that lost its lease cannot overwrite the new owner's result.
     """
 
     def __init__(
@@ -36,115 +94,350 @@ class OutboxDispatcher:
         batch_size: int = 10,
         poll_interval: float = 1.0,
         retry_policy: RetryPolicy | None = None,
+        max_concurrency: int = 10,
+        topic_limits: Optional[Mapping[str, int]] = None,
+        ordered_by: Optional[Mapping[str, str]] = None,
+        listen_dsn: Optional[str] = None,
+        channel: str = "outbox",
+        reconnect_delay: float = 1.0,
+        lease_seconds: float = 30.0,
+        worker_id: Optional[str] = None,
+        statements: Optional[PreparedStatements] = None,
     ) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        if lease_seconds <= 0:
+            raise ValueError("lease_seconds must be > 0")
         self.pool = pool
         self.email_adapter = email_adapter
         self.batch_size = batch_size
         self.poll_interval = poll_interval
         self.retry_policy = retry_policy or RetryPolicy()
+        self.max_concurrency = max_concurrency
+        self.ordered_by = DEFAULT_ORDERED_BY if ordered_by is None else ordered_by
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._topic_slots = {
+            topic: asyncio.Semaphore(limit)
+            for topic, limit in (topic_limits or {}).items()
+        }
+        self.listen_dsn = listen_dsn
+        self.channel = channel
+        self._reconnect_delay = reconnect_delay
+        self._wakeup = asyncio.Event()
+        self._listening = False
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id or (
+            f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+        self._statements = statements or get_prepared_statements()
+        self._in_flight: Counter[str] = Counter()
+        self._dispatched = 0
+        self._failed = 0
+        self._leases_lost = 0
 
     async def run_forever(self) -> None:
         logger.info(
             "outbox dispatcher started",
-            extra={"batch_size": self.batch_size, "poll_interval": self.poll_interval},
+            extra={
+                "batch_size": self.batch_size,
+                "poll_interval": self.poll_interval,
+                "max_concurrency": self.max_concurrency,
+                "listen": self.listen_dsn is not None,
+                "worker_id": self.worker_id,
+                "lease_seconds": self.lease_seconds,
+            },
         )
-        while True:
-            processed = await self._process_once()
-            # simple throttle: if nothing to do, sleep a bit
-            if processed == 0:
-                import asyncio
+        listener = asyncio.create_task(self._listen()) if self.listen_dsn else None
+        try:
+            while True:
+                # cleared before claiming: a NOTIFY during the claim is not lost
+                self._wakeup.clear()
+                processed = await self._process_once()
+                if processed == 0:
+                    await self._idle()
+        finally:
+            if listener is not None:
+                listener.cancel()
+                with suppress(asyncio.CancelledError):
+                    await listener
+
+    async def _idle(self) -> None:
+        """
+        Nothing due: wait for a notification, the next scheduled retry or lease
+        expiry, or the poll interval, whichever comes first.
+        """
+        timeout = self.poll_interval
+        next_due = await self._seconds_until_next_due()
+        if next_due is not None:
+            timeout = min(timeout, max(next_due, 0.0))
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
 
-                await asyncio.sleep(self.poll_interval)
+    async def _listen(self) -> None:
+        """Hold a LISTEN connection; every notification wakes the claim loop."""
+        while True:
+            try:
+                conn = await psycopg.AsyncConnection.connect(
+                    self.listen_dsn, autocommit=True
+                )
+                async with conn:
+                    await conn.execute(
+                        SQL("LISTEN {}").format(Identifier(self.channel))
+                    )
+                    self._listening = True
+                    # rows inserted while nobody was listening: claim them now
+                    self._wakeup.set()
+                    async for _ in conn.notifies():
+                        self._wakeup.set()
+            except psycopg.Error:
+                logger.warning("outbox LISTEN connection lost; polling until back")
+            finally:
+                self._listening = False
+            await asyncio.sleep(self._reconnect_delay)
 
     async def _process_once(self) -> int:
         """
         Single iteration:
-        - claim up to batch_size due rows into 'processing'
-        - for each, try to dispatch
-        - mark dispatched or reschedule for retry
+        - claim (lease) up to batch_size due rows into 'processing'
+        - dispatch them concurrently (within the concurrency limits), while
+          extending the leases
+        - mark them all dispatched or rescheduled for retry in one statement
         Returns number of rows it attempted to process (claimed count).
+
+        A crash before the marking leaves the batch in 'processing' until the
+        leases expire, then another worker re-sends it, counting the lost send
+        as an attempt. Every send carries an idempotency key (the row's own, or
+        `outbox-<id>` when it has none), so a provider that honours it
+        delivers the re-send only once.
         """
         # Claim
         batch = await self._claim_due_batch(self.batch_size)
         if not batch:
             return 0
 
-        logger.info("claimed messages", extra={"count": len(batch)})
+        logger.info(
+            "claimed messages",
+            extra={"count": len(batch), "in_flight": sum(self._in_flight.values())},
+        )
 
-        # Process each message (commit per message)
+        # the batch comes back in id order, and so does each group
+        groups: dict[Any, list[dict[str, Any]]] = {}
         for msg in batch:
-            msg_id = msg["id"]
-            topic = msg["topic"]
-            attempts = msg["attempts"]
-            logger.info(
-                "processing message",
+            groups.setdefault(self._ordering_key(msg), []).append(msg)
+
+        outcomes: list[_Outcome] = []
+        heartbeat = asyncio.create_task(self._keep_leases([m["id"] for m in batch]))
+        try:
+            results = await asyncio.gather(
+                *(self._process_group(group, outcomes) for group in groups.values()),
+                return_exceptions=True,
+            )
+        finally:
+            heartbeat.cancel()
+            with suppress(asyncio.CancelledError):
+                await heartbeat
+        await self._mark_batch(outcomes)
+        # whatever was sent is recorded first; an unexpected error still surfaces
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+        return len(batch)
+
+    def _ordering_key(self, msg: dict[str, Any]) -> Any:
+        field = self.ordered_by.get(msg["topic"])
+        payload = msg["payload"]
+        if field is not None and isinstance(payload, dict) and field in payload:
+            return (msg["topic"], payload[field])
+        return msg["id"]
+
+    async def _process_group(
+        self, group: list[dict[str, Any]], outcomes: list[_Outcome]
+    ) -> None:
+        for i, msg in enumerate(group):
+            outcome = await self._process_message(msg)
+            outcomes.append(outcome)
+            if outcome.dispatched:
+                continue
+            # the rest must not overtake the failed message
+            for held in group[i + 1 :]:
+                outcomes.append(
+                    _Outcome(
+                        held["id"],
+                        dispatched=False,
+                        attempts=held["attempts"],
+                        retry_in_seconds=outcome.retry_in_seconds or 0,
+                        error=f"held back: message {msg['id']} failed",
+                    )
+                )
+            return
+
+    @asynccontextmanager
+    async def _slot(self, topic: str) -> AsyncIterator[None]:
+        # topic slot first: a message waiting on its topic holds no global slot
+        topic_slots = self._topic_slots.get(topic)
+        if topic_slots is None:
+            async with self._slots:
+                yield
+        else:
+            async with topic_slots, self._slots:
+                yield
+
+    async def _process_message(self, msg: dict[str, Any]) -> _Outcome:
+        msg_id = msg["id"]
+        topic = msg["topic"]
+        attempts = msg["attempts"]
+        if self.retry_policy.exhausted(attempts):
+            # reclaimed after the lease of its last attempt expired
+            logger.error(
+                "outbox message out of attempts; giving up",
                 extra={"id": msg_id, "topic": topic, "attempts": attempts},
             )
+            self._failed += 1
+            return _Outcome(
+                msg_id,
+                dispatched=False,
+                attempts=attempts,
+                retry_in_seconds=None,
+                error="lease expired during the last attempt",
+            )
+        async with self._slot(topic):
+            self._in_flight[topic] += 1
             try:
-                await self._dispatch(topic, msg["payload"])
-            except Exception as e:  # noqa: BLE001
-                # schedule retry
-                new_attempts = attempts + 1
-                delay = self.retry_policy.compute_delay(attempts)
-                logger.warning(
-                    "dispatch failed; scheduling retry",
-                    extra={
-                        "id": msg_id,
-                        "topic": topic,
-                        "attempts": new_attempts,
-                        "retry_in_s": delay,
-                    },
+                logger.info(
+                    "processing message",
+                    extra={"id": msg_id, "topic": topic, "attempts": attempts},
                 )
-                await self._mark_failed(msg_id, new_attempts, delay)
-            else:
-                await self._mark_dispatched(msg_id)
+                try:
+                    await self._dispatch(
+                        topic,
+                        msg["payload"],
+                        idempotency_key=msg["idempotency_key"] or f"outbox-{msg_id}",
+                    )
+                except Exception as e:  # noqa: BLE001
+                    # schedule retry, unless that was the last attempt
+                    new_attempts = attempts + 1
+                    delay = (
+                        None
+                        if self.retry_policy.exhausted(new_attempts)
+                        else self.retry_policy.compute_delay(attempts)
+                    )
+                    logger.warning(
+                        "dispatch failed; scheduling retry"
+                        if delay is not None
+                        else "dispatch failed; out of attempts, giving up",
+                        extra={
+                            "id": msg_id,
+                            "topic": topic,
+                            "attempts": new_attempts,
+                            "retry_in_s": delay,
+                        },
+                    )
+                    self._failed += 1
+                    return _Outcome(
+                        msg_id,
+                        dispatched=False,
+                        attempts=new_attempts,
+                        retry_in_seconds=delay,
+                        error=f"{type(e).__name__}: {e}"[:1000],
+                    )
+                self._dispatched += 1
+                return _Outcome(msg_id, dispatched=True)
+            finally:
+                self._in_flight[topic] -= 1
+                if not self._in_flight[topic]:
+                    del self._in_flight[topic]
 
-        return len(batch)
+    def stats(self) -> DispatcherStats:
+        return DispatcherStats(
+            in_flight=sum(self._in_flight.values()),
+            in_flight_by_topic=dict(self._in_flight),
+            dispatched=self._dispatched,
+            failed=self._failed,
+            listening=self._listening,
+            leases_lost=self._leases_lost,
+        )
 
-    async def _dispatch(self, topic: str, payload: dict[str, Any]) -> None:
+    async def _dispatch(
+        self,
+        topic: str,
+        payload: dict[str, Any],
+        *,
+        idempotency_key: str | None = None,
+    ) -> None:
         """
         Route by topic. For now we only support 'user.verification_code'.
+        The idempotency key is passed on so retries of the same message are not
+        sent twice by the provider.
         """
         if topic == "user.verification_code":
             to = payload["to"]
             subject = payload["subject"]
             body = payload["body"]
-            await self.email_adapter.send(to=to, subject=subject, body=body)
+            await self.email_adapter.send(
+                to=to, subject=subject, body=body, idempotency_key=idempotency_key
+            )
             return
 
         # Unknown topic -> treated as failure to trigger retry path
         raise RuntimeError(f"unknown topic: {topic}")
 
+    @asynccontextmanager
+    async def _connection(self) -> AsyncIterator[psycopg.AsyncConnection]:
+        """
+        A pooled connection. The pool rolls back a connection returned with an
+        error, and psycopg drops its prepared statements with that rollback;
+        the registry shared with the repositories is told so.
+        """
+        async with self.pool.connection() as conn:
+            try:
+                yield conn
+            except BaseException:
+                self._statements.forget(conn)
+                raise
+
     async def _claim_due_batch(self, limit: int) -> list[dict[str, Any]]:
         """
-        Atomically move up to `limit` due 'pending' rows into 'processing'
-        and return them.
+        Atomically lease up to `limit` due rows to this worker ('processing',
+        `locked_by`, available_at = end of the lease) and return them. Due rows
+        are 'pending' ones whose time has come and 'processing' ones whose lease
+        has expired. Reclaiming a row counts the send that lost its lease as an
+        attempt, so a message that takes its worker down with it still runs
+        out of attempts.
+
+        They are read in (available_at, id) order off the partial index
+        `outbox_claimable_due_idx`: a range scan that stops after `limit` rows,
+        however long the backlog.
         """
         sql = """
         WITH claimed AS (
             SELECT id
             FROM outbox
-            WHERE status = 'pending'
-              AND COALESCE(next_attempt_at, NOW()) <= NOW()
-            ORDER BY created_at
+            WHERE status IN ('pending', 'processing')
+              AND available_at <= NOW()
+            ORDER BY available_at, id
             FOR UPDATE SKIP LOCKED
             LIMIT %s
         ),
         updated AS (
             UPDATE outbox o
-            SET status = 'processing', updated_at = NOW()
+            SET status = 'processing',
+                locked_by = %s,
+                attempts = o.attempts + (o.status = 'processing')::int,
+                available_at = NOW() + make_interval(secs => %s),
+                updated_at = NOW()
             FROM claimed c
             WHERE o.id = c.id
-            RETURNING o.id, o.topic, o.payload, o.attempts
+            RETURNING o.id, o.topic, o.payload, o.attempts, o.idempotency_key
         )
-        SELECT id, topic, payload, attempts
+        SELECT id, topic, payload, attempts, idempotency_key
         FROM updated
         ORDER BY id;
         """
-        async with self.pool.connection() as conn:
+        async with self._connection() as conn:
             async with conn.transaction():
                 async with conn.cursor() as cur:  # type: AsyncCursor
-                    await cur.execute(sql, (limit,))
+                    await cur.execute(sql, (limit, self.worker_id, self.lease_seconds))
                     rows = await cur.fetchall()
 
         batch: list[dict[str, Any]] = []
@@ -155,37 +448,103 @@ class OutboxDispatcher:
                     "topic": r[1],
                     "payload": r[2],
                     "attempts": r[3],
+                    "idempotency_key": r[4],
                 }
             )
         return batch
 
-    async def _mark_dispatched(self, msg_id: int) -> None:
+    async def _seconds_until_next_due(self) -> float | None:
+        """Time until the earliest retry or lease expiry, None if there is none."""
+        sql = """
+        SELECT EXTRACT(EPOCH FROM MIN(available_at) - NOW())::float8
+        FROM outbox
+        WHERE status IN ('pending', 'processing') AND available_at > NOW();
+        """
+        async with self._connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(sql)
+                row = await cur.fetchone()
+        return row[0] if row else None
+
+    async def _keep_leases(self, ids: list[int]) -> None:
+        """Extend the leases on `ids` every third of the lease, until cancelled."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                extended = await self._extend_leases(ids)
+            except psycopg.Error:
+                logger.warning("could not extend outbox leases", exc_info=True)
+                continue
+            if extended < len(ids):
+                logger.warning(
+                    "outbox leases lost",
+                    extra={"worker_id": self.worker_id, "lost": len(ids) - extended},
+                )
+
+    async def _extend_leases(self, ids: list[int]) -> int:
         sql = """
         UPDATE outbox
-        SET status = 'dispatched',
-            updated_at = NOW()
-        WHERE id = %s;
+        SET available_at = NOW() + make_interval(secs => %s)
+        WHERE id = ANY(%s) AND status = 'processing' AND locked_by = %s;
         """
-        async with self.pool.connection() as conn:
+        async with self._connection() as conn:
             async with conn.transaction():
                 async with conn.cursor() as cur:
-                    await cur.execute(sql, (msg_id,))
+                    await cur.execute(sql, (self.lease_seconds, ids, self.worker_id))
+                    return cur.rowcount
 
-    async def _mark_failed(
-        self, msg_id: int, attempts: int, delay_seconds: int
-    ) -> None:
+    async def _mark_batch(self, outcomes: list[_Outcome]) -> None:
         """
-        Move message back to 'pending', bump attempts, and set a next_attempt_at in the future.
+        Record the outcome of every message of a batch in one statement: sent
+        ones become 'dispatched'; failed ones go back to 'pending' with their
+        attempts, error and own retry delay (available_at), or become 'failed'
+        when out of attempts. Rows no longer leased to this worker are left
+        alone.
+
+        This runs once the whole batch is done, so a crash loses the outcome of
+        every message sent so far, not just the one in flight: they are sent
+        again after their leases expire. Nothing here deduplicates that; only
+        the idempotency key on each send (`_process_message`) lets the
+        provider drop the repeat.
         """
+        if not outcomes:
+            return
         sql = """
-        UPDATE outbox
-        SET status = 'pending',
-            attempts = %s,
-            next_attempt_at = NOW() + make_interval(secs => %s),
+        UPDATE outbox o
+        SET status = CASE
+                WHEN r.dispatched THEN 'dispatched'
+                WHEN r.retry_in_seconds IS NULL THEN 'failed'
+                ELSE 'pending'
+            END,
+            attempts = CASE WHEN r.dispatched THEN o.attempts ELSE r.attempts END,
+            available_at = CASE
+                WHEN r.dispatched OR r.retry_in_seconds IS NULL THEN o.available_at
+                ELSE NOW() + make_interval(secs => r.retry_in_seconds)
+            END,
+            last_error = CASE WHEN r.dispatched THEN o.last_error ELSE r.error END,
+            locked_by = NULL,
             updated_at = NOW()
-        WHERE id = %s;
+        FROM unnest(
+            %s::bigint[], %s::boolean[], %s::int[], %s::int[], %s::text[]
+        ) AS r(id, dispatched, attempts, retry_in_seconds, error)
+        WHERE o.id = r.id AND o.status = 'processing' AND o.locked_by = %s;
         """
-        async with self.pool.connection() as conn:
+        params = (
+            [o.id for o in outcomes],
+            [o.dispatched for o in outcomes],
+            [o.attempts for o in outcomes],
+            [o.retry_in_seconds for o in outcomes],
+            [o.error for o in outcomes],
+            self.worker_id,
+        )
+        async with self._connection() as conn:
             async with conn.transaction():
                 async with conn.cursor() as cur:
-                    await cur.execute(sql, (attempts, delay_seconds, msg_id))
+                    await cur.execute(sql, params)
+                    marked = cur.rowcount
+        if marked < len(outcomes):
+            self._leases_lost += len(outcomes) - marked
+            logger.warning(
+                "outbox outcomes dropped, leases lost",
+                extra={"worker_id": self.worker_id, "lost": len(outcomes) - marked},
+            )
@@ -8,8 +8,10 @@ import logging
 from app.logging import setup_logging
 from app.settings import get_settings
 from app.infrastructure.db.pool import get_pool, close_pool
+from app.infrastructure.db.prepared import get_prepared_statements
 from app.infrastructure.outbox.dispatcher import OutboxDispatcher, RetryPolicy
 from app.infrastructure.email.http_smtp_adapter import HttpSmtpEmailAdapter
+from app.stats import StatsLogger
 
 logger = logging.getLogger(__name__)
 
@@ -24,12 +26,24 @@ async def _run() -> None:
     logger.info("worker: pool opened")
 
     email = HttpSmtpEmailAdapter(base_url=settings.smtp_base_url)
+    # with LISTEN, polling only catches missed notifications
+    poll_ms = (
+        settings.outbox_fallback_poll_ms
+        if settings.outbox_listen
+        else settings.outbox_poll_interval_ms
+    )
     dispatcher = OutboxDispatcher(
         pool=pool,
         email_adapter=email,
-        batch_size=10,
-        poll_interval=1.0,
-        retry_policy=RetryPolicy(base=2, max_delay=300),
+        batch_size=settings.outbox_batch_size,
+        poll_interval=poll_ms / 1000,
+        retry_policy=RetryPolicy(
+            base=2, max_delay=300, max_attempts=settings.outbox_max_attempts or None
+        ),
+        max_concurrency=settings.outbox_max_concurrency,
+        topic_limits=settings.outbox_topic_concurrency,
+        listen_dsn=settings.database_url if settings.outbox_listen else None,
+        lease_seconds=settings.outbox_lease_seconds,
     )
 
     stop = asyncio.Event()
@@ -46,8 +60,21 @@ async def _run() -> None:
     worker_task = asyncio.create_task(dispatcher.run_forever())
     logger.info("worker: started run_forever loop")
 
+    stats_logger = None
+    if settings.stats_log_interval_seconds > 0:
+        stats_logger = StatsLogger(
+            {
+                "outbox_dispatcher": dispatcher.stats,
+                "prepared_statements": get_prepared_statements().stats,
+            },
+            interval=settings.stats_log_interval_seconds,
+        )
+        stats_logger.start()
+
     await stop.wait()
 
+    if stats_logger is not None:
+        await stats_logger.stop()
     worker_task.cancel()
     with suppress(asyncio.CancelledError):
         await worker_task
@@ -2,67 +2,200 @@ from __future__ import annotations
 
 import base64
 import hashlib
+from typing import Optional
 
 from redis.asyncio import Redis
 
-from app.domain.ports.activation_cache import ActivationCachePort
+from app.domain.ports.activation_cache import ActivationCachePort, CodeCheck
+from app.domain.services import make_keyed_code_digest
 
+# Compact encoding, one binary string per pending code:
+#   byte 0    version: 1 = SHA256(salt || code), 2 = keyed HMAC (no salt)
+#   byte 1    wrong attempts so far (see `check_code`)
+#   v1        16-byte salt + 32-byte digest (50 bytes)
+#   v2        32-byte digest (34 bytes)
+VERSION_SALTED = 1
+VERSION_KEYED = 2
+SALT_BYTES = 16
 
-_LUA_CONSUME = """
+_LUA_COMPARE = """
 -- KEYS[1]: activation key
--- ARGV[1]: expected digest (base64)
+-- ARGV[1]: expected keyed digest (raw), '' if unknown
+-- ARGV[2]: expected salted digest (raw), '' if the salt is not known yet
+-- ARGV[3]: max attempts (0 = no limit)
+-- ARGV[4]: '1' to delete on match, '0' to only check
+-- returns 1 (match), 0 (no match / missing), -2 (attempt limit hit, code burned),
+-- -1 (hash entry, older format) or the hex salt of a salted entry
 local key = KEYS[1]
-local expected = ARGV[1]
-local cur = redis.call('HGET', key, 'digest')
-if not cur then
+local kind = redis.call('TYPE', key)['ok']
+if kind == 'none' then
   return 0
 end
-if cur ~= expected then
+if kind == 'hash' then
+  return -1
+end
+local v = redis.call('GET', key)
+local version = string.byte(v, 1)
+local expected, digest
+if version == 1 then
+  if ARGV[2] == '' then
+    return (string.gsub(string.sub(v, 3, 18), '.', function(c)
+      return string.format('%02x', string.byte(c))
+    end))
+  end
+  expected, digest = ARGV[2], string.sub(v, 19)
+elseif version == 2 then
+  expected, digest = ARGV[1], string.sub(v, 3)
+else
   return 0
 end
-redis.call('DEL', key)
+if expected ~= '' and digest == expected then
+  if ARGV[4] == '1' then
+    redis.call('DEL', key)
+  end
+  return 1
+end
+local attempts = math.min(string.byte(v, 2) + 1, 255)
+local max_attempts = tonumber(ARGV[3])
+if max_attempts > 0 and attempts >= max_attempts then
+  redis.call('DEL', key)
+  return -2
+end
+-- SETRANGE keeps the TTL
+redis.call('SETRANGE', key, 1, string.char(attempts))
+return 0
+"""
+
+# Entries written as a hash {salt, digest} (base64) before the compact encoding;
+# kept until they have all expired (CODE_TTL_SECONDS after the rollout).
+_LUA_COMPARE_HASH = """
+-- KEYS[1]: activation key
+-- ARGV[1]: expected keyed digest (base64), '' if unknown
+-- ARGV[2]: expected salted digest (base64), '' if the salt is not known yet
+-- ARGV[3]: '1' to delete on match, '0' to only check (no attempt counter)
+-- returns 1 (match), 0 (no match / missing) or the salt of a salted entry
+local key = KEYS[1]
+local cur = redis.call('HMGET', key, 'salt', 'digest')
+local salt, digest = cur[1], cur[2]
+if not digest then
+  return 0
+end
+local expected = ARGV[1]
+if salt and salt ~= '' then
+  if ARGV[2] == '' then
+    return salt
+  end
+  expected = ARGV[2]
+end
+if expected == '' or digest ~= expected then
+  return 0
+end
+if ARGV[3] == '1' then
+  redis.call('DEL', key)
+end
 return 1
 """
 
 
-def _digest_b64(code: str, salt_b64: str) -> str:
+def _digest(code: str, salt: bytes) -> bytes:
     """
     Must match app.domain.services: digest = SHA256(salt || code).
     """
-    salt = base64.b64decode(salt_b64.encode("utf-8"))
     h = hashlib.sha256()
     h.update(salt)
     h.update(code.encode("utf-8"))
-    return base64.b64encode(h.digest()).decode("utf-8")
+    return h.digest()
+
+
+def encode_code(salt_b64: str, digest_b64: str, attempts: int = 0) -> bytes:
+    """Pack (salt, digest) into the compact binary value; empty salt -> keyed."""
+    salt = base64.b64decode(salt_b64.encode("utf-8"))
+    digest = base64.b64decode(digest_b64.encode("utf-8"))
+    if not salt:
+        return bytes((VERSION_KEYED, attempts)) + digest
+    if len(salt) != SALT_BYTES:
+        raise ValueError(f"salt must be {SALT_BYTES} bytes")
+    return bytes((VERSION_SALTED, attempts)) + salt + digest
 
 
 class RedisActivationCache(ActivationCachePort):
-    def __init__(self, redis: Redis, *, key_prefix: str = "act:") -> None:
+    """
+    Activation codes as one compact binary string per user (see `encode_code`),
+    written with a single `SET key value EX ttl`.
+
+    Wrong guesses are counted in the value itself, atomically with the compare,
+    and the code is deleted once `max_attempts` is reached.
+
+    With `code_secret` set, codes are expected to be stored with a keyed digest
+    (`make_keyed_code_digest`, empty salt): verification is then a single EVALSHA
+    round trip. Salted entries still validate, at the cost of a second call once
+    the script has handed back their salt.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        *,
+        key_prefix: str = "act:",
+        code_secret: Optional[str] = None,
+    ) -> None:
         self._redis = redis
         self._prefix = key_prefix
+        self._secret = code_secret or None
+        # EVALSHA, re-loading the script on NOSCRIPT (e.g. after a Redis restart)
+        self._compare = redis.register_script(_LUA_COMPARE)
+        self._compare_hash = redis.register_script(_LUA_COMPARE_HASH)
 
     def _key(self, user_id: str) -> str:
         return f"{self._prefix}{user_id}"
 
+    def _keyed_b64(self, user_id: str, code: str) -> str:
+        if not self._secret:
+            return ""
+        return make_keyed_code_digest(code, user_id, self._secret)
+
     async def store_hashed_code(
         self, user_id: str, salt_b64: str, digest_b64: str, ttl_seconds: int
     ) -> None:
-        key = self._key(user_id)
-        pipe = self._redis.pipeline(transaction=True)
-        pipe.hset(key, mapping={"salt": salt_b64, "digest": digest_b64})
-        pipe.expire(key, ttl_seconds)
-        await pipe.execute()
+        value = encode_code(salt_b64, digest_b64)
+        await self._redis.set(self._key(user_id), value, ex=ttl_seconds)
+
+    async def check_code(self, user_id: str, code: str, max_attempts: int) -> CodeCheck:
+        res = await self._run(user_id, code, max_attempts=max_attempts, consume=False)
+        if res == 1:
+            return "match"
+        if res == -2:
+            return "exhausted"
+        return "mismatch"
 
     async def verify_and_consume(self, user_id: str, code: str) -> bool:
+        return await self._run(user_id, code, max_attempts=0, consume=True) == 1
+
+    async def _run(
+        self, user_id: str, code: str, *, max_attempts: int, consume: bool
+    ) -> int:
         key = self._key(user_id)
-        # read salt (to compute expected digest)
-        stored = await self._redis.hgetall(key)
-        if not stored or "salt" not in stored or "digest" not in stored:
-            return False
-        expected = _digest_b64(code, stored["salt"])
-        # atomic compare-and-delete
-        res = await self._redis.eval(_LUA_CONSUME, 1, key, expected)
-        return int(res) == 1
+        keyed = base64.b64decode(self._keyed_b64(user_id, code))
+        args = [keyed, b"", max_attempts, int(consume)]
+        res = await self._compare(keys=[key], args=args)
+        if isinstance(res, str):
+            # salted entry: the script returned its salt (hex)
+            args[1] = _digest(code, bytes.fromhex(res))
+            res = await self._compare(keys=[key], args=args)
+        elif int(res) == -1:
+            return await self._run_hash_entry(key, user_id, code, consume=consume)
+        return int(res)
+
+    async def _run_hash_entry(
+        self, key: str, user_id: str, code: str, *, consume: bool
+    ) -> int:
+        args = [self._keyed_b64(user_id, code), "", int(consume)]
+        res = await self._compare_hash(keys=[key], args=args)
+        if isinstance(res, str):
+            salted = _digest(code, base64.b64decode(res))
+            args[1] = base64.b64encode(salted).decode()
+            res = await self._compare_hash(keys=[key], args=args)
+        return int(res)
 
     async def invalidate(self, user_id: str) -> None:
         await self._redis.delete(self._key(user_id))
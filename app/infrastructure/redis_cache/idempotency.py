@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Optional
+
+from redis.asyncio import Redis
+
+from app.domain.ports.idempotency_store import IdempotencyStorePort, StoredResponse
+
+_IN_PROGRESS = json.dumps({"status_code": None})
+
+
+class RedisIdempotencyStore(IdempotencyStorePort):
+    """
+    Responses of idempotent requests as JSON strings with a TTL.
+    `reserve` is a `SET NX` of an in-progress marker, followed by a GET only
+    when the key already exists (i.e. on retries).
+    """
+
+    def __init__(self, redis: Redis, *, key_prefix: str = "idem:") -> None:
+        self._redis = redis
+        self._prefix = key_prefix
+
+    def _key(self, key: str) -> str:
+        return f"{self._prefix}{key}"
+
+    async def reserve(self, key: str, ttl_seconds: int) -> Optional[StoredResponse]:
+        if await self._redis.set(self._key(key), _IN_PROGRESS, nx=True, ex=ttl_seconds):
+            return None
+        raw = await self._redis.get(self._key(key))
+        if raw is None:
+            # expired in between: treat as in progress, the client retries
+            return StoredResponse(status_code=None)
+        stored = json.loads(raw)
+        return StoredResponse(
+            status_code=stored["status_code"], body=stored.get("body")
+        )
+
+    async def complete(
+        self, key: str, status_code: int, body: Any, ttl_seconds: int
+    ) -> None:
+        value = json.dumps({"status_code": status_code, "body": body})
+        await self._redis.set(self._key(key), value, ex=ttl_seconds)
+
+    async def release(self, key: str) -> None:
+        await self._redis.delete(self._key(key))
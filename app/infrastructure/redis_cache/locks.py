@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import asyncio
+import secrets
+import time
+
+from redis.asyncio import Redis
+
+from app.domain.ports.distributed_lock import DistributedLockPort
+
+_LUA_RELEASE = """
+-- KEYS[1]: lock key
+-- ARGV[1]: token of the holder
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLock(DistributedLockPort):
+    """
+    Best-effort lock: `SET key token NX PX ttl`, released by compare-and-delete
+    so an expired holder can't drop someone else's lock.
+    """
+
+    def __init__(
+        self, redis: Redis, *, key_prefix: str = "lock:", poll_interval: float = 0.05
+    ) -> None:
+        self._redis = redis
+        self._prefix = key_prefix
+        self._poll = poll_interval
+        self._release = redis.register_script(_LUA_RELEASE)
+
+    def _key(self, key: str) -> str:
+        return f"{self._prefix}{key}"
+
+    async def acquire(self, key: str, ttl_seconds: float) -> str | None:
+        token = secrets.token_hex(16)
+        ok = await self._redis.set(
+            self._key(key), token, nx=True, px=max(1, int(ttl_seconds * 1000))
+        )
+        return token if ok else None
+
+    async def release(self, key: str, token: str) -> None:
+        await self._release(keys=[self._key(key)], args=[token])
+
+    async def wait_released(self, key: str, timeout_seconds: float) -> bool:
+        deadline = time.monotonic() + timeout_seconds
+        while await self._redis.exists(self._key(key)):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(self._poll)
+        return True
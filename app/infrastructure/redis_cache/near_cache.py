@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional, Sequence
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError, ResponseError
+
+logger = logging.getLogger("app.infrastructure.redis_cache.near_cache")
+
+INVALIDATE_CHANNEL = "__redis__:invalidate"
+
+
+@dataclass(frozen=True)
+class NearCacheStats:
+    tracking: bool
+    size: int
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class RedisNearCache:
+    """
+    In-process copy of Redis string values under `prefixes`, kept coherent by
+    server-assisted client-side caching (Redis 6+ `CLIENT TRACKING`).
+
+    One dedicated connection enables tracking in broadcasting mode for the
+    prefixes, redirected to itself, and subscribes to `__redis__:invalidate`:
+    Redis then pushes the name of every key under the prefixes that is written,
+    deleted, expired or evicted, by any client, and the local copy is dropped.
+
+    - Entries also carry the key's own expiry (`put(..., ttl_ms)`), so a value is
+      never served past it even if the expiry notification is late.
+    - A fill is dropped if an invalidation arrived since the caller captured
+      `epoch` before reading Redis (the value may be stale already).
+    - Until tracking is on (startup, lost connection) and if the server does not
+      support it, `get` returns None and callers simply read Redis.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        *,
+        prefixes: Sequence[str] = ("sess:",),
+        max_entries: int = 10_000,
+        reconnect_delay: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+        self._redis = redis
+        self._prefixes = tuple(prefixes)
+        self._max_entries = max_entries
+        self._reconnect_delay = reconnect_delay
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._tracking = False
+        self._epoch = 0
+        self._task: Optional[asyncio.Task] = None
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @property
+    def tracking(self) -> bool:
+        return self._tracking
+
+    @property
+    def epoch(self) -> int:
+        return self._epoch
+
+    def get(self, key: str) -> Optional[str]:
+        if not self._tracking:
+            return None
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self._clock():
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return entry[1]
+
+    def put(self, key: str, value: str, ttl_ms: int, *, epoch: int) -> bool:
+        if not self._tracking or epoch != self._epoch or ttl_ms <= 0:
+            return False
+        self._entries[key] = (self._clock() + ttl_ms / 1000.0, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+        return True
+
+    def _invalidate(self, keys: Optional[list]) -> None:
+        self._epoch += 1
+        if keys is None:  # FLUSHDB / FLUSHALL
+            self._entries.clear()
+            return
+        for key in keys:
+            self._invalidations += 1
+            self._entries.pop(key, None)
+
+    def _set_tracking(self, on: bool) -> None:
+        self._tracking = on
+        self._epoch += 1
+        self._entries.clear()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._set_tracking(False)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._listen()
+            except ResponseError as exc:
+                self._set_tracking(False)
+                logger.warning(
+                    "client tracking not available, near cache disabled",
+                    extra={"error": str(exc)},
+                )
+                return
+            except (RedisError, OSError):
+                self._set_tracking(False)
+                logger.warning("near cache invalidation connection lost")
+            await asyncio.sleep(self._reconnect_delay)
+
+    async def _command(self, conn, *args):
+        await conn.send_command(*args)
+        response = await conn.read_response()
+        if isinstance(response, ResponseError):
+            raise response
+        return response
+
+    async def _listen(self) -> None:
+        pool = self._redis.connection_pool
+        conn = await pool.get_connection()
+        try:
+            client_id = await self._command(conn, "CLIENT", "ID")
+            prefixes = [arg for p in self._prefixes for arg in ("PREFIX", p)]
+            await self._command(
+                conn,
+                "CLIENT",
+                "TRACKING",
+                "ON",
+                "REDIRECT",
+                client_id,
+                "BCAST",
+                *prefixes,
+            )
+            await self._command(conn, "SUBSCRIBE", INVALIDATE_CHANNEL)
+            self._set_tracking(True)
+            while True:
+                message = await conn.read_response()
+                if message[:2] == ["message", INVALIDATE_CHANNEL]:
+                    self._invalidate(message[2])
+        finally:
+            # tracking/subscription state must not go back into the pool
+            await conn.disconnect()
+            await pool.release(conn)
+
+    def stats(self) -> NearCacheStats:
+        return NearCacheStats(
+            tracking=self._tracking,
+            size=len(self._entries),
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            invalidations=self._invalidations,
+        )
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Optional, Protocol
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.domain.ports.profile_invalidation import ProfileInvalidationPort
+from app.infrastructure.redis_cache.sessions import RedisSessions
+
+logger = logging.getLogger("app.infrastructure.redis_cache.profile_invalidation")
+
+
+class LocalProfileCache(Protocol):
+    def invalidate(self, user_id: str) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class RedisProfileInvalidation(ProfileInvalidationPort):
+    """
+    Fans profile invalidations out to every API process over Redis pub/sub.
+
+    `invalidate` drops the local entry right away and PUBLISHes the user id;
+    the listener task (`start`/`stop`, run by the lifespan) drops the entry in
+    the other processes. Pub/sub is fire-and-forget, so whenever the listener
+    (re)subscribes it clears the whole local cache: anything published while it
+    was disconnected is lost. If a PUBLISH fails, other processes fall back to
+    the cache TTL.
+
+    With `sessions`, it first bumps the user's session version, so the user
+    snapshots embedded in existing sessions stop being served.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        cache: Optional[LocalProfileCache] = None,
+        *,
+        sessions: Optional[RedisSessions] = None,
+        channel: str = "users:invalidate",
+        reconnect_delay: float = 1.0,
+    ) -> None:
+        self._redis = redis
+        self._cache = cache
+        self._sessions = sessions
+        self._channel = channel
+        self._reconnect_delay = reconnect_delay
+        self._task: Optional[asyncio.Task] = None
+
+    async def invalidate(self, user_id: str) -> None:
+        if self._cache is not None:
+            self._cache.invalidate(user_id)
+        if self._sessions is not None:
+            try:
+                await self._sessions.bump_version(user_id)
+            except RedisError:
+                logger.error("could not bump session version, snapshots may be stale")
+        try:
+            await self._redis.publish(self._channel, user_id)
+        except RedisError:
+            logger.warning("could not publish profile invalidation")
+
+    def start(self) -> None:
+        if self._cache is not None and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._listen()
+            except RedisError:
+                logger.warning("profile invalidation listener disconnected")
+            await asyncio.sleep(self._reconnect_delay)
+
+    async def _listen(self) -> None:
+        assert self._cache is not None
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(self._channel)
+            self._cache.clear()
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    self._cache.invalidate(str(message["data"]))
+        finally:
+            await pubsub.aclose()
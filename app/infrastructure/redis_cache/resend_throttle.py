@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from redis.asyncio import Redis
+
+from app.domain.ports.resend_throttle import ResendThrottlePort
+
+
+class RedisResendThrottle(ResendThrottlePort):
+    """One `SET key 1 NX EX ttl` per registration, keyed by normalized email."""
+
+    def __init__(self, redis: Redis, *, key_prefix: str = "resend:") -> None:
+        self._redis = redis
+        self._prefix = key_prefix
+
+    def _key(self, email: str) -> str:
+        return f"{self._prefix}{email}"
+
+    async def try_acquire(self, email: str, ttl_seconds: int) -> bool:
+        return bool(await self._redis.set(self._key(email), 1, nx=True, ex=ttl_seconds))
+
+    async def release(self, email: str) -> None:
+        await self._redis.delete(self._key(email))
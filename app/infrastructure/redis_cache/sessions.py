@@ -1,28 +1,282 @@
 from __future__ import annotations
 
 import secrets
+import time
+from dataclasses import dataclass
 from typing import Optional
 from redis.asyncio import Redis
 
+from app.domain.entities import User
+from app.infrastructure.redis_cache.near_cache import RedisNearCache
+
+# Session value formats:
+#   "<user_id>"                                     plain session (user id only)
+#   "s1|<version>|<user_id>|<status>|<email>"       session with a user snapshot
+# The email goes last so a '|' in it can't shift the other fields. <version> is
+# the user's session version when the token was minted; a status change bumps
+# it (`bump_version`) and the snapshot no longer counts.
+SNAPSHOT_PREFIX = "s1|"
+
+# Each user's live tokens are indexed in a sorted set (`sessidx:<user_id>`,
+# score = expiry in ms) maintained by the same scripts that write the sessions.
+# Session keys named from the index or a session value can't be declared in
+# KEYS up front (fine on a single Redis, not on a cluster).
+_LUA_CREATE = """
+-- KEYS[1]: session key, KEYS[2]: user's session version key,
+-- KEYS[3]: user's session index
+-- ARGV[1]: token, ARGV[2]: user id, ARGV[3]: status ('' = plain session),
+-- ARGV[4]: email, ARGV[5]: ttl seconds, ARGV[6]: now (ms),
+-- ARGV[7]: max sessions per user (0 = no cap), ARGV[8]: session key prefix
+-- returns the number of older sessions evicted by the cap
+local value = ARGV[2]
+local ttl = tonumber(ARGV[5])
+local now = tonumber(ARGV[6])
+if ARGV[3] ~= '' then
+  local version = redis.call('GET', KEYS[2])
+  if version then
+    -- the version must outlive this snapshot, or a later INCR from scratch
+    -- could reach it again and make a stale snapshot current (sessions share
+    -- one TTL, so this only ever extends it)
+    redis.call('EXPIRE', KEYS[2], ttl)
+  else
+    version = '0'
+  end
+  value = 's1|' .. version .. '|' .. ARGV[2] .. '|' .. ARGV[3] .. '|' .. ARGV[4]
+end
+redis.call('SET', KEYS[1], value, 'EX', ttl)
+-- expired sessions are dropped from the index lazily, here
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now)
+-- scores stay strictly increasing, so 'oldest' holds within one millisecond too
+local score = now + ttl * 1000
+local newest = redis.call('ZRANGE', KEYS[3], -1, -1, 'WITHSCORES')
+if newest[2] and tonumber(newest[2]) >= score then
+  score = tonumber(newest[2]) + 1
+end
+redis.call('ZADD', KEYS[3], score, ARGV[1])
+local evicted = 0
+local max_sessions = tonumber(ARGV[7])
+if max_sessions > 0 then
+  evicted = redis.call('ZCARD', KEYS[3]) - max_sessions
+  if evicted > 0 then
+    for _, token in ipairs(redis.call('ZRANGE', KEYS[3], 0, evicted - 1)) do
+      redis.call('DEL', ARGV[8] .. token)
+    end
+    redis.call('ZREMRANGEBYRANK', KEYS[3], 0, evicted - 1)
+  else
+    evicted = 0
+  end
+end
+-- every session has the same TTL: the newest one expires last
+redis.call('EXPIRE', KEYS[3], ttl)
+return evicted
+"""
+
+_LUA_REVOKE = """
+-- KEYS[1]: session key
+-- ARGV[1]: token, ARGV[2]: session index key prefix
+local value = redis.call('GET', KEYS[1])
+if not value then
+  return 0
+end
+redis.call('DEL', KEYS[1])
+local user_id = value
+if string.sub(value, 1, 3) == 's1|' then
+  user_id = string.match(value, '^s1|[^|]*|([^|]*)|')
+end
+redis.call('ZREM', ARGV[2] .. user_id, ARGV[1])
+return 1
+"""
+
+_LUA_REVOKE_ALL = """
+-- KEYS[1]: user's session index
+-- ARGV[1]: session key prefix
+-- returns the number of sessions revoked
+local tokens = redis.call('ZRANGE', KEYS[1], 0, -1)
+for _, token in ipairs(tokens) do
+  redis.call('DEL', ARGV[1] .. token)
+end
+redis.call('DEL', KEYS[1])
+return #tokens
+"""
+
+_LUA_GET = """
+-- KEYS[1]: session key
+-- ARGV[1]: session version key prefix
+-- returns nil, or {value, current version ('' for a plain session), pttl}
+local value = redis.call('GET', KEYS[1])
+if not value then
+  return nil
+end
+local pttl = redis.call('PTTL', KEYS[1])
+if string.sub(value, 1, 3) ~= 's1|' then
+  return {value, '', pttl}
+end
+local _, _, user_id = string.find(value, '^s1|[^|]*|([^|]*)|')
+return {value, redis.call('GET', ARGV[1] .. user_id) or '0', pttl}
+"""
+
+
+@dataclass(frozen=True)
+class Session:
+    user_id: str
+    # present when the session carries a snapshot that is still current
+    user: Optional[User] = None
+
+
+def _parse(value: str) -> tuple[str, Optional[str], Optional[User]]:
+    """-> (user_id, snapshot version, snapshot) of a stored session value."""
+    if not value.startswith(SNAPSHOT_PREFIX):
+        return value, None, None
+    version, user_id, status, email = value[len(SNAPSHOT_PREFIX) :].split("|", 3)
+    return user_id, version, User(id=user_id, email=email, status=status)
+
 
 class RedisSessions:
     def __init__(
-        self, redis: Redis, *, key_prefix: str = "sess:", ttl_seconds: int = 86400
+        self,
+        redis: Redis,
+        *,
+        key_prefix: str = "sess:",
+        ttl_seconds: int = 86400,
+        snapshots: bool = False,
+        version_key_prefix: str = "sessver:",
+        index_key_prefix: str = "sessidx:",
+        max_sessions_per_user: int = 0,
+        near_cache: Optional[RedisNearCache] = None,
     ) -> None:
         self._redis = redis
         self._prefix = key_prefix
         self._ttl = ttl_seconds
+        self._snapshots = snapshots
+        self._version_prefix = version_key_prefix
+        self._index_prefix = index_key_prefix
+        self._max_sessions = max_sessions_per_user
+        self._near = near_cache
+        self._create_script = redis.register_script(_LUA_CREATE)
+        self._get_script = redis.register_script(_LUA_GET)
+        self._revoke_script = redis.register_script(_LUA_REVOKE)
+        self._revoke_all_script = redis.register_script(_LUA_REVOKE_ALL)
 
     def _key(self, token: str) -> str:
         return f"{self._prefix}{token}"
 
-    async def create(self, user_id: str) -> str:
+    def _version_key(self, user_id: str) -> str:
+        return f"{self._version_prefix}{user_id}"
+
+    def _index_key(self, user_id: str) -> str:
+        return f"{self._index_prefix}{user_id}"
+
+    async def create(self, user_id: str, *, user: Optional[User] = None) -> str:
+        """
+        Mint a token for user_id and add it to the user's session index, in one
+        script call. With `snapshots` on and `user` given, the session also
+        carries the user's email and status. Past `max_sessions_per_user`, the
+        user's oldest sessions are revoked.
+        """
         token = secrets.token_urlsafe(32)
-        await self._redis.set(self._key(token), user_id, ex=self._ttl)
+        snapshot = self._snapshots and user is not None
+        await self._create_script(
+            keys=[
+                self._key(token),
+                self._version_key(user_id),
+                self._index_key(user_id),
+            ],
+            args=[
+                token,
+                user_id,
+                user.status if snapshot else "",
+                user.email if snapshot else "",
+                self._ttl,
+                int(time.time() * 1000),
+                self._max_sessions,
+                self._prefix,
+            ],
+        )
         return token
 
     async def get(self, token: str) -> Optional[str]:
-        return await self._redis.get(self._key(token))
+        value = self._near.get(self._key(token)) if self._near is not None else None
+        if value is None:
+            value = await self._redis.get(self._key(token))
+        if value is None:
+            return None
+        return _parse(value)[0]
+
+    async def get_session(self, token: str) -> Optional[Session]:
+        """
+        One round trip: the session and, for a snapshot session, whether the
+        snapshot is still current. A stale snapshot comes back as `user=None`.
+
+        With a near cache whose tracking is on, a repeated lookup is answered
+        from process memory (session value and the user's session version).
+        """
+        if self._near is not None:
+            cached = self._from_near_cache(token)
+            if cached is not None:
+                return cached
+            epoch = self._near.epoch
+
+        found = await self._get_script(
+            keys=[self._key(token)], args=[self._version_prefix]
+        )
+        if not found:
+            return None
+        value, current_version, pttl = found
+        user_id, version, user = _parse(value)
+
+        if self._near is not None:
+            self._near.put(self._key(token), value, pttl, epoch=epoch)
+            if user is not None:
+                self._near.put(
+                    self._version_key(user_id), current_version, pttl, epoch=epoch
+                )
+
+        if user is not None and version != current_version:
+            user = None
+        return Session(user_id=user_id, user=user)
+
+    def _from_near_cache(self, token: str) -> Optional[Session]:
+        value = self._near.get(self._key(token))
+        if value is None:
+            return None
+        user_id, version, user = _parse(value)
+        if user is None:
+            return Session(user_id=user_id)
+        current_version = self._near.get(self._version_key(user_id))
+        if current_version is None:
+            return None
+        if version != current_version:
+            user = None
+        return Session(user_id=user_id, user=user)
+
+    async def bump_version(self, user_id: str) -> None:
+        """
+        Mark the snapshots of the user's existing sessions as stale. The version
+        key's TTL is set here and extended by every snapshot session minted
+        after, so it outlives every snapshot that recorded it.
+        """
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.incr(self._version_key(user_id))
+            pipe.expire(self._version_key(user_id), self._ttl)
+            await pipe.execute()
 
     async def revoke(self, token: str) -> None:
-        await self._redis.delete(self._key(token))
+        await self._revoke_script(
+            keys=[self._key(token)], args=[token, self._index_prefix]
+        )
+
+    async def revoke_all(self, user_id: str) -> int:
+        """Revoke every session of the user in one round trip; -> how many."""
+        return int(
+            await self._revoke_all_script(
+                keys=[self._index_key(user_id)], args=[self._prefix]
+            )
+        )
+
+    async def count(self, user_id: str) -> int:
+        """Live sessions of the user (entries past their expiry not counted)."""
+        return int(
+            await self._redis.zcount(
+                self._index_key(user_id), f"({int(time.time() * 1000)}", "+inf"
+            )
+        )
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.infrastructure.security.access_tokens import AccessClaims
+from app.infrastructure.security.bloom_filter import BloomFilter
+
+logger = logging.getLogger("app.infrastructure.redis_cache.token_revocations")
+
+
+@dataclass(frozen=True)
+class RevocationStats:
+    synced: bool
+    entries: int
+    filter_bytes: int
+    local_checks: int  # answered by the filter alone, no network call
+    redis_checks: int  # filter hit (or not synced): confirmed in Redis
+
+
+class RedisTokenRevocations:
+    """
+    Revocation of signed access tokens, checked from memory.
+
+    `revoke` writes `revoked:<token_id>` (expiring with the token) and appends the
+    token id to a Redis stream. Each API process follows the stream (`start`/
+    `stop`, run by the lifespan) into a local Bloom filter, so `is_revoked` of a
+    token that was never revoked costs no network call. A filter hit may be a
+    false positive, and is confirmed with the `revoked:` key; so is every check
+    while the filter is not synced (startup, Redis connection lost).
+
+    Stream entries older than the token TTL are trimmed on write: the tokens
+    they refer to have expired. The filter is rebuilt from the stream when it
+    grows past its capacity, sized to twice the stream length (at least
+    `capacity`) so that a stream longer than `capacity` does not trigger another
+    rebuild on the next read.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        *,
+        retention_seconds: int,
+        key_prefix: str = "revoked:",
+        stream: str = "revoked-tokens",
+        capacity: int = 100_000,
+        error_rate: float = 0.001,
+        block_ms: int = 5000,
+        reconnect_delay: float = 1.0,
+    ) -> None:
+        self._redis = redis
+        self._retention = retention_seconds
+        self._prefix = key_prefix
+        self._stream = stream
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._block_ms = block_ms
+        self._reconnect_delay = reconnect_delay
+
+        self._filter = BloomFilter(capacity, error_rate)
+        self._last_id = "0-0"
+        self._synced = False
+        self._task: Optional[asyncio.Task] = None
+
+        self._local_checks = 0
+        self._redis_checks = 0
+
+    def _key(self, token_id: str) -> str:
+        return f"{self._prefix}{token_id}"
+
+    async def revoke(self, claims: AccessClaims) -> None:
+        ttl = claims.expires_at - int(time.time())
+        if ttl <= 0:
+            return  # already expired
+        min_id = int((time.time() - self._retention) * 1000)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.set(self._key(claims.token_id), 1, ex=ttl)
+            pipe.xadd(
+                self._stream,
+                {"token_id": claims.token_id},
+                minid=max(min_id, 0),
+                approximate=True,
+            )
+            await pipe.execute()
+        self._filter.add(claims.token_id)
+
+    async def is_revoked(self, claims: AccessClaims) -> bool:
+        if self._synced and claims.token_id not in self._filter:
+            self._local_checks += 1
+            return False
+        self._redis_checks += 1
+        return bool(await self._redis.exists(self._key(claims.token_id)))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._synced = False
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._load()
+                while True:
+                    await self._follow()
+                    if len(self._filter) > self._filter.capacity:
+                        await self._load()
+            except RedisError:
+                self._synced = False
+                logger.warning("token revocation stream disconnected")
+            await asyncio.sleep(self._reconnect_delay)
+
+    async def _load(self) -> None:
+        """Rebuild the filter from the whole (trimmed) stream."""
+        length = await self._redis.xlen(self._stream)
+        rebuilt = BloomFilter(max(self._capacity, 2 * length), self._error_rate)
+        start = "-"
+        last_id = "0-0"
+        while True:
+            entries = await self._redis.xrange(self._stream, min=start, count=1000)
+            for entry_id, fields in entries:
+                rebuilt.add(fields["token_id"])
+                last_id = entry_id
+            if len(entries) < 1000:
+                break
+            start = f"({last_id}"
+        self._filter = rebuilt
+        self._last_id = last_id
+        self._synced = True
+
+    async def _follow(self) -> None:
+        found = await self._redis.xread(
+            {self._stream: self._last_id}, count=1000, block=self._block_ms
+        )
+        for _, entries in found or []:
+            for entry_id, fields in entries:
+                self._filter.add(fields["token_id"])
+                self._last_id = entry_id
+
+    def stats(self) -> RevocationStats:
+        return RevocationStats(
+            synced=self._synced,
+            entries=len(self._filter),
+            filter_bytes=self._filter.size_bytes,
+            local_checks=self._local_checks,
+            redis_checks=self._redis_checks,
+        )
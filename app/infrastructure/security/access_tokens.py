@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import secrets
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+TOKEN_PREFIX = "at1"
+
+
+@dataclass(frozen=True)
+class AccessClaims:
+    user_id: str
+    token_id: str
+    expires_at: int  # unix seconds
+
+
+def _sign(secret: bytes, message: str) -> str:
+    mac = hmac.new(secret, message.encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(mac).rstrip(b"=").decode("ascii")
+
+
+class SignedAccessTokens:
+    """
+    Stateless bearer tokens, verified without any network call:
+
+        at1.<user_id>.<token_id>.<expires_at>.<signature>
+
+    signature = HMAC-SHA256(secret, everything before it), base64url without
+    padding. `token_id` is random and is what revocation refers to. The fields
+    never contain a '.' (UUIDs, token_urlsafe, digits).
+    """
+
+    def __init__(
+        self,
+        secret: str,
+        *,
+        ttl_seconds: int = 3600,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if not secret:
+            raise ValueError("an access token secret is required")
+        self._secret = secret.encode("utf-8")
+        self._ttl = ttl_seconds
+        self._clock = clock
+
+    @staticmethod
+    def looks_signed(token: str) -> bool:
+        """Cheap format check, to route a token to this backend or to sessions."""
+        return token.startswith(TOKEN_PREFIX + ".")
+
+    def issue(self, user_id: str) -> str:
+        expires_at = int(self._clock()) + self._ttl
+        body = f"{TOKEN_PREFIX}.{user_id}.{secrets.token_urlsafe(12)}.{expires_at}"
+        return f"{body}.{_sign(self._secret, body)}"
+
+    def verify(self, token: str) -> Optional[AccessClaims]:
+        """Claims of a well-formed, authentic, unexpired token; None otherwise."""
+        body, _, signature = token.rpartition(".")
+        parts = body.split(".")
+        if len(parts) != 4 or parts[0] != TOKEN_PREFIX:
+            return None
+        if not hmac.compare_digest(signature, _sign(self._secret, body)):
+            return None
+        _, user_id, token_id, expires_at = parts
+        try:
+            expires = int(expires_at)
+        except ValueError:
+            return None
+        if expires <= self._clock():
+            return None
+        return AccessClaims(user_id=user_id, token_id=token_id, expires_at=expires)
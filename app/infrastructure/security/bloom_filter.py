@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    `item in f` is False for anything never added; it may be True for an item
+    that was not added, with probability about `error_rate` while at most
+    `capacity` items were added. Items can't be removed: rebuild a new filter.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be in (0, 1)")
+        self.capacity = capacity
+        self._bits = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self._hashes = max(1, round(self._bits / capacity * math.log(2)))
+        self._array = bytearray((self._bits + 7) // 8)
+        self._count = 0
+
+    def __len__(self) -> int:
+        """Items added (including repeats)."""
+        return self._count
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._array)
+
+    def _positions(self, item: str):
+        # double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self._hashes):
+            yield (h1 + i * h2) % self._bits
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self._array[pos >> 3] |= 1 << (pos & 7)
+        self._count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self._array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item)
+        )
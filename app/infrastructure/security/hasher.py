@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Literal, Optional
+
+from app.infrastructure.security.password import hash_password, verify_password
+from app.settings import get_settings
+
+ExecutorKind = Literal["process", "thread"]
+
+
+class PasswordHasherOverloaded(RuntimeError):
+    """Raised when the hashing queue is full and the work is rejected up front."""
+
+
+@dataclass(frozen=True)
+class HasherStats:
+    queue_depth: int
+    in_flight: int
+    submitted: int
+    completed: int
+    rejected: int
+    avg_wait_ms: float
+    max_wait_ms: float
+
+
+class AsyncPasswordHasher:
+    """
+    Runs bcrypt hashing/verification off the event loop.
+
+    - At most `max_workers` jobs run in the executor at once.
+    - At most `max_queue` callers wait for a worker slot; extra callers get
+      PasswordHasherOverloaded immediately instead of queueing without bound.
+    - `stats()` reports the current queue depth and the time callers spent
+      waiting for a slot.
+    """
+
+    def __init__(
+        self,
+        *,
+        executor_kind: ExecutorKind = "process",
+        max_workers: int = 2,
+        max_queue: int = 64,
+        rounds: int | None = None,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        if executor_kind not in ("process", "thread"):
+            raise ValueError(f"unknown executor kind: {executor_kind}")
+        if max_workers < 1:
+            raise ValueError("max_workers must be >= 1")
+        self._executor_kind = executor_kind
+        self._max_workers = max_workers
+        self._max_queue = max_queue
+        self._rounds = int(rounds if rounds is not None else get_settings().bcrypt_rounds)
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._slots = asyncio.Semaphore(max_workers)
+
+        self._waiting = 0
+        self._in_flight = 0
+        self._submitted = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self._executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers, thread_name_prefix="bcrypt"
+                )
+        return self._executor
+
+    async def hash(self, plain: str) -> str:
+        return await self._submit(functools.partial(hash_password, rounds=self._rounds), plain)
+
+    async def verify(self, plain: str, password_hash: str) -> bool:
+        return await self._submit(verify_password, plain, password_hash)
+
+    async def _submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._waiting >= self._max_queue:
+            self._rejected += 1
+            raise PasswordHasherOverloaded(
+                f"password hashing queue is full ({self._max_queue} waiting)"
+            )
+
+        self._submitted += 1
+        self._waiting += 1
+        enqueued_at = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+
+        waited = time.perf_counter() - enqueued_at
+        self._wait_total += waited
+        if waited > self._wait_max:
+            self._wait_max = waited
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._in_flight -= 1
+            self._completed += 1
+            self._slots.release()
+
+    def stats(self) -> HasherStats:
+        started = self._submitted - self._waiting
+        avg = (self._wait_total / started) if started > 0 else 0.0
+        return HasherStats(
+            queue_depth=self._waiting,
+            in_flight=self._in_flight,
+            submitted=self._submitted,
+            completed=self._completed,
+            rejected=self._rejected,
+            avg_wait_ms=avg * 1000.0,
+            max_wait_ms=self._wait_max * 1000.0,
+        )
+
+    async def aclose(self) -> None:
+        if self._executor is not None and self._owns_executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
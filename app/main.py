@@ -1,17 +1,36 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
-from app.infrastructure.db.pool import get_pool, close_pool
+from app.application.profile_cache import ProfileCache
+from app.application.single_flight import SingleFlight
+from app.infrastructure.db.pool import (
+    close_pool,
+    close_replica_pools,
+    get_pool,
+    get_replica_pools,
+    open_replica_pools,
+)
+from app.infrastructure.db.prepared import get_prepared_statements
 from app.infrastructure.email.http_smtp_adapter import HttpSmtpEmailAdapter
 from app.infrastructure.http.client import (
     close_http_client,
     open_http_client,
     get_http_client,
 )
+from app.infrastructure.redis_cache.locks import RedisLock
+from app.infrastructure.redis_cache.near_cache import RedisNearCache
 from app.infrastructure.redis_cache.pool import get_redis, close_redis
+from app.infrastructure.redis_cache.profile_invalidation import (
+    RedisProfileInvalidation,
+)
+from app.infrastructure.redis_cache.sessions import RedisSessions
+from app.infrastructure.redis_cache.token_revocations import RedisTokenRevocations
+from app.infrastructure.security.hasher import AsyncPasswordHasher
 from app.logging import setup_logging
+from app.presentation.admission import install_admission_control
 from app.presentation.api import api
 from app.settings import get_settings
+from app.stats import StatsLogger
 
 settings = get_settings()
 
@@ -22,6 +41,8 @@ async def lifespan(app: FastAPI):
     pool = get_pool()
     if not getattr(pool, "is_open", False):
         await pool.open()
+    # read replicas (if configured) for login and /me lookups
+    await open_replica_pools()
 
     await open_http_client()
 
@@ -34,13 +55,111 @@ async def lifespan(app: FastAPI):
     )
     app.state.email_adapter = email_adapter  # expose to dependencies
 
+    # bcrypt runs in a bounded pool so it never blocks the event loop
+    password_hasher = None
+    if settings.password_hasher_mode != "inline":
+        password_hasher = AsyncPasswordHasher(
+            executor_kind=settings.password_hasher_mode,
+            max_workers=settings.password_hasher_workers,
+            max_queue=settings.password_hasher_max_queue,
+            rounds=settings.bcrypt_rounds,
+        )
+    app.state.password_hasher = password_hasher
+
+    # double-submitted registrations share one bcrypt + upsert + email
+    register_single_flight = None
+    if settings.register_single_flight:
+        lock_ttl = settings.register_single_flight_lock_ttl_ms / 1000.0
+        register_single_flight = SingleFlight(
+            lock=(
+                RedisLock(get_redis())
+                if settings.register_single_flight_redis_lock
+                else None
+            ),
+            lock_ttl_seconds=lock_ttl,
+            lock_wait_seconds=lock_ttl,
+        )
+    app.state.register_single_flight = register_single_flight
+
+    # /me reads served from memory; mutations are fanned out over pub/sub
+    # (published even with the cache off here: other workers may have it on)
+    profile_cache = None
+    if settings.profile_cache_enabled:
+        profile_cache = ProfileCache(
+            max_entries=settings.profile_cache_max_entries,
+            ttl_seconds=settings.profile_cache_ttl_seconds,
+        )
+    profile_invalidation = RedisProfileInvalidation(
+        get_redis(),
+        profile_cache,
+        sessions=RedisSessions(get_redis(), ttl_seconds=settings.session_ttl_seconds),
+    )
+    profile_invalidation.start()
+    app.state.profile_cache = profile_cache
+    app.state.profile_invalidation = profile_invalidation
+
+    # signed bearer tokens: revocations followed into an in-process filter
+    token_revocations = None
+    if settings.auth_token_mode == "signed":
+        token_revocations = RedisTokenRevocations(
+            get_redis(), retention_seconds=settings.access_token_ttl_seconds
+        )
+        token_revocations.start()
+    app.state.token_revocations = token_revocations
+
+    # repeated session lookups answered in process, invalidated by Redis
+    session_near_cache = None
+    if settings.session_near_cache:
+        session_near_cache = RedisNearCache(
+            get_redis(),
+            prefixes=("sess:", "sessver:"),
+            max_entries=settings.session_near_cache_max_entries,
+        )
+        session_near_cache.start()
+    app.state.session_near_cache = session_near_cache
+
+    loop_lag_monitor = getattr(app.state, "loop_lag_monitor", None)
+    if loop_lag_monitor is not None:
+        loop_lag_monitor.start()
+
+    # the counters of everything above, in one periodic log line
+    stats_logger = None
+    if settings.stats_log_interval_seconds > 0:
+        components = {
+            "admission": getattr(app.state, "admission", None),
+            "password_hasher": password_hasher,
+            "register_single_flight": register_single_flight,
+            "profile_cache": profile_cache,
+            "session_near_cache": session_near_cache,
+            "token_revocations": token_revocations,
+            "read_replicas": get_replica_pools(),
+            "prepared_statements": get_prepared_statements(),
+        }
+        stats_logger = StatsLogger(
+            {name: c.stats for name, c in components.items() if c is not None},
+            interval=settings.stats_log_interval_seconds,
+        )
+        stats_logger.start()
+
     try:
         yield
     finally:
         # shutdown
+        if stats_logger is not None:
+            await stats_logger.stop()
+        if loop_lag_monitor is not None:
+            await loop_lag_monitor.stop()
+        await profile_invalidation.stop()
+        if token_revocations is not None:
+            await token_revocations.stop()
+        if session_near_cache is not None:
+            await session_near_cache.stop()
+        if password_hasher is not None:
+            await password_hasher.aclose()
         await email_adapter.aclose()  # it won't close the shared client
         await close_http_client()  # closes the shared client
         await close_redis()
+        await close_replica_pools()
         await close_pool()
 
 
@@ -48,6 +167,7 @@ def create_app() -> FastAPI:
     setup_logging(settings.log_level)
     app = FastAPI(title="Registration API", version="0.1.0", lifespan=lifespan)
     app.state.settings = settings
+    install_admission_control(app, settings)
     app.include_router(api)
     return app
 
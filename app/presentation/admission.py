@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+from fastapi import FastAPI, Request
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.infrastructure.db.pool import get_pool
+from app.infrastructure.security.hasher import PasswordHasherOverloaded
+from app.settings import Settings
+
+logger = logging.getLogger("app.presentation.admission")
+
+# bcrypt-heavy routes; both slash variants so a redirect can't sneak around the limit
+AUTH_ROUTES: frozenset[tuple[str, str]] = frozenset(
+    {
+        ("POST", "/v1/users"),
+        ("POST", "/v1/users/"),
+        ("POST", "/v1/users/activate"),
+        ("POST", "/v1/users/login"),
+    }
+)
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag: how late a periodic `sleep(interval)` wakes up.
+    A loop that is busy with blocking work shows up as a growing lag.
+    """
+
+    def __init__(self, *, interval: float = 0.1) -> None:
+        self._interval = interval
+        self._lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def lag_seconds(self) -> float:
+        return self._lag
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._lag = 0.0
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self._interval)
+            self._lag = max(0.0, time.perf_counter() - started - self._interval)
+
+
+@dataclass(frozen=True)
+class AdmissionStats:
+    in_flight: int
+    waiting: int
+    admitted: int
+    shed: dict[str, int]
+
+
+class AdmissionController:
+    """
+    Caps concurrent auth operations and sheds load early.
+
+    A request is rejected without waiting when the DB pool already has too many
+    waiters, when the event loop lags, or when too many requests are queued.
+    Otherwise it waits up to `queue_wait_budget` seconds for a slot.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_in_flight: int,
+        queue_wait_budget: float,
+        max_waiting: int = 64,
+        max_loop_lag: float | None = None,
+        max_db_waiting: int | None = None,
+        loop_lag: Callable[[], float] | None = None,
+        db_waiting: Callable[[], int] | None = None,
+    ) -> None:
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._budget = queue_wait_budget
+        self._max_waiting = max_waiting
+        self._max_loop_lag = max_loop_lag
+        self._max_db_waiting = max_db_waiting
+        self._loop_lag = loop_lag
+        self._db_waiting = db_waiting
+
+        self._in_flight = 0
+        self._waiting = 0
+        self._admitted = 0
+        self._shed: dict[str, int] = {}
+
+    def _reject(self, reason: str) -> bool:
+        self._shed[reason] = self._shed.get(reason, 0) + 1
+        logger.warning("auth request shed", extra={"reason": reason})
+        return False
+
+    async def acquire(self) -> bool:
+        if (
+            self._db_waiting is not None
+            and self._max_db_waiting is not None
+            and self._db_waiting() > self._max_db_waiting
+        ):
+            return self._reject("db_pool")
+        if (
+            self._loop_lag is not None
+            and self._max_loop_lag is not None
+            and self._loop_lag() > self._max_loop_lag
+        ):
+            return self._reject("loop_lag")
+        if self._waiting >= self._max_waiting:
+            return self._reject("queue_full")
+
+        self._waiting += 1
+        acquired = False
+        try:
+            # not wait_for: on 3.11 it can drop a permit granted just as the
+            # timeout or a cancellation lands
+            async with asyncio.timeout(self._budget):
+                await self._slots.acquire()
+                acquired = True
+        except BaseException as e:
+            if acquired:
+                self._slots.release()
+            if isinstance(e, TimeoutError):
+                return self._reject("queue_timeout")
+            raise
+        finally:
+            self._waiting -= 1
+
+        self._in_flight += 1
+        self._admitted += 1
+        return True
+
+    def release(self) -> None:
+        self._in_flight -= 1
+        self._slots.release()
+
+    def stats(self) -> AdmissionStats:
+        return AdmissionStats(
+            in_flight=self._in_flight,
+            waiting=self._waiting,
+            admitted=self._admitted,
+            shed=dict(self._shed),
+        )
+
+
+def _busy_response(retry_after_seconds: int) -> JSONResponse:
+    return JSONResponse(
+        {"detail": "server busy, retry later"},
+        status_code=503,
+        headers={"Retry-After": str(retry_after_seconds)},
+    )
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware guarding `routes` with an AdmissionController."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        controller: AdmissionController,
+        routes: Iterable[tuple[str, str]] = AUTH_ROUTES,
+        retry_after_seconds: int = 1,
+    ) -> None:
+        self.app = app
+        self._controller = controller
+        self._routes = frozenset(routes)
+        self._retry_after = retry_after_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or (scope["method"], scope["path"]) not in self._routes
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if not await self._controller.acquire():
+            await _busy_response(self._retry_after)(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._controller.release()
+
+
+def _db_pool_waiting() -> int:
+    return int(get_pool().get_stats().get("requests_waiting", 0))
+
+
+def install_admission_control(app: FastAPI, settings: Settings) -> None:
+    """
+    Wire admission control into the app:
+    - a loop-lag monitor (started/stopped by the lifespan)
+    - the middleware on the auth routes
+    - a 503 handler for a saturated password hasher
+    """
+    retry_after = settings.auth_retry_after_seconds
+
+    async def _hasher_overloaded(_: Request, __: PasswordHasherOverloaded):
+        return _busy_response(retry_after)
+
+    app.add_exception_handler(PasswordHasherOverloaded, _hasher_overloaded)
+
+    if not settings.auth_admission_enabled:
+        return
+
+    monitor = LoopLagMonitor()
+    controller = AdmissionController(
+        max_in_flight=settings.auth_max_in_flight,
+        queue_wait_budget=settings.auth_queue_wait_ms / 1000.0,
+        max_waiting=settings.auth_max_waiting,
+        max_loop_lag=settings.auth_max_loop_lag_ms / 1000.0,
+        max_db_waiting=settings.auth_max_db_waiting,
+        loop_lag=lambda: monitor.lag_seconds,
+        db_waiting=_db_pool_waiting,
+    )
+    app.add_middleware(
+        AdmissionMiddleware,
+        controller=controller,
+        retry_after_seconds=retry_after,
+    )
+    app.state.loop_lag_monitor = monitor
+    app.state.admission = controller
@@ -1,45 +1,147 @@
-from typing import Callable
+from typing import Awaitable, Callable, Optional
 
-from fastapi import Request
+from fastapi import Depends, Request
 
+from app.application.profile_cache import ProfileCache
+from app.application.single_flight import SingleFlight
 from app.domain.ports.activation_cache import ActivationCachePort
 from app.domain.ports.email_port import EmailPort
+from app.domain.ports.idempotency_store import IdempotencyStorePort
+from app.domain.ports.profile_invalidation import ProfileInvalidationPort
+from app.domain.ports.resend_throttle import ResendThrottlePort
 from app.domain.ports.unit_of_work import UnitOfWorkPort
-from app.infrastructure.db.pool import get_pool
-from app.infrastructure.db.uow import PgUnitOfWork
+from app.infrastructure.db.pool import get_pool, get_replica_pools
+from app.infrastructure.db.uow import (
+    PgPipelinedUnitOfWork,
+    PgReadOnlyUnitOfWork,
+    PgUnitOfWork,
+)
 from app.infrastructure.email.http_smtp_adapter import HttpSmtpEmailAdapter
 from app.infrastructure.http.client import get_http_client
 from app.infrastructure.redis_cache.activation_cache import RedisActivationCache
+from app.infrastructure.redis_cache.idempotency import RedisIdempotencyStore
 from app.infrastructure.redis_cache.pool import get_redis
+from app.infrastructure.redis_cache.resend_throttle import RedisResendThrottle
 from app.infrastructure.redis_cache.sessions import RedisSessions
+from app.infrastructure.redis_cache.token_revocations import RedisTokenRevocations
+from app.infrastructure.security.access_tokens import SignedAccessTokens
+from app.infrastructure.security.hasher import AsyncPasswordHasher
 from app.infrastructure.security.password import hash_password, verify_password
 from app.settings import get_settings
 
 
 def get_uow() -> UnitOfWorkPort:
+    if get_settings().db_pipeline_mode:
+        return PgPipelinedUnitOfWork(get_pool())
     return PgUnitOfWork(get_pool())
 
 
+def get_read_uow() -> UnitOfWorkPort:
+    # single-statement lookups: autocommit, no BEGIN/ROLLBACK round trips;
+    # served by a read replica when DATABASE_REPLICA_URLS has a healthy one
+    return PgReadOnlyUnitOfWork(get_pool(), replicas=get_replica_pools())
+
+
 def get_activation_cache() -> ActivationCachePort:
-    return RedisActivationCache(get_redis())
+    return RedisActivationCache(
+        get_redis(), code_secret=get_settings().code_digest_secret
+    )
+
+
+def get_resend_throttle() -> ResendThrottlePort:
+    return RedisResendThrottle(get_redis())
+
+
+def get_idempotency_store() -> IdempotencyStorePort:
+    return RedisIdempotencyStore(get_redis())
+
+
+def get_password_hasher(request: Request) -> Optional[AsyncPasswordHasher]:
+    # Set in app.main lifespan() unless PASSWORD_HASHER_MODE=inline
+    return getattr(request.app.state, "password_hasher", None)
+
+
+def get_register_single_flight(request: Request) -> Optional[SingleFlight]:
+    # Set in app.main lifespan() unless REGISTER_SINGLE_FLIGHT=false
+    return getattr(request.app.state, "register_single_flight", None)
+
+
+def get_profile_cache(request: Request) -> Optional[ProfileCache]:
+    # Set in app.main lifespan() unless PROFILE_CACHE_ENABLED=false
+    return getattr(request.app.state, "profile_cache", None)
+
+
+def get_profile_invalidation(request: Request) -> Optional[ProfileInvalidationPort]:
+    # Set in app.main lifespan()
+    return getattr(request.app.state, "profile_invalidation", None)
 
 
-def get_hash_password() -> Callable[..., str]:
-    return hash_password
+def get_hash_password(
+    hasher: Optional[AsyncPasswordHasher] = Depends(get_password_hasher),
+) -> Callable[..., str | Awaitable[str]]:
+    if hasher is None:
+        return hash_password
+    return hasher.hash
 
 
-def get_verify_password() -> Callable[[str, str], bool]:
-    return verify_password
+def get_verify_password(
+    hasher: Optional[AsyncPasswordHasher] = Depends(get_password_hasher),
+) -> Callable[[str, str], bool | Awaitable[bool]]:
+    if hasher is None:
+        return verify_password
+    return hasher.verify
 
 
 def get_code_ttl_seconds() -> int:
     return get_settings().code_ttl_seconds
 
 
+def get_resend_throttle_seconds() -> int:
+    return get_settings().resend_throttle_seconds
+
+
+def get_idempotency_ttl_seconds() -> int:
+    return get_settings().idempotency_ttl_seconds
+
+
+def get_code_attempts() -> int:
+    return get_settings().code_attempts
+
+
+def get_code_digest_secret() -> Optional[str]:
+    return get_settings().code_digest_secret or None
+
+
+def get_register_fused_write() -> bool:
+    return get_settings().register_fused_write
+
+
 def get_email_port(request: Request) -> EmailPort:
     # This is set in app.main lifespan()
     return request.app.state.email_adapter
 
 
-def get_sessions() -> RedisSessions:
-    return RedisSessions(get_redis(), ttl_seconds=get_settings().session_ttl_seconds)
+def get_sessions(request: Request) -> RedisSessions:
+    settings = get_settings()
+    return RedisSessions(
+        get_redis(),
+        ttl_seconds=settings.session_ttl_seconds,
+        snapshots=settings.session_snapshots,
+        max_sessions_per_user=settings.session_max_per_user,
+        # Set in app.main lifespan() when SESSION_NEAR_CACHE=true
+        near_cache=getattr(request.app.state, "session_near_cache", None),
+    )
+
+
+def get_access_tokens() -> Optional[SignedAccessTokens]:
+    settings = get_settings()
+    if settings.auth_token_mode != "signed":
+        return None
+    return SignedAccessTokens(
+        settings.access_token_secret, ttl_seconds=settings.access_token_ttl_seconds
+    )
+
+
+def get_token_revocations(request: Request) -> Optional[RedisTokenRevocations]:
+    # Set in app.main lifespan() when AUTH_TOKEN_MODE=signed
+    return getattr(request.app.state, "token_revocations", None)
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import hashlib
+
+from starlette.responses import JSONResponse
+
+from app.domain.ports.idempotency_store import StoredResponse
+
+
+def registration_idempotency_key(email: str, idempotency_key: str) -> str:
+    """
+    Client keys are only unique per client: scope them by the normalized email so
+    two clients picking the same key never share a response or an outbox row.
+    """
+    scoped = f"{email.strip().lower()}\0{idempotency_key}".encode("utf-8")
+    return "register:" + hashlib.sha256(scoped).hexdigest()
+
+
+def replay_response(stored: StoredResponse, *, retry_after_seconds: int = 1):
+    if stored.status_code is None:
+        return JSONResponse(
+            {"detail": "a request with this Idempotency-Key is in progress"},
+            status_code=409,
+            headers={"Retry-After": str(retry_after_seconds)},
+        )
+    return JSONResponse(
+        stored.body,
+        status_code=stored.status_code,
+        headers={"Idempotent-Replayed": "true"},
+    )
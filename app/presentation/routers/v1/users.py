@@ -1,4 +1,4 @@
-from typing import Annotated, Callable
+from typing import Annotated, Awaitable, Callable
 
 from fastapi import APIRouter, Body, Depends, HTTPException, Header, Security, status
 from fastapi.security import (
@@ -9,24 +9,47 @@ from fastapi.security import (
 )
 
 from app.application.activate_user import activate_user
+from app.application.profile_cache import ProfileCache
 from app.application.register_user import register_user
+from app.application.single_flight import SingleFlight
+from app.application.utils import maybe_await
 from app.domain.errors import (
     InvalidActivationCode,
     InvalidCredentials,
     InvalidStatusTransition,
+    TooManyAttempts,
 )
 from app.domain.ports.activation_cache import ActivationCachePort
+from app.domain.ports.idempotency_store import IdempotencyStorePort
+from app.domain.ports.profile_invalidation import ProfileInvalidationPort
+from app.domain.ports.resend_throttle import ResendThrottlePort
 from app.domain.ports.unit_of_work import UnitOfWorkPort
 from app.infrastructure.db.uow import PgUnitOfWork
-from app.infrastructure.redis_cache.sessions import RedisSessions
+from app.infrastructure.redis_cache.sessions import RedisSessions, Session
+from app.infrastructure.redis_cache.token_revocations import RedisTokenRevocations
+from app.infrastructure.security.access_tokens import SignedAccessTokens
 from app.presentation.dependencies import (
+    get_access_tokens,
     get_activation_cache,
+    get_code_attempts,
+    get_code_digest_secret,
     get_code_ttl_seconds,
     get_hash_password,
+    get_idempotency_store,
+    get_idempotency_ttl_seconds,
+    get_profile_cache,
+    get_profile_invalidation,
+    get_read_uow,
+    get_register_fused_write,
+    get_register_single_flight,
+    get_resend_throttle,
+    get_resend_throttle_seconds,
     get_sessions,
+    get_token_revocations,
     get_uow,
     get_verify_password,
 )
+from app.presentation.idempotency import registration_idempotency_key, replay_response
 from app.schemas.requests import UserActivateIn, UserCreateIn
 from app.schemas.responses import AcceptedOut, OkOut
 
@@ -44,18 +67,55 @@ async def post_create_user(
     body: UserCreateIn,
     uow: Annotated[UnitOfWorkPort, Depends(get_uow)],
     activation_cache: Annotated[ActivationCachePort, Depends(get_activation_cache)],
-    hash_password: Annotated[Callable[..., str], Depends(get_hash_password)],
+    hash_password: Annotated[
+        Callable[..., str | Awaitable[str]], Depends(get_hash_password)
+    ],
     code_ttl_seconds: Annotated[int, Depends(get_code_ttl_seconds)],
+    fused_write: Annotated[bool, Depends(get_register_fused_write)],
+    code_secret: Annotated[str | None, Depends(get_code_digest_secret)],
+    resend_throttle: Annotated[ResendThrottlePort, Depends(get_resend_throttle)],
+    resend_throttle_seconds: Annotated[int, Depends(get_resend_throttle_seconds)],
+    single_flight: Annotated[SingleFlight | None, Depends(get_register_single_flight)],
+    idempotency_store: Annotated[IdempotencyStorePort, Depends(get_idempotency_store)],
+    idempotency_ttl_seconds: Annotated[int, Depends(get_idempotency_ttl_seconds)],
+    idempotency_key: Annotated[
+        str | None, Header(alias="Idempotency-Key", min_length=1, max_length=255)
+    ] = None,
 ):
-    await register_user(
-        uow=uow,
-        activation_cache=activation_cache,
-        email=body.email,
-        password=body.password,
-        hash_password=hash_password,
-        code_ttl_seconds=code_ttl_seconds,
-    )
-    return AcceptedOut()
+    scoped_key = None
+    if idempotency_key:
+        # retries get the stored response without bcrypt or Postgres
+        scoped_key = registration_idempotency_key(body.email, idempotency_key)
+        stored = await idempotency_store.reserve(scoped_key, idempotency_ttl_seconds)
+        if stored is not None:
+            return replay_response(stored)
+
+    try:
+        await register_user(
+            uow=uow,
+            activation_cache=activation_cache,
+            email=body.email,
+            password=body.password,
+            hash_password=hash_password,
+            code_ttl_seconds=code_ttl_seconds,
+            fused_write=fused_write,
+            code_secret=code_secret,
+            resend_throttle=resend_throttle,
+            resend_throttle_seconds=resend_throttle_seconds,
+            single_flight=single_flight,
+            idempotency_key=scoped_key,
+        )
+    except BaseException:
+        if scoped_key:
+            await idempotency_store.release(scoped_key)
+        raise
+
+    response = AcceptedOut()
+    if scoped_key:
+        await idempotency_store.complete(
+            scoped_key, 202, response.model_dump(), idempotency_ttl_seconds
+        )
+    return response
 
 
 @router.post("/activate")
@@ -64,7 +124,13 @@ async def post_activate_user(
     payload: UserActivateIn = Body(...),
     uow: UnitOfWorkPort = Depends(get_uow),
     activation_cache: ActivationCachePort = Depends(get_activation_cache),
-    verify_password: Callable[[str, str], bool] = Depends(get_verify_password),
+    verify_password: Callable[[str, str], bool | Awaitable[bool]] = Depends(
+        get_verify_password
+    ),
+    max_code_attempts: int = Depends(get_code_attempts),
+    profile_invalidation: ProfileInvalidationPort | None = Depends(
+        get_profile_invalidation
+    ),
 ):
     try:
         await activate_user(
@@ -74,10 +140,21 @@ async def post_activate_user(
             password=creds.password,
             code=payload.code,
             verify_password=verify_password,
+            max_code_attempts=max_code_attempts,
+            profile_invalidation=profile_invalidation,
+        )
+    except TooManyAttempts:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="too many attempts, request a new code",
         )
-    except InvalidActivationCode:
+    except (InvalidCredentials, InvalidActivationCode):
+        # one answer for an unknown email, a wrong password and a wrong code:
+        # the code is checked first, so a distinct answer would tell a caller
+        # without the password that a guessed code is right
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="invalid activation code"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="invalid credentials or activation code",
         )
     except InvalidStatusTransition:
         raise HTTPException(
@@ -90,52 +167,142 @@ async def post_activate_user(
 @router.post("/login")
 async def post_login(
     creds: HTTPBasicCredentials = Depends(security),
-    uow: PgUnitOfWork = Depends(get_uow),
+    uow: PgUnitOfWork = Depends(get_read_uow),
     verify_password=Depends(get_verify_password),
     sessions: RedisSessions = Depends(get_sessions),
+    access_tokens: SignedAccessTokens | None = Depends(get_access_tokens),
 ):
     email = creds.username.strip().lower()
     password = creds.password
 
+    # one lookup; bcrypt and the session write don't hold the connection
     async with uow as transaction:
         user_and_hash = await transaction.db_users.get_by_email_with_hash(email)
-        if not user_and_hash:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid credentials"
-            )
-        user, pwd_hash = user_and_hash
-        if user.status != "active" or not verify_password(password, pwd_hash):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid credentials"
-            )
-        token = await sessions.create(user.id)
-        await transaction.commit()
+    if not user_and_hash:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid credentials"
+        )
+    user, pwd_hash = user_and_hash
+    if user.status != "active" or not await maybe_await(
+        verify_password(password, pwd_hash)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid credentials"
+        )
+    if access_tokens is not None:
+        token = access_tokens.issue(user.id)
+    else:
+        token = await sessions.create(user.id, user=user)
     return {"token": token}
 
 
-@router.get("/me")
-async def get_me(
-    auth: HTTPAuthorizationCredentials = Security(bearer_scheme),
-    uow: PgUnitOfWork = Depends(get_uow),
-    sessions: RedisSessions = Depends(get_sessions),
-):
-    token = auth.credentials
+async def _authenticate(
+    token: str,
+    sessions: RedisSessions,
+    access_tokens: SignedAccessTokens | None,
+    revocations: RedisTokenRevocations | None,
+) -> Session:
+    """
+    Resolve a bearer token. Signed tokens are checked in process (signature,
+    expiry, revocation filter); anything else is looked up as a Redis session.
+    """
     if not token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="missing bearer token"
         )
 
-    user_id = await sessions.get(token)
-    if not user_id:
+    if access_tokens is not None and access_tokens.looks_signed(token):
+        claims = access_tokens.verify(token)
+        if claims is None or (
+            revocations is not None and await revocations.is_revoked(claims)
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="invalid or expired token",
+            )
+        return Session(user_id=claims.user_id)
+
+    session = await sessions.get_session(token)
+    if not session:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid or expired token"
         )
+    return session
 
-    async with uow as tx:
-        user = await tx.db_users.get_by_id(user_id)
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, detail="unknown user"
-            )
-        # no state change; no commit needed
+
+async def _revoke(
+    token: str,
+    sessions: RedisSessions,
+    access_tokens: SignedAccessTokens | None,
+    revocations: RedisTokenRevocations | None,
+) -> None:
+    if access_tokens is not None and access_tokens.looks_signed(token):
+        claims = access_tokens.verify(token)
+        if claims is not None and revocations is not None:
+            await revocations.revoke(claims)
+    else:
+        await sessions.revoke(token)
+
+
+@router.post("/logout", response_model=OkOut)
+async def post_logout(
+    auth: HTTPAuthorizationCredentials = Security(bearer_scheme),
+    sessions: RedisSessions = Depends(get_sessions),
+    access_tokens: SignedAccessTokens | None = Depends(get_access_tokens),
+    revocations: RedisTokenRevocations | None = Depends(get_token_revocations),
+):
+    token = auth.credentials
+    await _authenticate(token, sessions, access_tokens, revocations)
+    await _revoke(token, sessions, access_tokens, revocations)
+    return OkOut()
+
+
+@router.post("/logout/all", response_model=OkOut)
+async def post_logout_all(
+    auth: HTTPAuthorizationCredentials = Security(bearer_scheme),
+    sessions: RedisSessions = Depends(get_sessions),
+    access_tokens: SignedAccessTokens | None = Depends(get_access_tokens),
+    revocations: RedisTokenRevocations | None = Depends(get_token_revocations),
+):
+    """
+    Log out everywhere: every session of the user is revoked in one round trip.
+    A signed token only revokes itself; other signed tokens of the user run
+    until they expire.
+    """
+    token = auth.credentials
+    session = await _authenticate(token, sessions, access_tokens, revocations)
+    await _revoke(token, sessions, access_tokens, revocations)
+    await sessions.revoke_all(session.user_id)
+    return OkOut()
+
+
+@router.get("/me")
+async def get_me(
+    auth: HTTPAuthorizationCredentials = Security(bearer_scheme),
+    uow: PgUnitOfWork = Depends(get_read_uow),
+    sessions: RedisSessions = Depends(get_sessions),
+    profile_cache: ProfileCache | None = Depends(get_profile_cache),
+    access_tokens: SignedAccessTokens | None = Depends(get_access_tokens),
+    revocations: RedisTokenRevocations | None = Depends(get_token_revocations),
+):
+    session = await _authenticate(
+        auth.credentials, sessions, access_tokens, revocations
+    )
+    user_id = session.user_id
+
+    # a current snapshot in the session answers with no further lookup
+    user = session.user
+    if user is None and profile_cache is not None:
+        user = profile_cache.get(user_id)
+    if user is None:
+        version = profile_cache.version if profile_cache is not None else 0
+        async with uow as tx:
+            user = await tx.db_users.get_by_id(user_id)
+            if not user:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED, detail="unknown user"
+                )
+            # no state change; no commit needed
+        if profile_cache is not None:
+            profile_cache.put(user, version=version)
     return {"id": user.id, "email": user.email, "status": user.status}
@@ -1,15 +1,23 @@
 from functools import lru_cache
 
+from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+# secrets published in earlier versions of this repo; never valid keys
+_PUBLISHED_SECRETS = frozenset({"dev-access-token-secret", "dev-code-digest-secret"})
+
 
 class Settings(BaseSettings):
     # App
     app_env: str = "dev"
     log_level: str = "INFO"
+    # one "component stats" log line (caches, pools, queues) this often; 0: off
+    stats_log_interval_seconds: float = 60.0
 
     # Infra
     database_url: str = "postgresql://app:app@db:5432/app"
+    # comma-separated read replica DSNs (empty -> everything on the primary)
+    database_replica_urls: str = ""
     redis_url: str = "redis://redis:6379/0"
     smtp_base_url: str = "http://smtp-mock:8025"
 
@@ -17,11 +25,72 @@ class Settings(BaseSettings):
     bcrypt_rounds: int = 12
     code_ttl_seconds: int = 60
     code_attempts: int = 5
+    # HMAC key for activation code digests (empty -> random-salt digests)
+    code_digest_secret: str = ""
     resend_throttle_seconds: int = 60
     session_ttl_seconds: int = 24 * 60 * 60  # 24h
+    session_max_per_user: int = 10  # oldest sessions revoked past this (0 = no cap)
+    # sessions carry a versioned user snapshot, so /me needs no Postgres read
+    session_snapshots: bool = False
+    # in-process copy of session keys kept coherent by Redis CLIENT TRACKING
+    session_near_cache: bool = False
+    session_near_cache_max_entries: int = 10_000
+    # Bearer tokens: "session" (opaque, looked up in Redis) or "signed"
+    # (HMAC-signed and expiring, verified in process; revocations via a stream)
+    auth_token_mode: str = "session"
+    access_token_secret: str = ""  # required in signed mode
+    access_token_ttl_seconds: int = 60 * 60
+
+    # Registration: upsert + outbox + last_code_sent_at in one SQL round trip
+    register_fused_write: bool = False
+    # Registration: concurrent identical requests share one execution
+    register_single_flight: bool = False
+    register_single_flight_redis_lock: bool = False  # also across processes
+    register_single_flight_lock_ttl_ms: int = 10_000
+    # Registration: how long a response is replayed for a repeated Idempotency-Key
+    idempotency_ttl_seconds: int = 24 * 60 * 60
+
+    # /v1/users/me: process-local profile cache, invalidated over Redis pub/sub
+    profile_cache_enabled: bool = False
+    profile_cache_max_entries: int = 10_000
+    profile_cache_ttl_seconds: float = 30.0
+
+    # Postgres: run unit-of-work statements in psycopg pipeline mode
+    db_pipeline_mode: bool = False
+    # Postgres: server-side prepared statements for repository queries
+    db_prepared_statements: bool = False
+    db_prepared_max: int = 100  # per connection
+    # Postgres: login and /me lookups go to a replica lagging at most this much
+    db_replica_max_lag_seconds: float = 1.0
+    db_replica_check_interval_seconds: float = 1.0
 
-    # Worker
+    # Password hashing ("process" | "thread" pool, or "inline" on the event loop)
+    password_hasher_mode: str = "inline"
+    password_hasher_workers: int = 2
+    password_hasher_max_queue: int = 64
+
+    # Admission control for the bcrypt-heavy auth routes
+    auth_admission_enabled: bool = False
+    auth_max_in_flight: int = 4
+    auth_max_waiting: int = 64
+    auth_queue_wait_ms: int = 500
+    auth_max_loop_lag_ms: int = 250
+    auth_max_db_waiting: int = 10
+    auth_retry_after_seconds: int = 1
+
+    # Worker: LISTEN for outbox inserts (NOTIFY trigger), polling only as a
+    # fallback; without it the table is polled every outbox_poll_interval_ms
+    outbox_listen: bool = False
+    outbox_fallback_poll_ms: int = 10_000
     outbox_poll_interval_ms: int = 500
+    outbox_batch_size: int = 50
+    # sends in flight per worker, overall and per topic (JSON: {"topic": n})
+    outbox_max_concurrency: int = 10
+    outbox_topic_concurrency: dict[str, int] = {}
+    # claimed rows are leased; a dead worker's rows are reclaimed after this
+    outbox_lease_seconds: float = 30.0
+    # give a message up ('failed') after this many attempts; 0: retry forever
+    outbox_max_attempts: int = 0
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -30,6 +99,21 @@ class Settings(BaseSettings):
         extra="ignore",
     )
 
+    @model_validator(mode="after")
+    def _check_secrets(self) -> "Settings":
+        # anyone holding the signing key can mint a token for any user
+        if self.auth_token_mode == "signed" and (
+            not self.access_token_secret
+            or self.access_token_secret in _PUBLISHED_SECRETS
+        ):
+            raise ValueError(
+                "AUTH_TOKEN_MODE=signed needs a private ACCESS_TOKEN_SECRET"
+            )
+        # keyed digests of a 4-digit code fall to 10k guesses with the key
+        if self.code_digest_secret in _PUBLISHED_SECRETS:
+            raise ValueError("CODE_DIGEST_SECRET must be private (or empty)")
+        return self
+
 
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
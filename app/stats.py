@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import logging
+from typing import Any, Callable, Mapping, Optional
+
+logger = logging.getLogger("app.stats")
+
+
+class StatsLogger:
+    """
+    Logs the `stats()` of long-lived components as one structured line
+    ("component stats", one field per component) every `interval` seconds.
+
+    `sources` maps a name to a component's `stats` method; a method returning
+    a dataclass is logged field by field. Nothing is collected between ticks:
+    each line is a snapshot of the counters the components already keep.
+    """
+
+    def __init__(
+        self, sources: Mapping[str, Callable[[], Any]], *, interval: float = 60.0
+    ) -> None:
+        if interval <= 0:
+            raise ValueError("interval must be > 0")
+        self._sources = dict(sources)
+        self._interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def snapshot(self) -> dict[str, Any]:
+        snapshot: dict[str, Any] = {}
+        for name, stats in self._sources.items():
+            try:
+                value = stats()
+            except Exception:  # noqa: BLE001
+                logger.warning("could not read stats", extra={"source": name})
+                continue
+            if dataclasses.is_dataclass(value):
+                value = dataclasses.asdict(value)
+            snapshot[name] = value
+        return snapshot
+
+    def start(self) -> None:
+        if self._task is None and self._sources:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            logger.info("component stats", extra=self.snapshot())
@@ -0,0 +1,17 @@
+-- wake outbox dispatchers (LISTEN outbox) when rows are inserted
+-- one notification per statement, delivered at commit; listeners re-claim
+-- from the table, so the payload is empty
+
+CREATE OR REPLACE FUNCTION outbox_notify() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  PERFORM pg_notify('outbox', '');
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS outbox_notify ON outbox;
+
+CREATE TRIGGER outbox_notify
+  AFTER INSERT ON outbox
+  FOR EACH STATEMENT EXECUTE FUNCTION outbox_notify();
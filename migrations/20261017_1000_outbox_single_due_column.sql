@@ -0,0 +1,17 @@
+-- one due-time column for the outbox: next_attempt_at is merged into available_at
+
+UPDATE outbox
+SET available_at = GREATEST(available_at, next_attempt_at)
+WHERE next_attempt_at IS NOT NULL;
+
+-- drops outbox_pending_next_attempt_idx with it
+ALTER TABLE outbox DROP COLUMN IF EXISTS next_attempt_at;
+
+DROP INDEX IF EXISTS outbox_pending_created_idx;
+DROP INDEX IF EXISTS idx_outbox_status_available;
+
+-- the claim (pending rows due by now, earliest first) is a range scan on this;
+-- it holds pending rows only, so dispatched history does not grow it
+CREATE INDEX IF NOT EXISTS outbox_pending_due_idx
+  ON outbox (available_at, id)
+  WHERE status = 'pending';
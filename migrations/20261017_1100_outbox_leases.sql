@@ -0,0 +1,12 @@
+-- lease-based claiming: a 'processing' row is leased to `locked_by` until its
+-- available_at; once that has passed, the normal claim takes it back
+
+ALTER TABLE outbox ADD COLUMN IF NOT EXISTS locked_by text;
+
+-- the claim reads pending rows and expired leases in one range scan
+-- ('processing' rows left by a crash before leases existed are due already)
+DROP INDEX IF EXISTS outbox_pending_due_idx;
+
+CREATE INDEX IF NOT EXISTS outbox_claimable_due_idx
+  ON outbox (available_at, id)
+  WHERE status IN ('pending', 'processing');
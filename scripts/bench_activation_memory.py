@@ -0,0 +1,97 @@
+"""
+Benchmark: Redis memory per pending activation code.
+
+Writes `--keys` codes in the previous layout (hash {salt, digest} in base64 +
+EXPIRE) and in the compact one (single binary string, SET ... EX), and reports
+the growth of `used_memory` for each. Run against an otherwise idle Redis.
+
+Usage (against the compose stack):
+    docker compose run --rm -T api python -m scripts.bench_activation_memory \
+        --keys 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import os
+import uuid
+
+from redis.asyncio import Redis
+
+import app.domain.services as domain_services
+from app.infrastructure.redis_cache.activation_cache import encode_code
+from app.settings import get_settings
+
+BATCH = 10_000
+
+
+async def _used_memory(r: Redis) -> int:
+    return int((await r.info("memory"))["used_memory"])
+
+
+async def _fill(r: Redis, prefix: str, n: int, *, compact: bool, ttl: int) -> None:
+    salt_b64 = base64.b64encode(os.urandom(16)).decode()
+    for start in range(0, n, BATCH):
+        pipe = r.pipeline(transaction=False)
+        for _ in range(start, min(start + BATCH, n)):
+            user_id = str(uuid.uuid4())
+            digest_b64 = domain_services.make_keyed_code_digest("1234", user_id, "k")
+            key = f"{prefix}{user_id}"
+            if compact:
+                pipe.set(key, encode_code(salt_b64, digest_b64), ex=ttl)
+            else:
+                pipe.hset(key, mapping={"salt": salt_b64, "digest": digest_b64})
+                pipe.expire(key, ttl)
+        await pipe.execute()
+
+
+async def _drop(r: Redis, prefix: str) -> None:
+    async for keys in _scan_batches(r, f"{prefix}*"):
+        await r.unlink(*keys)
+
+
+async def _scan_batches(r: Redis, pattern: str):
+    cursor = 0
+    while True:
+        cursor, keys = await r.scan(cursor, match=pattern, count=BATCH)
+        if keys:
+            yield keys
+        if cursor == 0:
+            break
+
+
+async def _measure(r: Redis, label: str, n: int, *, compact: bool) -> float:
+    prefix = f"bench:act:{label}:"
+    await _drop(r, prefix)
+    before = await _used_memory(r)
+    await _fill(r, prefix, n, compact=compact, ttl=3600)
+    grown = await _used_memory(r) - before
+    sample = (await r.scan(0, match=f"{prefix}*", count=100))[1][0]
+    usage = await r.memory_usage(sample)
+    await _drop(r, prefix)
+    per_key = grown / n
+    print(
+        f"{label:<8} keys={n:<8} used_memory=+{grown / 2**20:8.1f}MiB "
+        f"per_key={per_key:6.1f}B  MEMORY USAGE(sample)={usage}B"
+    )
+    return per_key
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    r = Redis.from_url(get_settings().redis_url)
+    try:
+        hashed = await _measure(r, "hash", args.keys, compact=False)
+        compact = await _measure(r, "compact", args.keys, compact=True)
+        print(f"compact / hash: {compact / hashed:.2f}")
+    finally:
+        await r.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
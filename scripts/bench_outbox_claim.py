@@ -0,0 +1,132 @@
+"""
+Benchmark: latency of the outbox claim (OutboxDispatcher._claim_due_batch) as
+the pending backlog grows.
+
+Seeds synthetic pending rows (topic 'bench.claim', 90% due within the last
+hour, 10% scheduled retries an hour ahead) up to each backlog size, then times
+`--claims` committed claims of `--batch` rows and prints the claim plan. With
+the partial `(available_at, id)` index the plan is an index range scan that
+stops after `--batch` rows, so latency stays flat from 10k to millions of rows.
+Claimed rows are put back to pending after each step; everything seeded is
+deleted at the end.
+
+Usage (against the compose stack; seeding 5M rows takes a few minutes):
+    docker compose run --rm -T api python -m scripts.bench_outbox_claim \
+        --steps 10000,100000,1000000,5000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from psycopg_pool import AsyncConnectionPool
+
+from app.infrastructure.outbox.dispatcher import OutboxDispatcher
+from app.settings import get_settings
+
+TOPIC = "bench.claim"
+SEED_CHUNK = 500_000
+
+CLAIM_PLAN_SQL = """
+EXPLAIN (COSTS OFF)
+SELECT id FROM outbox
+WHERE status IN ('pending', 'processing') AND available_at <= NOW()
+ORDER BY available_at, id
+FOR UPDATE SKIP LOCKED
+LIMIT %s
+"""
+
+
+async def _seed(pool, count: int) -> None:
+    sql = """
+    INSERT INTO outbox (topic, payload, status, available_at)
+    SELECT %s, '{}'::jsonb, 'pending',
+           CASE WHEN g %% 10 = 0 THEN NOW() + random() * INTERVAL '1 hour'
+                ELSE NOW() - random() * INTERVAL '1 hour' END
+    FROM generate_series(1, %s) AS g
+    """
+    while count > 0:
+        chunk = min(count, SEED_CHUNK)
+        async with pool.connection() as conn:
+            await conn.execute(sql, (TOPIC, chunk))
+        count -= chunk
+
+
+async def _plan(pool, batch: int) -> list[str]:
+    async with pool.connection() as conn:
+        # what autovacuum would get to after a bulk load; without it the first
+        # claims also pay for setting hint bits on freshly written pages
+        await conn.set_autocommit(True)
+        await conn.execute("VACUUM ANALYZE outbox")
+        await conn.set_autocommit(False)
+        cur = await conn.execute(CLAIM_PLAN_SQL, (batch,))
+        return [row[0] for row in await cur.fetchall()]
+
+
+async def _claims(
+    dispatcher: OutboxDispatcher, n: int, batch: int, claimed: list[int]
+) -> list[float]:
+    timings = []
+    for _ in range(n):
+        started = time.perf_counter()
+        rows = await dispatcher._claim_due_batch(batch)
+        timings.append(time.perf_counter() - started)
+        claimed.extend(row["id"] for row in rows)
+    return timings
+
+
+async def _release(pool, claimed: list[int]) -> None:
+    # back to pending, including any real row the benchmark happened to claim
+    async with pool.connection() as conn:
+        await conn.execute(
+            "UPDATE outbox SET status = 'pending', available_at = NOW(),"
+            " locked_by = NULL WHERE id = ANY(%s)",
+            (claimed,),
+        )
+    claimed.clear()
+
+
+def _summary(rows: int, timings: list[float]) -> str:
+    ms = sorted(t * 1000 for t in timings)
+    p95 = ms[int(len(ms) * 0.95) - 1]
+    return (
+        f"backlog={rows:<9} claims={len(ms):<4} mean={statistics.fmean(ms):6.3f}ms "
+        f"p50={statistics.median(ms):6.3f}ms p95={p95:6.3f}ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", default="10000,100000,1000000,5000000")
+    parser.add_argument("--claims", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=10)
+    args = parser.parse_args()
+    steps = [int(s) for s in args.steps.split(",")]
+
+    pool = AsyncConnectionPool(get_settings().database_url, min_size=1, open=False)
+    await pool.open()
+    dispatcher = OutboxDispatcher(pool=pool, email_adapter=None)
+
+    seeded = 0
+    try:
+        for rows in steps:
+            await _seed(pool, rows - seeded)
+            seeded = rows
+            plan = await _plan(pool, args.batch)
+            claimed: list[int] = []
+            await _claims(dispatcher, 20, args.batch, claimed)  # warm up
+            timings = await _claims(dispatcher, args.claims, args.batch, claimed)
+            await _release(pool, claimed)
+            print(_summary(rows, timings))
+            print("    " + "\n    ".join(plan))
+    finally:
+        async with pool.connection() as conn:
+            await conn.execute("DELETE FROM outbox WHERE topic = %s", (TOPIC,))
+        await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
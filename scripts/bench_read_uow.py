@@ -0,0 +1,76 @@
+"""
+Benchmark: latency of a single-SELECT lookup (what login and /me do) through
+the transactional PgUnitOfWork vs the autocommit PgReadOnlyUnitOfWork.
+
+The transactional one sends BEGIN, the SELECT and a ROLLBACK (three round
+trips); the read-only one sends the SELECT only. The gap grows with the
+network latency to Postgres, so compare on the real topology as well.
+
+Usage (against the compose stack):
+    docker compose run --rm -T api python -m scripts.bench_read_uow --n 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from psycopg_pool import AsyncConnectionPool
+
+from app.infrastructure.db.uow import PgReadOnlyUnitOfWork, PgUnitOfWork
+from app.settings import get_settings
+
+
+async def _lookups(uow_cls, pool, user_id: str, n: int) -> list[float]:
+    timings = []
+    for _ in range(n):
+        started = time.perf_counter()
+        async with uow_cls(pool) as tx:
+            await tx.db_users.get_by_id(user_id)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def _summary(label: str, timings: list[float]) -> str:
+    ms = sorted(t * 1000 for t in timings)
+    p95 = ms[int(len(ms) * 0.95) - 1]
+    return (
+        f"{label:<22} n={len(ms):<5} mean={statistics.fmean(ms):6.3f}ms "
+        f"p50={statistics.median(ms):6.3f}ms p95={p95:6.3f}ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=2000)
+    args = parser.parse_args()
+
+    pool = AsyncConnectionPool(get_settings().database_url, min_size=1, open=False)
+    await pool.open()
+    email = f"bench-read-{uuid.uuid4().hex[:8]}@example.com"
+
+    try:
+        async with PgUnitOfWork(pool) as tx:
+            user = await tx.db_users.create_or_update_pending(email, "x")
+            await tx.commit()
+
+        # warm up: connection, prepared statement
+        await _lookups(PgUnitOfWork, pool, user.id, 50)
+        await _lookups(PgReadOnlyUnitOfWork, pool, user.id, 50)
+
+        tx_timings = await _lookups(PgUnitOfWork, pool, user.id, args.n)
+        ro_timings = await _lookups(PgReadOnlyUnitOfWork, pool, user.id, args.n)
+
+        print(_summary("transactional uow", tx_timings))
+        print(_summary("read-only uow", ro_timings))
+    finally:
+        async with pool.connection() as conn:
+            await conn.execute("DELETE FROM users WHERE email = %s", (email,))
+        await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,152 @@
+"""
+Benchmark: how long register_user holds a pooled Postgres connection.
+
+Compares the previous flow (activation digest written to Redis *inside* the
+transaction) with the current one (digest written before the transaction),
+for new emails and for emails registered again. The current flow checks out a
+connection twice (lookup, then the transaction): a registration's hold time is
+the sum. Redis is simulated with a fixed latency so the number isolates the
+effect.
+
+Usage (against the compose stack):
+    docker compose run --rm -T api python -m scripts.bench_register_conn_hold \
+        --n 200 --redis-latency-ms 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+from psycopg_pool import AsyncConnectionPool
+
+import app.domain.services as domain_services
+from app.application.register_user import VERIFICATION_TOPIC, register_user
+from app.infrastructure.db.uow import PgUnitOfWork
+from app.settings import get_settings
+
+
+class TimedPool:
+    """Pool proxy recording how long connections are checked out per operation."""
+
+    def __init__(self, pool: AsyncConnectionPool) -> None:
+        self._pool = pool
+        self.holds: list[float] = []
+        self._held = 0.0
+
+    @asynccontextmanager
+    async def connection(self):
+        async with self._pool.connection() as conn:
+            started = time.perf_counter()
+            try:
+                yield conn
+            finally:
+                self._held += time.perf_counter() - started
+
+    def end_operation(self) -> None:
+        self.holds.append(self._held)
+        self._held = 0.0
+
+
+class SlowActivationCache:
+    def __init__(self, latency: float) -> None:
+        self._latency = latency
+
+    async def store_hashed_code(self, user_id, salt_b64, digest_b64, ttl_seconds):
+        await asyncio.sleep(self._latency)
+
+    async def verify_and_consume(self, user_id, code):
+        return False
+
+    async def invalidate(self, user_id):
+        return None
+
+
+async def register_digest_inside_tx(uow, activation_cache, email, password_hash):
+    """The flow before the change: Redis round trip while the transaction is open."""
+    code = domain_services.generate_4digit_code()
+    salt_b64, digest_b64 = domain_services.make_code_digest(code)
+    async with uow as tx:
+        user = await tx.db_users.create_or_update_pending_with_outbox(
+            email,
+            password_hash,
+            sent_at=datetime.now(timezone.utc),
+            topic=VERIFICATION_TOPIC,
+            payload={"to": email, "subject": "bench", "body": "Your code is " + code},
+        )
+        await activation_cache.store_hashed_code(user.id, salt_b64, digest_b64, 60)
+        await tx.commit()
+
+
+def _summary(label: str, holds: list[float]) -> str:
+    ms = sorted(h * 1000 for h in holds)
+    p95 = ms[int(len(ms) * 0.95) - 1]
+    return (
+        f"{label:<32} n={len(ms):<5} mean={statistics.fmean(ms):7.2f}ms "
+        f"p50={statistics.median(ms):7.2f}ms p95={p95:7.2f}ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=200)
+    parser.add_argument("--redis-latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    pool = AsyncConnectionPool(get_settings().database_url, min_size=1, open=False)
+    await pool.open()
+    cache = SlowActivationCache(args.redis_latency_ms / 1000.0)
+    run_id = uuid.uuid4().hex[:8]
+
+    async def run_before(timed: TimedPool) -> None:
+        for i in range(args.n):
+            email = f"bench-before-{run_id}-{i}@example.com"
+            await register_digest_inside_tx(PgUnitOfWork(timed), cache, email, "x")
+            timed.end_operation()
+
+    async def run_after(timed: TimedPool) -> None:
+        for i in range(args.n):
+            await register_user(
+                uow=PgUnitOfWork(timed),
+                activation_cache=cache,
+                email=f"bench-after-{run_id}-{i}@example.com",
+                password="x",
+                hash_password=lambda p: p,
+                fused_write=True,
+            )
+            timed.end_operation()
+
+    try:
+        # the second pass of each flow registers the same emails again
+        results = []
+        for label, run in (
+            ("digest inside tx", run_before),
+            ("digest before tx", run_after),
+        ):
+            for case in ("new email", "existing email"):
+                timed = TimedPool(pool)
+                await run(timed)
+                results.append((f"{label}, {case}", timed.holds))
+
+        print(f"simulated Redis latency: {args.redis_latency_ms}ms")
+        for label, holds in results:
+            print(_summary(label, holds))
+    finally:
+        async with pool.connection() as conn:
+            await conn.execute(
+                "DELETE FROM users WHERE email LIKE %s", (f"bench-%-{run_id}-%",)
+            )
+            await conn.execute(
+                "DELETE FROM outbox WHERE payload->>'to' LIKE %s",
+                (f"bench-%-{run_id}-%",),
+            )
+        await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
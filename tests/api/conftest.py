@@ -9,6 +9,9 @@ from app.presentation.dependencies import (
     get_activation_cache,
     get_code_ttl_seconds,
     get_hash_password,
+    get_idempotency_store,
+    get_read_uow,
+    get_resend_throttle,
     get_sessions,
     get_uow,
     get_verify_password,
@@ -16,6 +19,8 @@ from app.presentation.dependencies import (
 from tests.fakes import (
     FakeActivationCache,
     FakeAuthUsersRepo,
+    FakeIdempotencyStore,
+    FakeResendThrottle,
     FakeSessions,
     FakeUoW,
     FakeUoWAuth,
@@ -27,6 +32,8 @@ def app_and_deps():
     app = create_app()
     uow = FakeUoW()
     cache = FakeActivationCache(verify_result=True)
+    throttle = FakeResendThrottle()
+    idempotency = FakeIdempotencyStore()
 
     def _get_uow():
         return uow
@@ -35,7 +42,7 @@ def app_and_deps():
         return cache
 
     def _get_verify():
-        return lambda plain, hashed: (plain == "s3cret" and hashed == "hashed-s3cret")
+        return lambda plain, hashed: plain == "s3cret" and hashed == "hashed-s3cret"
 
     def _get_hash_password():
         return lambda plain: "hashed-" + plain
@@ -48,6 +55,8 @@ def app_and_deps():
     app.dependency_overrides[get_verify_password] = _get_verify
     app.dependency_overrides[get_hash_password] = _get_hash_password
     app.dependency_overrides[get_code_ttl_seconds] = _get_code_ttl_seconds
+    app.dependency_overrides[get_resend_throttle] = lambda: throttle
+    app.dependency_overrides[get_idempotency_store] = lambda: idempotency
 
     try:
         yield app, uow, cache
@@ -89,6 +98,7 @@ def auth_overrides(client: TestClient, active_user: User):
     sessions = FakeSessions()
 
     app.dependency_overrides[get_uow] = lambda: FakeUoWAuth(repo)
+    app.dependency_overrides[get_read_uow] = lambda: FakeUoWAuth(repo)
     app.dependency_overrides[get_verify_password] = lambda: (
         lambda plain, _hash: plain == "s3cret"
     )
@@ -16,5 +16,47 @@ def test_activate_route_happy_path(client, app_and_deps):
 
     assert response.status_code == 200
     assert response.json() == {"status": "ok"}
-    assert uow.db_users.set_active_calls == ["u1"]
+    assert uow.db_users.activate_if_pending_calls == ["u1"]
     assert uow.committed is True
+
+
+def test_activate_route_too_many_attempts(client, app_and_deps):
+    _, uow, cache = app_and_deps
+    uow.db_users.password_hash_by_email["jeremy@example.com"] = "hashed-s3cret"
+    cache.check_result = "exhausted"
+
+    response = client.post(
+        "/v1/users/activate",
+        json={"code": "0000"},
+        headers=basic_auth("jeremy@example.com", "s3cret"),
+    )
+
+    assert response.status_code == 429
+    assert uow.db_users.add_failed_attempts_calls == [("u1", 5)]
+    assert uow.db_users.activate_if_pending_calls == []
+
+
+@pytest.mark.parametrize(
+    "email, password, code_check",
+    [
+        ("nobody@example.com", "s3cret", "match"),  # unknown email
+        ("jeremy@example.com", "wrong", "match"),  # right code, wrong password
+        ("jeremy@example.com", "s3cret", "mismatch"),  # wrong code
+    ],
+)
+def test_activate_route_failures_are_indistinguishable(
+    client, app_and_deps, email, password, code_check
+):
+    _, uow, cache = app_and_deps
+    uow.db_users.password_hash_by_email["jeremy@example.com"] = "hashed-s3cret"
+    cache.check_result = code_check
+
+    response = client.post(
+        "/v1/users/activate",
+        json={"code": "1234"},
+        headers=basic_auth(email, password),
+    )
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "invalid credentials or activation code"}
+    assert uow.db_users.activate_if_pending_calls == []
@@ -4,8 +4,21 @@ import asyncio
 import pytest
 from fastapi.testclient import TestClient
 
+from app.application.profile_cache import ProfileCache
+from app.infrastructure.security.access_tokens import SignedAccessTokens
+from app.presentation.dependencies import (
+    get_access_tokens,
+    get_profile_cache,
+    get_read_uow,
+    get_token_revocations,
+)
 from tests.api.conftest import basic_auth
-from tests.fakes import FakeSessions
+from tests.fakes import (
+    FakeAuthUsersRepo,
+    FakeSessions,
+    FakeTokenRevocations,
+    FakeUoWAuth,
+)
 
 
 def test_login_and_me_happy_path(client: TestClient, auth_overrides, active_user):
@@ -56,3 +69,102 @@ def test_me_expired_token_after_login(
     r2 = client.get("/v1/users/me", headers={"Authorization": f"Bearer {token}"})
     assert r2.status_code == 401
     assert r2.json()["detail"] == "invalid or expired token"
+
+
+def test_me_is_served_from_profile_cache(
+    client: TestClient, auth_overrides, active_user
+):
+    cache = ProfileCache(max_entries=10, ttl_seconds=30)
+    client.app.dependency_overrides[get_profile_cache] = lambda: cache
+    r = client.post("/v1/users/login", headers=basic_auth(active_user.email, "s3cret"))
+    headers = {"Authorization": f"Bearer {r.json()['token']}"}
+
+    assert client.get("/v1/users/me", headers=headers).status_code == 200
+    # a second read doesn't reach the repository (it no longer knows the user)
+    empty = FakeAuthUsersRepo(by_email={}, by_id={})
+    client.app.dependency_overrides[get_read_uow] = lambda: FakeUoWAuth(empty)
+    r2 = client.get("/v1/users/me", headers=headers)
+
+    assert r2.status_code == 200, r2.text
+    assert r2.json() == {
+        "id": "auth-1",
+        "email": "login@test.local",
+        "status": "active",
+    }
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.size) == (1, 1, 1)
+
+
+def test_me_is_answered_from_session_snapshot_until_it_is_stale(
+    client: TestClient, auth_overrides, active_user
+):
+    sessions: FakeSessions = auth_overrides["sessions"]
+    sessions.snapshots = True
+    r = client.post("/v1/users/login", headers=basic_auth(active_user.email, "s3cret"))
+    headers = {"Authorization": f"Bearer {r.json()['token']}"}
+
+    # the repository no longer knows the user: only the snapshot can answer
+    empty = FakeAuthUsersRepo(by_email={}, by_id={})
+    client.app.dependency_overrides[get_read_uow] = lambda: FakeUoWAuth(empty)
+    r2 = client.get("/v1/users/me", headers=headers)
+    assert r2.status_code == 200, r2.text
+    assert r2.json()["status"] == "active"
+
+    # a status change bumps the version; the stale snapshot is not used
+    asyncio.get_event_loop().run_until_complete(sessions.bump_version(active_user.id))
+    r3 = client.get("/v1/users/me", headers=headers)
+    assert r3.status_code == 401
+    assert r3.json()["detail"] == "unknown user"
+
+
+def test_signed_tokens_authenticate_locally_and_can_be_revoked(
+    client: TestClient, auth_overrides, active_user
+):
+    revocations = FakeTokenRevocations()
+    client.app.dependency_overrides[get_access_tokens] = lambda: SignedAccessTokens(
+        "test-secret"
+    )
+    client.app.dependency_overrides[get_token_revocations] = lambda: revocations
+
+    r = client.post("/v1/users/login", headers=basic_auth(active_user.email, "s3cret"))
+    token = r.json()["token"]
+    assert SignedAccessTokens.looks_signed(token)
+    assert auth_overrides["sessions"]._store == {}  # nothing stored in Redis
+    headers = {"Authorization": f"Bearer {token}"}
+
+    r2 = client.get("/v1/users/me", headers=headers)
+    assert r2.status_code == 200, r2.text
+    assert r2.json()["id"] == active_user.id
+
+    assert client.post("/v1/users/logout", headers=headers).status_code == 200
+    r3 = client.get("/v1/users/me", headers=headers)
+    assert r3.status_code == 401
+    assert r3.json()["detail"] == "invalid or expired token"
+
+
+def test_logout_revokes_session(client: TestClient, auth_overrides, active_user):
+    r = client.post("/v1/users/login", headers=basic_auth(active_user.email, "s3cret"))
+    headers = {"Authorization": f"Bearer {r.json()['token']}"}
+
+    r2 = client.post("/v1/users/logout", headers=headers)
+    assert r2.status_code == 200, r2.text
+    assert r2.json() == {"status": "ok"}
+    assert client.get("/v1/users/me", headers=headers).status_code == 401
+
+
+def test_logout_all_revokes_every_session(
+    client: TestClient, auth_overrides, active_user
+):
+    tokens = [
+        client.post(
+            "/v1/users/login", headers=basic_auth(active_user.email, "s3cret")
+        ).json()["token"]
+        for _ in range(2)
+    ]
+    first, second = ({"Authorization": f"Bearer {t}"} for t in tokens)
+
+    r = client.post("/v1/users/logout/all", headers=first)
+    assert r.status_code == 200, r.text
+    assert r.json() == {"status": "ok"}
+    assert client.get("/v1/users/me", headers=first).status_code == 401
+    assert client.get("/v1/users/me", headers=second).status_code == 401
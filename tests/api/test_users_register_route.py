@@ -1,6 +1,12 @@
 import pytest
 
-from app.presentation.dependencies import get_activation_cache
+from app.domain.ports.idempotency_store import StoredResponse
+from app.presentation.dependencies import (
+    get_activation_cache,
+    get_hash_password,
+    get_idempotency_store,
+)
+from app.presentation.idempotency import registration_idempotency_key
 from tests.fakes import FakeErroredActivationCache
 
 
@@ -20,7 +26,7 @@ async def test_register_route_happy_path(client, app_and_deps):
     assert uow.db_users.created_hash == "hashed-s3cret"
     assert len(cache.calls) == 1
     user_id, salt_b64, digest_b64, ttl = cache.calls[0]
-    assert user_id == "u1"
+    assert user_id == uow.db_users.created_id
     assert isinstance(salt_b64, str)
     assert isinstance(digest_b64, str)
     assert ttl == 60
@@ -32,8 +38,8 @@ async def test_register_route_error_in_activation_cache(
     app_and_deps,
 ):
     app, uow, cache = app_and_deps
-    app.dependency_overrides[get_activation_cache] = (
-        lambda: FakeErroredActivationCache()
+    app.dependency_overrides[get_activation_cache] = lambda: (
+        FakeErroredActivationCache()
     )
 
     response = client.post(
@@ -42,7 +48,66 @@ async def test_register_route_error_in_activation_cache(
     )
 
     assert response.status_code == 500
-    assert uow.committed is False
-    assert uow.rolled_back is True
+    assert uow.commits == 1  # the lookup only
+    assert uow.db_users.created_email is None
     assert len(uow.outbox.enqueues) == 0
     assert len(cache.calls) == 0
+
+
+def test_register_route_resend_within_window_is_accepted_without_work(
+    client, app_and_deps
+):
+    _, uow, cache = app_and_deps
+    body = {"email": "jeremy@example.com", "password": "s3cret"}
+
+    first = client.post("/v1/users", json=body)
+    second = client.post("/v1/users", json=body)
+
+    assert first.status_code == second.status_code == 202
+    assert second.json() == {"status": "accepted"}
+    assert len(cache.calls) == 1
+
+
+def test_register_route_replays_response_for_same_idempotency_key(client, app_and_deps):
+    app, uow, cache = app_and_deps
+    hashed = []
+
+    def hash_password(plain: str) -> str:
+        hashed.append(plain)
+        return "hashed-" + plain
+
+    app.dependency_overrides[get_hash_password] = lambda: hash_password
+    body = {"email": "jeremy@example.com", "password": "s3cret"}
+    headers = {"Idempotency-Key": "req-1"}
+
+    first = client.post("/v1/users", json=body, headers=headers)
+    second = client.post("/v1/users", json=body, headers=headers)
+
+    assert first.status_code == second.status_code == 202
+    assert second.json() == first.json() == {"status": "accepted"}
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert hashed == ["s3cret"]
+    assert len(cache.calls) == 1
+    # the (email-scoped) key is stored with the outbox row
+    assert [idem for _, _, idem in uow.outbox.enqueues] == [
+        registration_idempotency_key("jeremy@example.com", "req-1")
+    ]
+
+
+def test_register_route_idempotency_key_in_progress_and_failure(client, app_and_deps):
+    app, _, _ = app_and_deps
+    store = app.dependency_overrides[get_idempotency_store]()
+    body = {"email": "jeremy@example.com", "password": "s3cret"}
+    key = registration_idempotency_key("jeremy@example.com", "req-2")
+
+    store.stored[key] = StoredResponse(status_code=None)
+    response = client.post("/v1/users", json=body, headers={"Idempotency-Key": "req-2"})
+    assert response.status_code == 409
+
+    # a failed request drops its claim so the retry runs again
+    del store.stored[key]
+    app.dependency_overrides[get_activation_cache] = FakeErroredActivationCache
+    response = client.post("/v1/users", json=body, headers={"Idempotency-Key": "req-2"})
+    assert response.status_code == 500
+    assert store.released == [key]
+    assert key not in store.stored
@@ -0,0 +1,117 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.infrastructure.security.hasher import PasswordHasherOverloaded
+from app.presentation.admission import AdmissionController, AdmissionMiddleware
+from app.presentation.dependencies import get_hash_password
+
+
+def make_app(controller: AdmissionController) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/users/login")
+    async def slow_login():
+        await asyncio.sleep(0.2)
+        return {"token": "t"}
+
+    @app.get("/v1/users/me")
+    async def me():
+        return {"ok": True}
+
+    app.add_middleware(
+        AdmissionMiddleware, controller=controller, retry_after_seconds=2
+    )
+    return app
+
+
+def make_client(app: FastAPI) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    )
+
+
+@pytest.mark.asyncio
+async def test_sheds_with_503_when_queue_wait_budget_is_exceeded():
+    controller = AdmissionController(max_in_flight=1, queue_wait_budget=0.05)
+    async with make_client(make_app(controller)) as client:
+        r1, r2 = await asyncio.gather(
+            client.post("/v1/users/login"), client.post("/v1/users/login")
+        )
+
+    codes = sorted([r1.status_code, r2.status_code])
+    assert codes == [200, 503]
+    shed = r1 if r1.status_code == 503 else r2
+    assert shed.headers["Retry-After"] == "2"
+    assert controller.stats().shed == {"queue_timeout": 1}
+    assert controller.stats().in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_cheap_routes_are_not_limited():
+    controller = AdmissionController(max_in_flight=1, queue_wait_budget=0.01)
+    async with make_client(make_app(controller)) as client:
+        login = asyncio.create_task(client.post("/v1/users/login"))
+        await asyncio.sleep(0.05)
+        r = await client.get("/v1/users/me")
+        assert r.status_code == 200
+        assert (await login).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_sheds_immediately_on_loop_lag():
+    controller = AdmissionController(
+        max_in_flight=4,
+        queue_wait_budget=1.0,
+        max_loop_lag=0.1,
+        loop_lag=lambda: 0.5,
+    )
+    async with make_client(make_app(controller)) as client:
+        r = await client.post("/v1/users/login")
+    assert r.status_code == 503
+    assert controller.stats().shed == {"loop_lag": 1}
+
+
+@pytest.mark.asyncio
+async def test_sheds_immediately_on_db_pool_waiters():
+    controller = AdmissionController(
+        max_in_flight=4,
+        queue_wait_budget=1.0,
+        max_db_waiting=3,
+        db_waiting=lambda: 7,
+    )
+    async with make_client(make_app(controller)) as client:
+        r = await client.post("/v1/users/login")
+    assert r.status_code == 503
+    assert controller.stats().shed == {"db_pool": 1}
+
+
+def test_overloaded_hasher_maps_to_503(client, app_and_deps):
+    app, _, _ = app_and_deps
+
+    async def _overloaded(_: str) -> str:
+        raise PasswordHasherOverloaded("full")
+
+    app.dependency_overrides[get_hash_password] = lambda: _overloaded
+
+    r = client.post("/v1/users", json={"email": "a@example.com", "password": "s3cret"})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_no_permit_behind():
+    controller = AdmissionController(max_in_flight=1, queue_wait_budget=5)
+    assert await controller.acquire()
+
+    waiter = asyncio.create_task(controller.acquire())
+    await asyncio.sleep(0)
+    controller.release()  # hands the permit to the waiter ...
+    waiter.cancel()  # ... which is cancelled before it resumes
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert await controller.acquire()  # the permit came back
+    assert controller.stats().waiting == 0
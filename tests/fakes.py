@@ -1,20 +1,55 @@
+import asyncio
 from dataclasses import dataclass
 from typing import Any
 from app.domain.entities import User
+from app.domain.ports.idempotency_store import StoredResponse
+from app.infrastructure.redis_cache.sessions import Session
 
 
 class FakeUserRepo:
     def __init__(self):
         self.created_email = None
         self.created_hash = None
+        self.created_id = None
+        # set to simulate an email that is already registered under this id
+        self.existing_id: str | None = None
         self.set_last_code_calls = []
+        self.last_code_sent_at = None
         self.password_hash_by_email: dict[str, str] = {}
         self.set_active_calls: list[str] = []
-
-    async def create_or_update_pending(self, email: str, password_hash: str) -> User:
+        self.activate_if_pending_calls: list[str] = []
+        self.add_failed_attempts_calls: list[tuple[str, int]] = []
+        # set to simulate a concurrent request changing the status first
+        self.still_pending = True
+        self.fused_enqueues = []
+        self.fused_idempotency_keys: list[str | None] = []
+
+    async def create_or_update_pending(
+        self, email: str, password_hash: str, *, user_id: str | None = None
+    ) -> User:
         self.created_email = email
         self.created_hash = password_hash
-        return User(id="u1", email=email, status="pending")
+        self.created_id = self.existing_id or user_id or "u1"
+        return User(id=self.created_id, email=email, status="pending")
+
+    async def create_or_update_pending_with_outbox(
+        self,
+        email: str,
+        password_hash: str,
+        *,
+        user_id: str | None = None,
+        sent_at,
+        topic: str,
+        payload,
+        idempotency_key: str | None = None,
+    ) -> User:
+        user = await self.create_or_update_pending(
+            email, password_hash, user_id=user_id
+        )
+        self.set_last_code_calls.append((user.id, sent_at))
+        self.fused_enqueues.append((topic, payload))
+        self.fused_idempotency_keys.append(idempotency_key)
+        return user
 
     async def get_by_email_for_update(self, email: str):
         raise NotImplementedError
@@ -22,18 +57,36 @@ class FakeUserRepo:
     async def set_active(self, user_id: str) -> None:
         self.set_active_calls.append(user_id)
 
+    async def activate_if_pending(self, user_id: str) -> bool:
+        self.activate_if_pending_calls.append(user_id)
+        return self.still_pending
+
+    async def add_failed_attempts(self, user_id: str, count: int) -> None:
+        self.add_failed_attempts_calls.append((user_id, count))
+
     async def set_last_code_sent_at(self, user_id: str, when) -> None:
         self.set_last_code_calls.append((user_id, when))
 
+    async def get_by_email_with_hash(self, email: str) -> tuple[User, str] | None:
+        return await self.get_by_email_with_hash_for_update(email)
+
     async def get_by_email_with_hash_for_update(
         self, email: str
     ) -> tuple[User, str] | None:
         normalized_email = email.strip().lower()
-        if normalized_email not in self.password_hash_by_email:
+        if (
+            normalized_email not in self.password_hash_by_email
+            and self.existing_id is None
+        ):
             return None
         return (
-            User(id="u1", email=normalized_email, status="pending"),
-            self.password_hash_by_email[normalized_email],
+            User(
+                id=self.existing_id or "u1",
+                email=normalized_email,
+                status="pending",
+                last_code_sent_at=self.last_code_sent_at,
+            ),
+            self.password_hash_by_email.get(normalized_email, ""),
         )
 
 
@@ -47,17 +100,29 @@ class FakeOutboxRepo:
         self.enqueues.append((topic, payload, idempotency_key))
         return "m1"
 
+    async def has_idempotency_key(self, idempotency_key: str) -> bool:
+        return any(key == idempotency_key for _, _, key in self.enqueues)
+
 
 class FakeActivationCache:
-    def __init__(self, verify_result: bool = True):
+    def __init__(self, verify_result: bool = True, check_result: str | None = None):
         self.verify_result = verify_result
+        # defaults to "match"/"mismatch" following verify_result
+        self.check_result = check_result
         self.calls: list[tuple[str, str]] = []
+        self.checks: list[tuple[str, str, int]] = []
 
     async def store_hashed_code(
         self, user_id: str, salt_b64: str, digest_b64: str, ttl_seconds: int
     ) -> None:
         self.calls.append((user_id, salt_b64, digest_b64, ttl_seconds))
 
+    async def check_code(self, user_id: str, code: str, max_attempts: int) -> str:
+        self.checks.append((user_id, code, max_attempts))
+        if self.check_result is not None:
+            return self.check_result
+        return "match" if self.verify_result else "mismatch"
+
     async def verify_and_consume(self, user_id: str, code: str) -> bool:
         self.calls.append((user_id, code))
         return self.verify_result
@@ -73,22 +138,80 @@ class FakeErroredActivationCache(FakeActivationCache):
         raise RuntimeError("Redis down")
 
 
+class FakeResendThrottle:
+    def __init__(self):
+        self.open: set[str] = set()
+        self.released: list[str] = []
+
+    async def try_acquire(self, email: str, ttl_seconds: int) -> bool:
+        if email in self.open:
+            return False
+        self.open.add(email)
+        return True
+
+    async def release(self, email: str) -> None:
+        self.open.discard(email)
+        self.released.append(email)
+
+
+class FakeErroredResendThrottle(FakeResendThrottle):
+    async def try_acquire(self, email: str, ttl_seconds: int) -> bool:
+        raise RuntimeError("Redis down")
+
+
+class FakeIdempotencyStore:
+    def __init__(self):
+        self.stored: dict[str, StoredResponse] = {}
+        self.released: list[str] = []
+
+    async def reserve(self, key: str, ttl_seconds: int) -> StoredResponse | None:
+        if key in self.stored:
+            return self.stored[key]
+        self.stored[key] = StoredResponse(status_code=None)
+        return None
+
+    async def complete(self, key: str, status_code: int, body, ttl_seconds: int):
+        self.stored[key] = StoredResponse(status_code=status_code, body=body)
+
+    async def release(self, key: str) -> None:
+        self.stored.pop(key, None)
+        self.released.append(key)
+
+
+class FakeProfileInvalidation:
+    def __init__(self, uow=None):
+        self._uow = uow
+        self.invalidated: list[str] = []
+        # whether the transaction was committed when invalidate() ran
+        self.after_commit: list[bool] = []
+
+    async def invalidate(self, user_id: str) -> None:
+        self.invalidated.append(user_id)
+        if self._uow is not None:
+            self.after_commit.append(self._uow.committed and not self._uow.active)
+
+
 class FakeUoW:
     def __init__(self):
         self.db_users = FakeUserRepo()
         self.outbox = FakeOutboxRepo()
         self.committed = False
+        self.commits = 0
         self.rolled_back = False
+        self.active = False
 
     async def __aenter__(self):
+        self.active = True
         return self
 
     async def __aexit__(self, exc_type, exc, tb):
+        self.active = False
         if exc:
             self.rolled_back = True
 
     async def commit(self) -> None:
         self.committed = True
+        self.commits += 1
 
     async def rollback(self) -> None:
         self.rolled_back = True
@@ -124,22 +247,87 @@ class FakeEmailFlaky:
             raise RuntimeError("boom once")
 
 
+class FakeEmailFailingFor:
+    """Fails every send to one of `recipients`; records the others."""
+
+    def __init__(self, recipients: set[str]):
+        self.recipients = recipients
+        self.sent: list[str] = []
+
+    async def send(
+        self, *, to: str, subject: str, body: str, idempotency_key=None
+    ) -> None:
+        if to in self.recipients:
+            raise RuntimeError(f"mailbox unavailable: {to}")
+        self.sent.append(to)
+
+
+class FakeEmailSlow:
+    """Takes `delay` seconds per send; records send order and peak concurrency."""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.sent: list[dict[str, Any]] = []
+        self.in_flight = 0
+        self.peak = 0
+        self.peak_by_to: dict[str, int] = {}
+        self._by_to: dict[str, int] = {}
+
+    async def send(
+        self, *, to: str, subject: str, body: str, idempotency_key=None
+    ) -> None:
+        self.in_flight += 1
+        self._by_to[to] = self._by_to.get(to, 0) + 1
+        self.peak = max(self.peak, self.in_flight)
+        self.peak_by_to[to] = max(self.peak_by_to.get(to, 0), self._by_to[to])
+        try:
+            await asyncio.sleep(self.delay)
+            self.sent.append({"to": to, "body": body})
+        finally:
+            self.in_flight -= 1
+            self._by_to[to] -= 1
+
+
 class FakeSessions:
-    def __init__(self) -> None:
+    def __init__(self, snapshots: bool = False) -> None:
         self._store: dict[str, str] = {}
+        self._snapshots: dict[str, tuple[int, User]] = {}
+        self._versions: dict[str, int] = {}
         self._next = 0
+        self.snapshots = snapshots
 
-    async def create(self, user_id: str) -> str:
+    async def create(self, user_id: str, *, user: User | None = None) -> str:
         self._next += 1
         token = f"tok-{self._next}"
         self._store[token] = user_id
+        if self.snapshots and user is not None:
+            self._snapshots[token] = (self._versions.get(user_id, 0), user)
         return token
 
     async def get(self, token: str) -> str | None:
         return self._store.get(token)
 
+    async def get_session(self, token: str) -> Session | None:
+        user_id = self._store.get(token)
+        if user_id is None:
+            return None
+        version, user = self._snapshots.get(token, (None, None))
+        if version != self._versions.get(user_id, 0):
+            user = None
+        return Session(user_id=user_id, user=user)
+
+    async def bump_version(self, user_id: str) -> None:
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
     async def revoke(self, token: str) -> None:
         self._store.pop(token, None)
+        self._snapshots.pop(token, None)
+
+    async def revoke_all(self, user_id: str) -> int:
+        tokens = [t for t, uid in self._store.items() if uid == user_id]
+        for token in tokens:
+            await self.revoke(token)
+        return len(tokens)
 
 
 @dataclass
@@ -166,3 +354,14 @@ class FakeUoWAuth:
 
     async def commit(self) -> None:
         return None
+
+
+class FakeTokenRevocations:
+    def __init__(self) -> None:
+        self.revoked: set[str] = set()
+
+    async def revoke(self, claims) -> None:
+        self.revoked.add(claims.token_id)
+
+    async def is_revoked(self, claims) -> bool:
+        return claims.token_id in self.revoked
@@ -1,10 +1,19 @@
+import asyncio
 from typing import Any
 
 import pytest
 from psycopg.types.json import Json
 
+from app.infrastructure.db.outbox_repo import PgOutboxRepository
+from app.infrastructure.db.prepared import PreparedStatements
 from app.infrastructure.outbox.dispatcher import OutboxDispatcher, RetryPolicy
-from tests.fakes import FakeEmailFlaky, FakeEmailOK
+from app.settings import get_settings
+from tests.fakes import (
+    FakeEmailFailingFor,
+    FakeEmailFlaky,
+    FakeEmailOK,
+    FakeEmailSlow,
+)
 
 pytest_plugins = ["tests.integration.db_fixtures"]
 pytestmark = pytest.mark.usefixtures("truncate_outbox")
@@ -20,25 +29,20 @@ async def _insert_outbox(
     due_now: bool = True,
 ) -> int:
     """
-    Insert a row into outbox. If due_now=True, make it eligible immediately.
+    Insert a row into outbox. If due_now=True, make it eligible immediately,
+    else an hour from now.
     """
     async with pool.connection() as conn:
         async with conn.transaction():
             async with conn.cursor() as cur:
-                if due_now:
-                    sql = """
-                        INSERT INTO outbox (topic, payload, status, attempts, next_attempt_at)
-                        VALUES (%s, %s, %s, %s, NOW())
-                        RETURNING id;
-                    """
-                    await cur.execute(sql, (topic, Json(payload), status, attempts))
-                else:
-                    sql = """
-                        INSERT INTO outbox (topic, payload, status, attempts)
-                        VALUES (%s, %s, %s, %s)
-                        RETURNING id;
-                    """
-                    await cur.execute(sql, (topic, Json(payload), status, attempts))
+                sql = """
+                    INSERT INTO outbox (topic, payload, status, attempts, available_at)
+                    VALUES (%s, %s, %s, %s, NOW() + %s * INTERVAL '1 hour')
+                    RETURNING id;
+                """
+                await cur.execute(
+                    sql, (topic, Json(payload), status, attempts, 0 if due_now else 1)
+                )
                 row = await cur.fetchone()
                 return int(row[0])
 
@@ -47,7 +51,7 @@ async def _row_by_id(pool, msg_id: int) -> dict[str, Any]:
     async with pool.connection() as conn:
         async with conn.cursor() as cur:
             await cur.execute(
-                "SELECT id, topic, status, attempts, next_attempt_at FROM outbox WHERE id=%s",
+                "SELECT id, topic, status, attempts, available_at > NOW() FROM outbox WHERE id=%s",
                 (msg_id,),
             )
             r = await cur.fetchone()
@@ -58,7 +62,7 @@ async def _row_by_id(pool, msg_id: int) -> dict[str, Any]:
         "topic": r[1],
         "status": r[2],
         "attempts": r[3],
-        "next_attempt_at": r[4],
+        "scheduled": r[4],  # due later, not now
     }
 
 
@@ -112,13 +116,13 @@ async def test_dispatch_failure_is_retried_then_succeeds(pool):
     row1 = await _row_by_id(pool, msg_id)
     assert row1["status"] == "pending"
     assert row1["attempts"] == 1
-    assert row1["next_attempt_at"] is not None
+    assert row1["scheduled"] is True
 
     async with pool.connection() as conn:
         async with conn.transaction():
             async with conn.cursor() as cur:
                 await cur.execute(
-                    "UPDATE outbox SET next_attempt_at = NOW() WHERE id=%s",
+                    "UPDATE outbox SET available_at = NOW() WHERE id=%s",
                     (msg_id,),
                 )
 
@@ -154,4 +158,444 @@ async def test_unknown_topic_is_rescheduled(pool):
     row = await _row_by_id(pool, msg_id)
     assert row["status"] == "pending"
     assert row["attempts"] == 1
-    assert row["next_attempt_at"] is not None
+    assert row["scheduled"] is True
+
+
+@pytest.mark.asyncio
+async def test_enqueue_idempotency_key_is_stored_once_and_passed_to_send(pool):
+    async with pool.connection() as conn:
+        repo = PgOutboxRepository(conn, PreparedStatements(enabled=False))
+        payload = {"to": "idem@example.com", "subject": "s", "body": "b"}
+        first = await repo.enqueue(
+            topic="user.verification_code", payload=payload, idempotency_key="k-1"
+        )
+        again = await repo.enqueue(
+            topic="user.verification_code", payload=payload, idempotency_key="k-1"
+        )
+        assert again == first
+        assert await repo.has_idempotency_key("k-1") is True
+        assert await repo.has_idempotency_key("k-2") is False
+        await conn.commit()
+
+    email = FakeEmailOK()
+    dispatcher = OutboxDispatcher(pool=pool, email_adapter=email, batch_size=10)
+    assert await dispatcher._process_once() == 1
+    assert [c["idempotency_key"] for c in email.calls] == ["k-1"]
+
+
+async def _insert_emails(pool, recipients: list[str]) -> list[int]:
+    ids = []
+    for i, to in enumerate(recipients):
+        ids.append(
+            await _insert_outbox(
+                pool,
+                topic="user.verification_code",
+                payload={"to": to, "subject": "s", "body": f"b{i}"},
+            )
+        )
+    return ids
+
+
+@pytest.mark.asyncio
+async def test_batch_is_sent_concurrently_up_to_max_concurrency(pool):
+    email = FakeEmailSlow(delay=0.05)
+    dispatcher = OutboxDispatcher(
+        pool=pool, email_adapter=email, batch_size=10, max_concurrency=3
+    )
+    ids = await _insert_emails(pool, [f"c{i}@example.com" for i in range(7)])
+
+    assert await dispatcher._process_once() == 7
+
+    assert email.peak == 3
+    assert len(email.sent) == 7
+    for msg_id in ids:
+        assert (await _row_by_id(pool, msg_id))["status"] == "dispatched"
+    stats = dispatcher.stats()
+    assert (stats.in_flight, stats.dispatched, stats.failed) == (0, 7, 0)
+
+
+@pytest.mark.asyncio
+async def test_topic_limit_caps_concurrency_of_that_topic(pool):
+    email = FakeEmailSlow(delay=0.05)
+    dispatcher = OutboxDispatcher(
+        pool=pool,
+        email_adapter=email,
+        batch_size=10,
+        max_concurrency=10,
+        topic_limits={"user.verification_code": 2},
+    )
+    await _insert_emails(pool, [f"t{i}@example.com" for i in range(5)])
+
+    assert await dispatcher._process_once() == 5
+    assert email.peak == 2
+
+
+@pytest.mark.asyncio
+async def test_same_recipient_is_sent_one_at_a_time_in_id_order(pool):
+    email = FakeEmailSlow(delay=0.02)
+    dispatcher = OutboxDispatcher(
+        pool=pool, email_adapter=email, batch_size=10, max_concurrency=10
+    )
+    recipients = ["same@example.com", "other@example.com"] * 3
+    await _insert_emails(pool, recipients)
+
+    assert await dispatcher._process_once() == 6
+
+    assert email.peak == 2
+    assert email.peak_by_to == {"same@example.com": 1, "other@example.com": 1}
+    same = [m["body"] for m in email.sent if m["to"] == "same@example.com"]
+    assert same == ["b0", "b2", "b4"]
+
+
+@pytest.mark.asyncio
+async def test_ordered_group_stops_at_the_first_failure(pool):
+    email = FakeEmailFlaky(fail_first=True)
+    dispatcher = OutboxDispatcher(
+        pool=pool,
+        email_adapter=email,
+        batch_size=10,
+        retry_policy=RetryPolicy(base=2, max_delay=60),
+    )
+    first, *rest = await _insert_emails(pool, ["same@example.com"] * 3)
+
+    assert await dispatcher._process_once() == 3
+
+    assert email.calls == 1  # nothing sent after the failure
+    assert (await _row_by_id(pool, first))["attempts"] == 1
+    for msg_id in rest:
+        row = await _row_by_id(pool, msg_id)
+        # back behind the failed message, no attempt spent
+        assert (row["status"], row["attempts"]) == ("pending", 0)
+        assert row["scheduled"] is True
+    assert dispatcher.stats().failed == 1
+
+
+@pytest.mark.asyncio
+async def test_in_flight_is_reported_while_sending(pool):
+    email = FakeEmailSlow(delay=0.2)
+    dispatcher = OutboxDispatcher(pool=pool, email_adapter=email, batch_size=10)
+    await _insert_emails(pool, ["f1@example.com", "f2@example.com"])
+
+    task = asyncio.create_task(dispatcher._process_once())
+    for _ in range(100):
+        if email.in_flight == 2:
+            break
+        await asyncio.sleep(0.01)
+    stats = dispatcher.stats()
+    assert stats.in_flight == 2
+    assert stats.in_flight_by_topic == {"user.verification_code": 2}
+
+    assert await task == 2
+    assert dispatcher.stats().in_flight_by_topic == {}
+
+
+class _CountingPool:
+    def __init__(self, pool):
+        self._pool = pool
+        self.checkouts = 0
+
+    def connection(self):
+        self.checkouts += 1
+        return self._pool.connection()
+
+
+@pytest.mark.asyncio
+async def test_batch_outcomes_are_recorded_in_one_statement(pool):
+    ok = await _insert_emails(pool, ["ok1@example.com", "ok2@example.com"])
+    fresh = await _insert_outbox(
+        pool,
+        topic="user.verification_code",
+        payload={"to": "down@example.com", "subject": "s", "body": "b"},
+    )
+    retried = await _insert_outbox(
+        pool,
+        topic="user.verification_code",
+        payload={"to": "gone@example.com", "subject": "s", "body": "b"},
+        attempts=2,
+    )
+    counting = _CountingPool(pool)
+    dispatcher = OutboxDispatcher(
+        pool=counting,
+        email_adapter=FakeEmailFailingFor({"down@example.com", "gone@example.com"}),
+        batch_size=10,
+        retry_policy=RetryPolicy(base=10, max_delay=1000),
+    )
+
+    assert await dispatcher._process_once() == 4
+    # one checkout to claim the batch, one to record every outcome
+    assert counting.checkouts == 2
+
+    for msg_id in ok:
+        assert (await _row_by_id(pool, msg_id))["status"] == "dispatched"
+
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                SELECT id, status, attempts, last_error,
+                       EXTRACT(EPOCH FROM available_at - updated_at)
+                FROM outbox WHERE id = ANY(%s) ORDER BY id
+                """,
+                ([fresh, retried],),
+            )
+            rows = await cur.fetchall()
+    # each failure keeps its own attempts, delay (base * 2**attempts) and error
+    assert [(r[1], r[2], round(r[4])) for r in rows] == [
+        ("pending", 1, 10),
+        ("pending", 3, 40),
+    ]
+    assert rows[0][3] == "RuntimeError: mailbox unavailable: down@example.com"
+    assert rows[1][3] == "RuntimeError: mailbox unavailable: gone@example.com"
+
+
+async def _wait_until(predicate, timeout: float = 5.0) -> bool:
+    for _ in range(int(timeout / 0.02)):
+        if await predicate():
+            return True
+        await asyncio.sleep(0.02)
+    return False
+
+
+async def _status_is(pool, msg_id: int, status: str) -> bool:
+    return (await _row_by_id(pool, msg_id)).get("status") == status
+
+
+async def _listening(dispatcher) -> bool:
+    return dispatcher.stats().listening
+
+
+@pytest.mark.asyncio
+async def test_notify_wakes_an_idle_dispatcher(pool):
+    email = FakeEmailOK()
+    dispatcher = OutboxDispatcher(
+        pool=pool,
+        email_adapter=email,
+        poll_interval=30,  # only a NOTIFY can wake it within the test
+        listen_dsn=get_settings().database_url,
+    )
+    task = asyncio.create_task(dispatcher.run_forever())
+    try:
+        assert await _wait_until(lambda: _listening(dispatcher))
+        await asyncio.sleep(0.1)  # let the loop go idle
+
+        msg_id = await _insert_outbox(
+            pool,
+            topic="user.verification_code",
+            payload={"to": "n@example.com", "subject": "s", "body": "b"},
+        )
+        assert await _wait_until(lambda: _status_is(pool, msg_id, "dispatched"))
+        assert [c["to"] for c in email.calls] == ["n@example.com"]
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    assert dispatcher.stats().listening is False
+
+
+@pytest.mark.asyncio
+async def test_idle_dispatcher_wakes_up_for_a_due_retry(pool):
+    flaky = FakeEmailFlaky(fail_first=True)
+    dispatcher = OutboxDispatcher(
+        pool=pool,
+        email_adapter=flaky,
+        poll_interval=30,
+        retry_policy=RetryPolicy(base=1, max_delay=1),
+    )
+    msg_id = await _insert_outbox(
+        pool,
+        topic="user.verification_code",
+        payload={"to": "r@example.com", "subject": "s", "body": "b"},
+    )
+    task = asyncio.create_task(dispatcher.run_forever())
+    try:
+        # first send fails (retry in 1s); no NOTIFY, no poll for 30s
+        assert await _wait_until(lambda: _status_is(pool, msg_id, "dispatched"))
+        assert flaky.calls == 2
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+
+@pytest.mark.asyncio
+async def test_claim_takes_due_rows_earliest_first(pool):
+    later = await _insert_outbox(pool, topic="t", payload={}, due_now=False)
+    ids = [await _insert_outbox(pool, topic="t", payload={}) for _ in range(3)]
+    async with pool.connection() as conn:
+        # a retry that became due before the fresh rows were inserted
+        await conn.execute(
+            "UPDATE outbox SET available_at = NOW() - INTERVAL '1 minute' WHERE id = %s",
+            (ids[2],),
+        )
+        await conn.commit()
+    dispatcher = OutboxDispatcher(pool=pool, email_adapter=FakeEmailOK())
+
+    first = await dispatcher._claim_due_batch(2)
+    rest = await dispatcher._claim_due_batch(10)
+
+    assert sorted(m["id"] for m in first) == sorted([ids[2], ids[0]])
+    assert [m["id"] for m in rest] == [ids[1]]
+    assert (await _row_by_id(pool, later))["status"] == "pending"
+
+
+async def _lease_of(pool, msg_id: int) -> tuple[str | None, float]:
+    """-> (locked_by, seconds until available_at) of a row."""
+    async with pool.connection() as conn:
+        cur = await conn.execute(
+            "SELECT locked_by, EXTRACT(EPOCH FROM available_at - NOW())::float8"
+            " FROM outbox WHERE id = %s",
+            (msg_id,),
+        )
+        row = await cur.fetchone()
+        await conn.rollback()
+        return row
+
+
+async def _expire_lease(pool, msg_id: int) -> None:
+    async with pool.connection() as conn:
+        await conn.execute(
+            "UPDATE outbox SET available_at = NOW() - INTERVAL '1 second'"
+            " WHERE id = %s",
+            (msg_id,),
+        )
+        await conn.commit()
+
+
+@pytest.mark.asyncio
+async def test_claim_leases_rows_to_the_worker(pool):
+    msg_id = await _insert_outbox(pool, topic="t", payload={})
+    dispatcher = OutboxDispatcher(
+        pool=pool, email_adapter=FakeEmailOK(), lease_seconds=30, worker_id="w-1"
+    )
+
+    assert [m["id"] for m in await dispatcher._claim_due_batch(10)] == [msg_id]
+
+    locked_by, expires_in = await _lease_of(pool, msg_id)
+    assert locked_by == "w-1"
+    assert 25 < expires_in <= 30
+    assert (await _row_by_id(pool, msg_id))["status"] == "processing"
+    # leased: not claimable by anyone until the lease expires
+    assert await dispatcher._claim_due_batch(10) == []
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_reclaimed_by_another_worker(pool):
+    msg_id = await _insert_outbox(
+        pool,
+        topic="user.verification_code",
+        payload={"to": "stuck@example.com", "subject": "s", "body": "b"},
+    )
+    crashed = OutboxDispatcher(pool=pool, email_adapter=None, worker_id="crashed")
+    await crashed._claim_due_batch(10)  # ... and never comes back
+    await _expire_lease(pool, msg_id)
+
+    email = FakeEmailOK()
+    survivor = OutboxDispatcher(pool=pool, email_adapter=email, worker_id="w-2")
+    assert await survivor._process_once() == 1
+
+    row = await _row_by_id(pool, msg_id)
+    assert (row["status"], row["attempts"]) == ("dispatched", 1)  # the lost send
+    assert (await _lease_of(pool, msg_id))[0] is None
+    assert [c["to"] for c in email.calls] == ["stuck@example.com"]
+    # no Idempotency-Key on the row: the re-send is keyed by the row itself
+    assert email.calls[0]["idempotency_key"] == f"outbox-{msg_id}"
+
+
+@pytest.mark.asyncio
+async def test_reclaimed_row_out_of_attempts_is_failed_without_sending(pool):
+    msg_id = await _insert_outbox(
+        pool,
+        topic="user.verification_code",
+        payload={"to": "poison@example.com", "subject": "s", "body": "b"},
+        attempts=2,
+    )
+    crashed = OutboxDispatcher(pool=pool, email_adapter=None, worker_id="crashed")
+    await crashed._claim_due_batch(10)
+    await _expire_lease(pool, msg_id)
+
+    email = FakeEmailOK()
+    survivor = OutboxDispatcher(
+        pool=pool,
+        email_adapter=email,
+        worker_id="w-2",
+        retry_policy=RetryPolicy(max_attempts=3),
+    )
+    assert await survivor._process_once() == 1
+
+    row = await _row_by_id(pool, msg_id)
+    assert (row["status"], row["attempts"]) == ("failed", 3)
+    assert email.calls == []
+
+
+@pytest.mark.asyncio
+async def test_failure_on_the_last_attempt_is_failed_for_good(pool):
+    msg_id = await _insert_outbox(
+        pool,
+        topic="user.verification_code",
+        payload={"to": "bounce@example.com", "subject": "s", "body": "b"},
+        attempts=2,
+    )
+    dispatcher = OutboxDispatcher(
+        pool=pool,
+        email_adapter=FakeEmailFailingFor({"bounce@example.com"}),
+        retry_policy=RetryPolicy(max_attempts=3),
+    )
+    assert await dispatcher._process_once() == 1
+
+    row = await _row_by_id(pool, msg_id)
+    assert (row["status"], row["attempts"]) == ("failed", 3)
+    assert await dispatcher._claim_due_batch(10) == []
+
+
+@pytest.mark.asyncio
+async def test_leases_are_extended_while_sending(pool):
+    msg_id = await _insert_outbox(
+        pool,
+        topic="user.verification_code",
+        payload={"to": "slow@example.com", "subject": "s", "body": "b"},
+    )
+    email = FakeEmailSlow(delay=0.8)
+    slow = OutboxDispatcher(
+        pool=pool, email_adapter=email, lease_seconds=0.3, worker_id="slow"
+    )
+    other = OutboxDispatcher(pool=pool, email_adapter=FakeEmailOK(), worker_id="w-2")
+
+    task = asyncio.create_task(slow._process_once())
+    await asyncio.sleep(0.5)  # past the first lease, within the send
+    assert await other._claim_due_batch(10) == []
+    assert (await _lease_of(pool, msg_id))[0] == "slow"
+
+    assert await task == 1
+    assert (await _row_by_id(pool, msg_id))["status"] == "dispatched"
+    assert slow.stats().leases_lost == 0
+
+
+@pytest.mark.asyncio
+async def test_outcome_of_a_lost_lease_is_not_written(pool):
+    msg_id = await _insert_outbox(
+        pool,
+        topic="user.verification_code",
+        payload={"to": "fenced@example.com", "subject": "s", "body": "b"},
+    )
+    stale = OutboxDispatcher(
+        pool=pool,
+        email_adapter=FakeEmailFailingFor({"fenced@example.com"}),
+        worker_id="stale",
+    )
+    # the stale worker's lease expires mid-send and another worker takes over
+    batch = await stale._claim_due_batch(10)
+    await _expire_lease(pool, msg_id)
+    assert (
+        await OutboxDispatcher(
+            pool=pool, email_adapter=FakeEmailOK(), worker_id="w-2"
+        )._process_once()
+        == 1
+    )
+
+    outcomes = [await stale._process_message(m) for m in batch]
+    await stale._mark_batch(outcomes)
+
+    row = await _row_by_id(pool, msg_id)
+    # the reclaim counted the stale send; its failure is not written on top
+    assert (row["status"], row["attempts"]) == ("dispatched", 1)
+    assert stale.stats().leases_lost == 1
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from contextlib import asynccontextmanager
+
+import psycopg
+import pytest
+
+from app.infrastructure.db.prepared import PreparedStatements
+from app.infrastructure.db.uow import PgUnitOfWork
+from app.infrastructure.db.users_repo import PgUserRepository
+from app.infrastructure.outbox.dispatcher import OutboxDispatcher
+
+
+async def _server_prepared_count(conn) -> int:
+    async with conn.cursor() as cur:
+        await cur.execute("SELECT count(*) FROM pg_prepared_statements;")
+        return (await cur.fetchone())[0]
+
+
+@pytest.mark.asyncio
+async def test_query_is_prepared_once_per_connection_and_reused(pool):
+    statements = PreparedStatements(enabled=True)
+
+    async with pool.connection() as conn:
+        # keep psycopg's cache in sync with the server; clearing a non-empty
+        # cache queues a DEALLOCATE ALL that psycopg runs after the next query,
+        # so clear first and let it run here, not after the first prepare
+        conn._prepared.clear()
+        await conn.execute("DEALLOCATE ALL;")
+        repo = PgUserRepository(conn, statements)
+
+        for _ in range(3):
+            await repo.get_by_id("00000000-0000-0000-0000-000000000000")
+        await conn.commit()
+
+        assert await _server_prepared_count(conn) == 1
+        await conn.rollback()
+
+    stats = statements.stats()
+    assert (stats.misses, stats.hits) == (1, 2)
+    assert stats.connections == 1
+
+
+@pytest.mark.asyncio
+async def test_disabled_registry_does_not_prepare(pool):
+    statements = PreparedStatements(enabled=False)
+
+    async with pool.connection() as conn:
+        conn._prepared.clear()
+        await conn.execute("DEALLOCATE ALL;")
+        repo = PgUserRepository(conn, statements)
+
+        for _ in range(6):  # above psycopg's default auto-prepare threshold
+            await repo.get_by_id("00000000-0000-0000-0000-000000000000")
+        await conn.commit()
+
+        assert await _server_prepared_count(conn) == 0
+
+    stats = statements.stats()
+    assert (stats.misses, stats.hits) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_uow_rollback_resets_the_connection_entry(pool):
+    statements = PreparedStatements(enabled=True)
+
+    for _ in range(2):
+        # no commit -> rollback -> psycopg deallocates; next use is a miss again
+        async with PgUnitOfWork(pool, statements) as tx:
+            await tx.db_users.get_by_id("00000000-0000-0000-0000-000000000000")
+
+    stats = statements.stats()
+    assert (stats.misses, stats.hits) == (2, 0)
+    assert stats.connections == 0
+
+
+class _OneConnection:
+    """A pool that always hands out the same connection."""
+
+    def __init__(self, conn) -> None:
+        self._conn = conn
+
+    @asynccontextmanager
+    async def connection(self):
+        yield self._conn
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_rollback_resets_the_connection_entry(pool):
+    statements = PreparedStatements(enabled=True)
+
+    async with pool.connection() as conn:
+        repo = PgUserRepository(conn, statements)
+        await repo.get_by_id("00000000-0000-0000-0000-000000000000")
+        await conn.commit()
+        assert statements.stats().connections == 1
+
+        dispatcher = OutboxDispatcher(
+            pool=_OneConnection(conn), email_adapter=None, statements=statements
+        )
+        with pytest.raises(psycopg.Error):
+            await dispatcher._extend_leases(["not-an-id"])  # type error, rollback
+
+    assert statements.stats().connections == 0
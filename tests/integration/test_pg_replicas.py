@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import pytest
+from psycopg.conninfo import make_conninfo
+
+from app.infrastructure.db.replicas import ReplicaPools
+from app.infrastructure.db.uow import PgReadOnlyUnitOfWork, PgUnitOfWork
+from app.settings import get_settings
+
+# The primary itself stands in for a replica (it reports no lag); a real
+# standby (pg_basebackup -R) behaves the same while it keeps up.
+REPLICA_DSN = get_settings().database_url
+UNREACHABLE_DSN = make_conninfo(REPLICA_DSN, port=1, connect_timeout=1)
+
+
+async def _replicas(*dsns: str) -> ReplicaPools:
+    replicas = ReplicaPools(
+        list(dsns), check_interval=60, check_timeout=2, min_size=1, max_size=2
+    )
+    await replicas.open()
+    return replicas
+
+
+async def _create_user(pool, email: str):
+    async with PgUnitOfWork(pool) as tx:
+        user = await tx.db_users.create_or_update_pending(email, "hash")
+        await tx.commit()
+    return user
+
+
+async def _delete_user(pool, email: str) -> None:
+    async with pool.connection() as conn:
+        await conn.execute("DELETE FROM users WHERE email = %s;", (email,))
+        await conn.commit()
+
+
+@pytest.mark.asyncio
+async def test_read_uow_is_served_by_a_healthy_replica(pool):
+    email = "replica-read@example.com"
+    await _delete_user(pool, email)
+    user = await _create_user(pool, email)
+    replicas = await _replicas(REPLICA_DSN)
+    try:
+        assert replicas.stats().healthy == 1
+        assert replicas.stats().lag_seconds == (0.0,)
+
+        async with PgReadOnlyUnitOfWork(pool, replicas=replicas) as tx:
+            got = await tx.db_users.get_by_id(user.id)
+            found = await tx.db_users.get_by_email_with_hash(email)
+
+        assert got is not None and got.email == email
+        assert found is not None and found[1] == "hash"
+        stats = replicas.stats()
+        assert (stats.replica_reads, stats.primary_reads) == (1, 0)
+    finally:
+        await replicas.close()
+        await _delete_user(pool, email)
+
+
+@pytest.mark.asyncio
+async def test_unreachable_replica_sends_reads_to_the_primary(pool):
+    email = "replica-down@example.com"
+    await _delete_user(pool, email)
+    user = await _create_user(pool, email)
+    replicas = await _replicas(UNREACHABLE_DSN)
+    try:
+        stats = replicas.stats()
+        assert stats.healthy == 0 and stats.lag_seconds == (None,)
+
+        async with PgReadOnlyUnitOfWork(pool, replicas=replicas) as tx:
+            got = await tx.db_users.get_by_id(user.id)
+
+        assert got is not None and got.email == email
+        stats = replicas.stats()
+        assert (stats.replica_reads, stats.primary_reads) == (0, 1)
+    finally:
+        await replicas.close()
+        await _delete_user(pool, email)
+
+
+@pytest.mark.asyncio
+async def test_reads_skip_unhealthy_replicas_round_robin(pool):
+    replicas = await _replicas(REPLICA_DSN, UNREACHABLE_DSN, REPLICA_DSN)
+    try:
+        assert replicas.stats().healthy == 2
+        first, second = replicas.pick(), replicas.pick()
+        assert first is not None and second is not None and first is not second
+    finally:
+        await replicas.close()
+
+
+@pytest.mark.asyncio
+async def test_replica_marked_unhealthy_is_skipped_until_next_check(pool):
+    replicas = await _replicas(REPLICA_DSN)
+    try:
+        replica_pool = replicas.pick()
+        assert replica_pool is not None
+
+        replicas.mark_unhealthy(replica_pool)
+        assert replicas.pick() is None
+        assert replicas.stats().failures == 1
+
+        await replicas.check()
+        assert replicas.pick() is replica_pool
+    finally:
+        await replicas.close()
+
+
+@pytest.mark.asyncio
+async def test_replica_lag_over_the_limit_is_unhealthy(pool):
+    replicas = ReplicaPools(
+        [REPLICA_DSN], max_lag_seconds=-1, check_interval=60, min_size=1
+    )
+    await replicas.open()
+    try:
+        # a measured lag of 0s is already over a negative limit
+        stats = replicas.stats()
+        assert stats.lag_seconds == (0.0,) and stats.healthy == 0
+        assert replicas.pick() is None
+    finally:
+        await replicas.close()
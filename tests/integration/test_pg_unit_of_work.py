@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+import psycopg
+import pytest
+from psycopg.pq import TransactionStatus
+
+from app.infrastructure.db.uow import (
+    PgPipelinedUnitOfWork,
+    PgReadOnlyUnitOfWork,
+    PgUnitOfWork,
+)
+
+UOW_CLASSES = [PgUnitOfWork, PgPipelinedUnitOfWork]
+
+
+async def _delete_user(pool, email: str) -> None:
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("DELETE FROM users WHERE email = %s;", (email,))
+        await conn.commit()
+
+
+async def _status_of(pool, email: str) -> str | None:
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT status FROM users WHERE email = %s;", (email,))
+            row = await cur.fetchone()
+        await conn.rollback()
+    return row[0] if row else None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("uow_cls", UOW_CLASSES)
+async def test_statements_apply_in_order_and_commit(pool, uow_cls):
+    email = f"order-{uow_cls.__name__.lower()}@example.com"
+    await _delete_user(pool, email)
+    when = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    async with uow_cls(pool) as tx:
+        user = await tx.db_users.create_or_update_pending(email, "hash")
+        # no rows fetched for these two: queued in pipeline mode
+        await tx.db_users.set_last_code_sent_at(user.id, when)
+        await tx.db_users.set_active(user.id)
+        # the read must see both earlier writes
+        got = await tx.db_users.get_by_id(user.id)
+        assert got is not None and got.status == "active"
+        await tx.commit()
+
+    assert await _status_of(pool, email) == "active"
+    await _delete_user(pool, email)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("uow_cls", UOW_CLASSES)
+async def test_activate_if_pending_reports_the_winner(pool, uow_cls):
+    email = f"activate-{uow_cls.__name__.lower()}@example.com"
+    await _delete_user(pool, email)
+
+    async with uow_cls(pool) as tx:
+        user = await tx.db_users.create_or_update_pending(email, "hash")
+        assert await tx.db_users.activate_if_pending(user.id) is True
+        assert await tx.db_users.activate_if_pending(user.id) is False
+        await tx.commit()
+
+    assert await _status_of(pool, email) == "active"
+    await _delete_user(pool, email)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("uow_cls", UOW_CLASSES)
+async def test_failed_statement_raises_inside_block_and_rolls_back(pool, uow_cls):
+    email = f"error-{uow_cls.__name__.lower()}@example.com"
+    await _delete_user(pool, email)
+
+    with pytest.raises(psycopg.errors.InvalidTextRepresentation):
+        async with uow_cls(pool) as tx:
+            await tx.db_users.create_or_update_pending(email, "hash")
+            # invalid uuid: fails on the server
+            await tx.db_users.set_active("not-a-uuid")
+            await tx.commit()
+
+    # nothing from the failed transaction is visible
+    assert await _status_of(pool, email) is None
+
+    # the connection went back to the pool in a usable state
+    async with uow_cls(pool) as tx:
+        await tx.db_users.create_or_update_pending(email, "hash")
+        await tx.commit()
+    assert await _status_of(pool, email) == "pending"
+    await _delete_user(pool, email)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("uow_cls", UOW_CLASSES)
+async def test_exit_without_commit_rolls_back(pool, uow_cls):
+    email = f"nocommit-{uow_cls.__name__.lower()}@example.com"
+    await _delete_user(pool, email)
+
+    async with uow_cls(pool) as tx:
+        user = await tx.db_users.create_or_update_pending(email, "hash")
+        await tx.db_users.set_active(user.id)
+
+    assert await _status_of(pool, email) is None
+
+
+@pytest.mark.asyncio
+async def test_read_only_uow_runs_in_autocommit_and_restores_the_connection(pool):
+    email = "readonly-uow@example.com"
+    await _delete_user(pool, email)
+    async with PgUnitOfWork(pool) as tx:
+        await tx.db_users.create_or_update_pending(email, "hash")
+        await tx.commit()
+
+    async with PgReadOnlyUnitOfWork(pool) as tx:
+        found = await tx.db_users.get_by_email_with_hash(email)
+        # no BEGIN was sent: the connection is idle, not inside a transaction
+        assert tx._conn.info.transaction_status == TransactionStatus.IDLE
+        conn = tx._conn
+        await tx.commit()
+
+    assert found is not None and found[0].email == email
+    assert conn.autocommit is False  # back in the pool as a regular connection
+    await _delete_user(pool, email)
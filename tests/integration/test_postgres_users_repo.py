@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+from datetime import datetime, timezone
+from uuid import uuid4
+
 import pytest
 
 from app.infrastructure.db.users_repo import PgUserRepository
@@ -70,3 +73,146 @@ async def test_users_repo_create_or_update_and_get_with_hash(pool):
         assert user3.id == u1.id
         assert user3.email == "jeremy@example.com"
         assert pwd_hash == "hash-1"
+
+
+@pytest.mark.asyncio
+async def test_users_repo_fused_registration_write(pool):
+    """
+    create_or_update_pending_with_outbox: upsert + last_code_sent_at + outbox row
+    in one statement, for new, pending and active users.
+    """
+    email = "fused@example.com"
+    sent_1 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    sent_2 = datetime(2025, 1, 2, tzinfo=timezone.utc)
+    sent_3 = datetime(2025, 1, 3, tzinfo=timezone.utc)
+
+    async def outbox_count(conn) -> int:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT count(*) FROM outbox WHERE payload->>'to' = %s;", (email,)
+            )
+            return (await cur.fetchone())[0]
+
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("DELETE FROM users WHERE email = %s;", (email,))
+            await cur.execute("DELETE FROM outbox WHERE payload->>'to' = %s;", (email,))
+
+        repo = PgUserRepository(conn)
+        payload = {"to": email, "subject": "s", "body": "Your code is 1234"}
+
+        # 1) new user
+        u1 = await repo.create_or_update_pending_with_outbox(
+            email,
+            "hash-1",
+            sent_at=sent_1,
+            topic="user.verification_code",
+            payload=payload,
+        )
+        assert u1.status == "pending"
+        assert u1.last_code_sent_at == sent_1
+        assert await outbox_count(conn) == 1
+
+        # 2) pending user: hash and timestamp updated
+        u2 = await repo.create_or_update_pending_with_outbox(
+            email,
+            "hash-2",
+            sent_at=sent_2,
+            topic="user.verification_code",
+            payload=payload,
+        )
+        assert u2.id == u1.id
+        assert u2.last_code_sent_at == sent_2
+        assert await outbox_count(conn) == 2
+
+        # 2b) same idempotency key twice: a single outbox row
+        for _ in range(2):
+            await repo.create_or_update_pending_with_outbox(
+                email,
+                "hash-2",
+                sent_at=sent_2,
+                topic="user.verification_code",
+                payload=payload,
+                idempotency_key=f"fused-test-{email}",
+            )
+        assert await outbox_count(conn) == 3
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "DELETE FROM outbox WHERE idempotency_key = %s;",
+                (f"fused-test-{email}",),
+            )
+
+        # 3) active user: hash untouched, timestamp still stamped (same as multi-call path)
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "UPDATE users SET status = 'active' WHERE id = %s;", (u1.id,)
+            )
+        u3 = await repo.create_or_update_pending_with_outbox(
+            email,
+            "hash-3",
+            sent_at=sent_3,
+            topic="user.verification_code",
+            payload=payload,
+        )
+        assert u3.id == u1.id
+        assert u3.status == "active"
+        assert u3.last_code_sent_at == sent_3
+        assert await outbox_count(conn) == 3
+
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT password_hash FROM users WHERE id = %s;", (u1.id,)
+            )
+            assert (await cur.fetchone())[0] == "hash-2"
+            await cur.execute("DELETE FROM outbox WHERE payload->>'to' = %s;", (email,))
+        await conn.commit()
+
+
+@pytest.mark.asyncio
+async def test_users_repo_uses_given_id_for_new_users_only(pool):
+    email = "given-id@example.com"
+    given = str(uuid4())
+
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("DELETE FROM users WHERE email = %s;", (email,))
+
+        repo = PgUserRepository(conn)
+        u1 = await repo.create_or_update_pending(email, "hash-1", user_id=given)
+        assert u1.id == given
+
+        # existing email keeps its id
+        u2 = await repo.create_or_update_pending(email, "hash-2", user_id=str(uuid4()))
+        assert u2.id == given
+        await conn.rollback()
+
+
+@pytest.mark.asyncio
+async def test_users_repo_activate_if_pending_only_once(pool):
+    email = "optimistic@example.com"
+
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("DELETE FROM users WHERE email = %s;", (email,))
+
+        repo = PgUserRepository(conn)
+        user = await repo.create_or_update_pending(email, "hash-1")
+
+        got = await repo.get_by_email_with_hash(email)
+        assert got is not None and got[0].status == "pending"
+
+        assert await repo.activate_if_pending(user.id) is True
+        # second attempt (e.g. a concurrent activation) matches no row
+        assert await repo.activate_if_pending(user.id) is False
+
+        got = await repo.get_by_email_with_hash(email)
+        assert got is not None and got[0].status == "active"
+
+        await repo.add_failed_attempts(user.id, 5)
+        await repo.add_failed_attempts(user.id, 5)
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT failed_attempts FROM users WHERE id = %s;", (user.id,)
+            )
+            assert (await cur.fetchone())[0] == 10
+        await conn.rollback()
@@ -8,7 +8,11 @@ from uuid import uuid4
 import pytest
 from redis.asyncio import Redis
 
-from app.infrastructure.redis_cache.activation_cache import RedisActivationCache
+from app.domain.services import make_keyed_code_digest
+from app.infrastructure.redis_cache.activation_cache import (
+    RedisActivationCache,
+    encode_code,
+)
 
 
 def make_digest_b64(code: str, salt_b64: str) -> str:
@@ -19,10 +23,15 @@ def make_digest_b64(code: str, salt_b64: str) -> str:
     return base64.b64encode(h.digest()).decode("utf-8")
 
 
-def make_cache() -> tuple[RedisActivationCache, Redis]:
+def raw_client() -> Redis:
+    # values are binary: read them without decoding
+    return Redis.from_url(os.environ.get("REDIS_URL", "redis://redis:6379/0"))
+
+
+def make_cache(code_secret: str | None = None) -> tuple[RedisActivationCache, Redis]:
     url = os.environ.get("REDIS_URL", "redis://redis:6379/0")
     r = Redis.from_url(url, encoding="utf-8", decode_responses=True)
-    return RedisActivationCache(r), r
+    return RedisActivationCache(r, code_secret=code_secret), r
 
 
 @pytest.mark.asyncio
@@ -65,9 +74,9 @@ async def test_wrong_code_does_not_consume():
     ok = await cache.verify_and_consume(user_id, bad_code)
     assert ok is False
 
-    # key still present (not consumed on mismatch)
-    h = await r.hgetall(f"act:{user_id}")
-    assert h.get("digest") == digest_b64
+    # key still present (not consumed on mismatch), one attempt counted
+    raw = await raw_client().get(f"act:{user_id}")
+    assert raw == encode_code(salt_b64, digest_b64, attempts=1)
 
 
 @pytest.mark.asyncio
@@ -129,3 +138,133 @@ async def test_atomic_single_use_under_race():
     # key consumed
     exists = await r.exists(f"act:{user_id}")
     assert exists == 0
+
+
+@pytest.mark.asyncio
+async def test_keyed_digest_verifies_in_one_round_trip():
+    cache, r = make_cache(code_secret="secret")
+    user_id = str(uuid4())
+    digest_b64 = make_keyed_code_digest("1234", user_id, "secret")
+    await cache.store_hashed_code(user_id, "", digest_b64, ttl_seconds=60)
+
+    calls = []
+    script = cache._compare
+    original = script.__call__
+
+    async def counting(*args, **kwargs):
+        calls.append(kwargs.get("args"))
+        return await original(*args, **kwargs)
+
+    cache._compare = counting
+    assert await cache.verify_and_consume(user_id, "0000") is False
+    assert await cache.verify_and_consume(user_id, "1234") is True
+    assert len(calls) == 2  # one script call per verification
+    assert await r.exists(f"act:{user_id}") == 0
+    # the script is cached server-side
+    assert (await r.script_exists(script.sha)) == [True]
+
+
+@pytest.mark.asyncio
+async def test_legacy_salted_entry_still_validates_with_keyed_cache():
+    cache, r = make_cache(code_secret="secret")
+    user_id = str(uuid4())
+    salt_b64 = base64.b64encode(secrets.token_bytes(16)).decode()
+    await cache.store_hashed_code(
+        user_id, salt_b64, make_digest_b64("1234", salt_b64), ttl_seconds=60
+    )
+
+    assert await cache.verify_and_consume(user_id, "9999") is False
+    assert await r.exists(f"act:{user_id}") == 1
+    assert await cache.verify_and_consume(user_id, "1234") is True
+    assert await r.exists(f"act:{user_id}") == 0
+
+
+@pytest.mark.asyncio
+async def test_keyed_entry_rejected_without_secret_and_script_reloaded_on_noscript():
+    keyed, r = make_cache(code_secret="secret")
+    plain, _ = make_cache()
+    user_id = str(uuid4())
+    digest_b64 = make_keyed_code_digest("1234", user_id, "secret")
+    await keyed.store_hashed_code(user_id, "", digest_b64, ttl_seconds=60)
+
+    assert await plain.verify_and_consume(user_id, "1234") is False
+
+    await r.script_flush()
+    assert await keyed.verify_and_consume(user_id, "1234") is True
+
+
+@pytest.mark.asyncio
+async def test_compact_values_are_one_string_with_ttl():
+    cache, r = make_cache(code_secret="secret")
+    keyed_id, salted_id = str(uuid4()), str(uuid4())
+    salt_b64 = base64.b64encode(secrets.token_bytes(16)).decode()
+
+    await cache.store_hashed_code(
+        keyed_id, "", make_keyed_code_digest("1234", keyed_id, "secret"), 60
+    )
+    await cache.store_hashed_code(
+        salted_id, salt_b64, make_digest_b64("1234", salt_b64), 60
+    )
+
+    raw = raw_client()
+    keyed, salted = await raw.get(f"act:{keyed_id}"), await raw.get(f"act:{salted_id}")
+    assert await r.type(f"act:{keyed_id}") == "string"
+    assert 0 < await r.ttl(f"act:{keyed_id}") <= 60
+    # version byte + attempt counter + (salt) + digest
+    assert len(keyed) == 2 + 32 and keyed[:2] == bytes((2, 0))
+    assert len(salted) == 2 + 16 + 32 and salted[:2] == bytes((1, 0))
+
+
+@pytest.mark.asyncio
+async def test_hash_entries_from_before_compact_encoding_still_validate():
+    cache, r = make_cache(code_secret="secret")
+    keyed_id, salted_id = str(uuid4()), str(uuid4())
+    salt_b64 = base64.b64encode(secrets.token_bytes(16)).decode()
+
+    keyed_digest = make_keyed_code_digest("1234", keyed_id, "secret")
+    await r.hset(f"act:{keyed_id}", mapping={"salt": "", "digest": keyed_digest})
+    await r.hset(
+        f"act:{salted_id}",
+        mapping={"salt": salt_b64, "digest": make_digest_b64("1234", salt_b64)},
+    )
+
+    assert await cache.verify_and_consume(keyed_id, "0000") is False
+    assert await cache.verify_and_consume(keyed_id, "1234") is True
+    assert await cache.verify_and_consume(salted_id, "1234") is True
+    assert await r.exists(f"act:{keyed_id}", f"act:{salted_id}") == 0
+
+
+@pytest.mark.asyncio
+async def test_check_code_counts_attempts_and_burns_at_limit():
+    cache, r = make_cache(code_secret="secret")
+    user_id = str(uuid4())
+    digest_b64 = make_keyed_code_digest("1234", user_id, "secret")
+    await cache.store_hashed_code(user_id, "", digest_b64, ttl_seconds=60)
+
+    # a right code is not consumed by the check
+    assert await cache.check_code(user_id, "1234", max_attempts=3) == "match"
+    assert await cache.check_code(user_id, "0000", max_attempts=3) == "mismatch"
+    assert await cache.check_code(user_id, "0001", max_attempts=3) == "mismatch"
+    assert (await raw_client().get(f"act:{user_id}"))[1] == 2
+    assert 0 < await r.ttl(f"act:{user_id}") <= 60
+
+    assert await cache.check_code(user_id, "0002", max_attempts=3) == "exhausted"
+    assert await r.exists(f"act:{user_id}") == 0
+    # burned: even the right code is rejected now
+    assert await cache.check_code(user_id, "1234", max_attempts=3) == "mismatch"
+    assert await cache.verify_and_consume(user_id, "1234") is False
+
+
+@pytest.mark.asyncio
+async def test_check_code_on_salted_entry():
+    cache, r = make_cache()
+    user_id = str(uuid4())
+    salt_b64 = base64.b64encode(secrets.token_bytes(16)).decode()
+    await cache.store_hashed_code(
+        user_id, salt_b64, make_digest_b64("1234", salt_b64), ttl_seconds=60
+    )
+
+    assert await cache.check_code(user_id, "1234", max_attempts=2) == "match"
+    assert await cache.check_code(user_id, "0000", max_attempts=2) == "mismatch"
+    assert await cache.check_code(user_id, "0000", max_attempts=2) == "exhausted"
+    assert await r.exists(f"act:{user_id}") == 0
@@ -0,0 +1,25 @@
+import pytest
+
+from app.domain.ports.idempotency_store import StoredResponse
+from app.infrastructure.redis_cache.idempotency import RedisIdempotencyStore
+
+
+@pytest.mark.asyncio
+async def test_reserve_complete_replay_release(redis_client):
+    r = redis_client
+    store = RedisIdempotencyStore(r, key_prefix="idem:test:")
+    await r.delete("idem:test:k")
+
+    assert await store.reserve("k", 60) is None
+    # a concurrent retry sees the in-progress marker
+    assert await store.reserve("k", 60) == StoredResponse(status_code=None)
+
+    await store.complete("k", 202, {"status": "accepted"}, 60)
+    assert await store.reserve("k", 60) == StoredResponse(
+        status_code=202, body={"status": "accepted"}
+    )
+    assert 0 < await r.ttl("idem:test:k") <= 60
+
+    await store.release("k")
+    assert await store.reserve("k", 60) is None
+    await store.release("k")
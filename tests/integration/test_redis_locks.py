@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+from app.infrastructure.redis_cache.locks import RedisLock
+
+
+@pytest.mark.asyncio
+async def test_lock_acquire_release_and_wait(redis_client):
+    r = redis_client
+    lock = RedisLock(r, key_prefix="lock:test:", poll_interval=0.01)
+    await r.delete("lock:test:k")
+
+    token = await lock.acquire("k", ttl_seconds=5)
+    assert token is not None
+    assert await lock.acquire("k", ttl_seconds=5) is None
+
+    # a stale token can't release someone else's lock
+    await lock.release("k", "not-the-token")
+    assert await r.exists("lock:test:k") == 1
+
+    assert await lock.wait_released("k", timeout_seconds=0.05) is False
+    waiter = asyncio.create_task(lock.wait_released("k", timeout_seconds=2))
+    await lock.release("k", token)
+    assert await waiter is True
+
+
+@pytest.mark.asyncio
+async def test_lock_expires(redis_client):
+    lock = RedisLock(redis_client, key_prefix="lock:test:", poll_interval=0.01)
+    await redis_client.delete("lock:test:ttl")
+
+    assert await lock.acquire("ttl", ttl_seconds=0.05) is not None
+    assert await lock.wait_released("ttl", timeout_seconds=1) is True
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from app.domain.entities import User
+from app.infrastructure.redis_cache.near_cache import RedisNearCache
+from app.infrastructure.redis_cache.sessions import RedisSessions
+
+
+async def _wait_for(predicate, timeout: float = 2.0) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        if predicate():
+            return True
+        await asyncio.sleep(0.01)
+    return predicate()
+
+
+@pytest.mark.asyncio
+async def test_repeated_session_lookups_skip_redis_until_invalidated(redis_client):
+    r = redis_client
+    prefix, version_prefix = "sess:test:near:", "sessver:test:near:"
+    near = RedisNearCache(r, prefixes=(prefix, version_prefix))
+    sessions = RedisSessions(
+        r,
+        key_prefix=prefix,
+        ttl_seconds=30,
+        snapshots=True,
+        version_key_prefix=version_prefix,
+        near_cache=near,
+    )
+    await r.delete(f"{version_prefix}user-1")
+    user = User(id="user-1", email="near@example.com", status="active")
+
+    near.start()
+    try:
+        assert await _wait_for(lambda: near.tracking)
+        token = await sessions.create("user-1", user=user)
+
+        first = await sessions.get_session(token)  # miss: read and cached
+        second = await sessions.get_session(token)  # answered in process
+        assert first == second and second.user is not None
+        stats = near.stats()
+        assert (stats.hits, stats.size) == (2, 2)  # session + version key
+
+        # a status change elsewhere: Redis pushes the version key invalidation
+        await sessions.bump_version("user-1")
+        assert await _wait_for(lambda: near.stats().size == 1)
+        assert (await sessions.get_session(token)).user is None
+
+        await sessions.revoke(token)
+        assert await _wait_for(lambda: near.stats().size <= 1)
+        assert await sessions.get_session(token) is None
+        assert near.stats().hit_rate > 0
+    finally:
+        await near.stop()
+
+    assert near.tracking is False
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_redis_when_tracking_is_refused(redis_client):
+    # overlapping BCAST prefixes are rejected by the server
+    near = RedisNearCache(redis_client, prefixes=("sess:", "sess:test:"))
+    sessions = RedisSessions(
+        redis_client, key_prefix="sess:test:fallback:", near_cache=near
+    )
+
+    near.start()
+    try:
+        assert await _wait_for(lambda: near._task.done())  # gave up, no retries
+        assert near.tracking is False
+        token = await sessions.create("user-2")
+        assert (await sessions.get_session(token)).user_id == "user-2"
+        assert near.stats().size == 0
+    finally:
+        await near.stop()
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from app.application.profile_cache import ProfileCache
+from app.domain.entities import User
+from app.infrastructure.redis_cache.profile_invalidation import (
+    RedisProfileInvalidation,
+)
+from app.infrastructure.redis_cache.sessions import RedisSessions
+
+
+async def _wait_for(predicate, timeout: float = 2.0) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        if predicate():
+            return True
+        await asyncio.sleep(0.01)
+    return predicate()
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_other_processes(redis_client):
+    channel = "users:invalidate:test"
+    local, remote = ProfileCache(), ProfileCache()
+    publisher = RedisProfileInvalidation(redis_client, local, channel=channel)
+    listener = RedisProfileInvalidation(redis_client, remote, channel=channel)
+
+    listener.start()
+    try:
+        # the listener clears its cache once subscribed
+        remote.put(User(id="seed", email="seed@example.com"), version=remote.version)
+        assert await _wait_for(lambda: remote.stats().size == 0)
+
+        for cache in (local, remote):
+            cache.put(User(id="u1", email="u1@example.com"), version=cache.version)
+
+        await publisher.invalidate("u1")
+
+        assert local.get("u1") is None  # dropped locally before publishing
+        assert await _wait_for(lambda: remote.stats().invalidations == 1)
+        assert remote.get("u1") is None
+    finally:
+        await listener.stop()
+
+
+@pytest.mark.asyncio
+async def test_invalidation_bumps_session_version(redis_client):
+    version_prefix = "sessver:test:inv:"
+    await redis_client.delete(f"{version_prefix}u2")
+    sessions = RedisSessions(
+        redis_client, ttl_seconds=30, version_key_prefix=version_prefix
+    )
+    invalidation = RedisProfileInvalidation(
+        redis_client, channel="users:invalidate:test", sessions=sessions
+    )
+
+    await invalidation.invalidate("u2")
+    await invalidation.invalidate("u2")
+
+    assert await redis_client.get(f"{version_prefix}u2") == "2"
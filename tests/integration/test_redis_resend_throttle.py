@@ -0,0 +1,21 @@
+import pytest
+
+from app.infrastructure.redis_cache.resend_throttle import RedisResendThrottle
+
+
+@pytest.mark.asyncio
+async def test_resend_throttle_window(redis_client):
+    r = redis_client
+    prefix = "resend:test:"
+    email = "throttle@example.com"
+    await r.delete(f"{prefix}{email}")
+
+    throttle = RedisResendThrottle(r, key_prefix=prefix)
+
+    assert await throttle.try_acquire(email, 30) is True
+    assert await throttle.try_acquire(email, 30) is False
+    assert 0 < await r.ttl(f"{prefix}{email}") <= 30
+
+    await throttle.release(email)
+    assert await throttle.try_acquire(email, 30) is True
+    await throttle.release(email)
@@ -1,7 +1,8 @@
 import asyncio
 import pytest
 
-from app.infrastructure.redis_cache.sessions import RedisSessions
+from app.domain.entities import User
+from app.infrastructure.redis_cache.sessions import RedisSessions, Session
 
 
 async def _flush_prefix(redis, prefix: str) -> None:
@@ -60,3 +61,132 @@ async def test_tokens_are_random_and_unique(redis_client):
 
     resolved = [await sessions.get(t) for t in tokens]
     assert all(uid == "user-1" for uid in resolved)
+
+
+@pytest.mark.asyncio
+async def test_snapshot_session_answers_in_one_call_until_version_bump(redis_client):
+    r = redis_client
+    prefix, version_prefix = "sess:test:snap:", "sessver:test:snap:"
+    await _flush_prefix(r, prefix)
+    await _flush_prefix(r, version_prefix)
+
+    sessions = RedisSessions(
+        r,
+        key_prefix=prefix,
+        ttl_seconds=30,
+        snapshots=True,
+        version_key_prefix=version_prefix,
+    )
+    user = User(id="user-1", email="a|b@example.com", status="active")
+    token = await sessions.create("user-1", user=user)
+
+    assert await sessions.get(token) == "user-1"
+    session = await sessions.get_session(token)
+    assert session.user_id == "user-1"
+    assert (session.user.email, session.user.status) == ("a|b@example.com", "active")
+
+    await sessions.bump_version("user-1")
+    assert await r.ttl(f"{version_prefix}user-1") > 0
+    assert await sessions.get_session(token) == Session(user_id="user-1")
+
+    # sessions minted after the bump carry the new version
+    fresh = await sessions.create("user-1", user=user)
+    assert (await sessions.get_session(fresh)).user is not None
+
+
+@pytest.mark.asyncio
+async def test_snapshot_session_extends_version_key_ttl(redis_client):
+    r = redis_client
+    prefix, version_prefix = "sess:test:snapttl:", "sessver:test:snapttl:"
+    await _flush_prefix(r, prefix)
+    await _flush_prefix(r, version_prefix)
+
+    sessions = RedisSessions(
+        r,
+        key_prefix=prefix,
+        ttl_seconds=30,
+        snapshots=True,
+        version_key_prefix=version_prefix,
+    )
+    user = User(id="user-1", email="a@example.com", status="active")
+    await sessions.bump_version("user-1")
+    await r.expire(f"{version_prefix}user-1", 5)  # the bump was a while ago
+
+    await sessions.create("user-1", user=user)
+
+    # the version key now lives as long as the snapshot that recorded it
+    assert await r.ttl(f"{version_prefix}user-1") > 5
+
+
+@pytest.mark.asyncio
+async def test_plain_sessions_still_resolve(redis_client):
+    r = redis_client
+    prefix = "sess:test:plain:"
+    await _flush_prefix(r, prefix)
+
+    plain = RedisSessions(r, key_prefix=prefix, ttl_seconds=30)
+    user = User(id="user-2", email="p@example.com", status="active")
+    token = await plain.create("user-2", user=user)  # snapshots off: id only
+    assert await r.get(f"{prefix}{token}") == "user-2"
+
+    snapshots = RedisSessions(r, key_prefix=prefix, ttl_seconds=30, snapshots=True)
+    assert await snapshots.get_session(token) == Session(user_id="user-2")
+    assert await snapshots.get_session("missing") is None
+
+
+@pytest.mark.asyncio
+async def test_user_session_index_revoke_and_revoke_all(redis_client):
+    r = redis_client
+    prefix, index_prefix = "sess:test:idx:", "sessidx:test:idx:"
+    await _flush_prefix(r, prefix)
+    await _flush_prefix(r, index_prefix)
+
+    sessions = RedisSessions(
+        r, key_prefix=prefix, ttl_seconds=30, index_key_prefix=index_prefix
+    )
+    tokens = [await sessions.create("user-1") for _ in range(3)]
+    other = await sessions.create("user-2")
+    assert await sessions.count("user-1") == 3
+    assert 0 < await r.ttl(f"{index_prefix}user-1") <= 30
+
+    await sessions.revoke(tokens[0])
+    assert await sessions.get(tokens[0]) is None
+    assert await sessions.count("user-1") == 2
+
+    assert await sessions.revoke_all("user-1") == 2
+    assert [await sessions.get(t) for t in tokens] == [None, None, None]
+    assert await r.exists(f"{index_prefix}user-1") == 0
+    assert await sessions.get(other) == "user-2"
+
+
+@pytest.mark.asyncio
+async def test_session_cap_evicts_oldest_and_expired_entries_are_dropped(
+    redis_client,
+):
+    r = redis_client
+    prefix, index_prefix = "sess:test:cap:", "sessidx:test:cap:"
+    await _flush_prefix(r, prefix)
+    await _flush_prefix(r, index_prefix)
+
+    sessions = RedisSessions(
+        r,
+        key_prefix=prefix,
+        ttl_seconds=30,
+        index_key_prefix=index_prefix,
+        max_sessions_per_user=2,
+    )
+    first = await sessions.create("user-1")
+    second = await sessions.create("user-1")
+    third = await sessions.create("user-1")
+
+    assert await sessions.get(first) is None  # oldest evicted
+    assert await sessions.get(second) == "user-1"
+    assert await sessions.get(third) == "user-1"
+    assert await r.zcard(f"{index_prefix}user-1") == 2
+
+    # an index entry whose session already expired is dropped on the next create
+    await r.zadd(f"{index_prefix}user-1", {"stale-token": 1})
+    assert await sessions.count("user-1") == 2
+    await sessions.create("user-1")
+    members = await r.zrange(f"{index_prefix}user-1", 0, -1)
+    assert "stale-token" not in members and len(members) == 2
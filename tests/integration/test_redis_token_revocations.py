@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+import pytest
+
+from app.infrastructure.redis_cache.token_revocations import RedisTokenRevocations
+from app.infrastructure.security.access_tokens import AccessClaims
+
+
+def _claims(token_id: str) -> AccessClaims:
+    return AccessClaims(
+        user_id="user-1", token_id=token_id, expires_at=int(time.time()) + 60
+    )
+
+
+async def _wait_for(predicate, timeout: float = 2.0) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        if predicate():
+            return True
+        await asyncio.sleep(0.01)
+    return predicate()
+
+
+@pytest.mark.asyncio
+async def test_revocation_reaches_other_processes_filter(redis_client):
+    r = redis_client
+    stream, prefix = "revoked-tokens:test", "revoked:test:"
+    await r.delete(stream, f"{prefix}old", f"{prefix}new")
+
+    def make() -> RedisTokenRevocations:
+        return RedisTokenRevocations(
+            r, retention_seconds=60, key_prefix=prefix, stream=stream, block_ms=100
+        )
+
+    revoker, follower = make(), make()
+    await revoker.revoke(_claims("old"))  # before the follower starts
+
+    # not synced yet: every check goes to Redis
+    assert await follower.is_revoked(_claims("old")) is True
+    assert follower.stats().redis_checks == 1
+
+    follower.start()
+    try:
+        assert await _wait_for(lambda: follower.stats().synced)
+        await revoker.revoke(_claims("new"))
+        assert await _wait_for(lambda: follower.stats().entries == 2)
+
+        assert await follower.is_revoked(_claims("new")) is True
+        assert await follower.is_revoked(_claims("never")) is False
+        stats = follower.stats()
+        assert stats.local_checks == 1  # "never" answered without Redis
+        assert stats.redis_checks == 2  # filter hit confirmed in Redis
+    finally:
+        await follower.stop()
+
+    assert await r.ttl(f"{prefix}new") > 0
+
+
+@pytest.mark.asyncio
+async def test_stream_longer_than_capacity_is_loaded_once(redis_client):
+    r = redis_client
+    stream, prefix = "revoked-tokens:test-big", "revoked:test:"
+    await r.delete(stream)
+    revoker = RedisTokenRevocations(
+        r, retention_seconds=60, key_prefix=prefix, stream=stream
+    )
+    for i in range(5):
+        await revoker.revoke(_claims(f"t{i}"))
+
+    follower = RedisTokenRevocations(
+        r,
+        retention_seconds=60,
+        key_prefix=prefix,
+        stream=stream,
+        capacity=2,
+        block_ms=20,
+    )
+    loads = 0
+    load = follower._load
+
+    async def counting_load() -> None:
+        nonlocal loads
+        loads += 1
+        await load()
+
+    follower._load = counting_load
+    follower.start()
+    try:
+        assert await _wait_for(lambda: follower.stats().synced)
+        await asyncio.sleep(0.2)  # several follow iterations
+        assert loads == 1
+        assert follower.stats().entries == 5
+    finally:
+        await follower.stop()
+        await r.delete(stream, *(f"{prefix}t{i}" for i in range(5)))
+
+
+@pytest.mark.asyncio
+async def test_expired_token_is_not_recorded(redis_client):
+    revocations = RedisTokenRevocations(
+        redis_client, retention_seconds=60, key_prefix="revoked:test:"
+    )
+    expired = AccessClaims(user_id="u", token_id="gone", expires_at=1)
+
+    await revocations.revoke(expired)
+
+    assert await redis_client.exists("revoked:test:gone") == 0
@@ -0,0 +1,46 @@
+from app.infrastructure.security.access_tokens import SignedAccessTokens
+
+
+class _Clock:
+    def __init__(self, now: float = 1_000_000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_issue_and_verify_roundtrip():
+    tokens = SignedAccessTokens("s3cret", ttl_seconds=60, clock=_Clock())
+    token = tokens.issue("4f1c2b9e-0000-4000-8000-000000000001")
+
+    assert SignedAccessTokens.looks_signed(token)
+    claims = tokens.verify(token)
+    assert claims.user_id == "4f1c2b9e-0000-4000-8000-000000000001"
+    assert claims.expires_at == 1_000_060
+    assert claims.token_id != tokens.verify(tokens.issue("u")).token_id
+
+
+def test_tampered_or_foreign_tokens_are_rejected():
+    clock = _Clock()
+    tokens = SignedAccessTokens("s3cret", ttl_seconds=60, clock=clock)
+    token = tokens.issue("user-1")
+    prefix, user_id, token_id, expires_at, sig = token.split(".")
+
+    forged = ".".join([prefix, "user-2", token_id, expires_at, sig])
+    extended = ".".join([prefix, user_id, token_id, str(int(expires_at) + 999), sig])
+    assert tokens.verify(forged) is None
+    assert tokens.verify(extended) is None
+    assert SignedAccessTokens("other", clock=clock).verify(token) is None
+    assert tokens.verify("not-a-token") is None
+    assert not SignedAccessTokens.looks_signed("opaque-session-token")
+
+
+def test_expired_token_is_rejected():
+    clock = _Clock()
+    tokens = SignedAccessTokens("s3cret", ttl_seconds=60, clock=clock)
+    token = tokens.issue("user-1")
+
+    clock.now += 59
+    assert tokens.verify(token) is not None
+    clock.now += 1
+    assert tokens.verify(token) is None
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from app.infrastructure.security.hasher import (
+    AsyncPasswordHasher,
+    PasswordHasherOverloaded,
+)
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_in_thread_pool():
+    hasher = AsyncPasswordHasher(executor_kind="thread", max_workers=1, rounds=4)
+    try:
+        h = await hasher.hash("s3cret")
+        assert h.startswith("$2b$") or h.startswith("$2a$")
+        assert await hasher.verify("s3cret", h) is True
+        assert await hasher.verify("wrong", h) is False
+
+        stats = hasher.stats()
+        assert stats.submitted == 3
+        assert stats.completed == 3
+        assert stats.queue_depth == 0
+        assert stats.in_flight == 0
+    finally:
+        await hasher.aclose()
+
+
+@pytest.mark.asyncio
+async def test_queue_is_bounded_and_rejects_overflow():
+    hasher = AsyncPasswordHasher(
+        executor_kind="thread", max_workers=1, max_queue=1, rounds=4
+    )
+    try:
+        # 1 running + 1 waiting fill the pool; the 3rd is rejected up front
+        running = asyncio.create_task(hasher.hash("a"))
+        waiting = asyncio.create_task(hasher.hash("b"))
+        await asyncio.sleep(0)
+        assert hasher.stats().queue_depth == 1
+
+        with pytest.raises(PasswordHasherOverloaded):
+            await hasher.hash("c")
+
+        await asyncio.gather(running, waiting)
+        stats = hasher.stats()
+        assert stats.rejected == 1
+        assert stats.completed == 2
+        assert stats.max_wait_ms >= 0.0
+    finally:
+        await hasher.aclose()
+
+
+@pytest.mark.asyncio
+async def test_process_pool_round_trip():
+    hasher = AsyncPasswordHasher(executor_kind="process", max_workers=1, rounds=4)
+    try:
+        h = await hasher.hash("s3cret")
+        assert await hasher.verify("s3cret", h) is True
+    finally:
+        await hasher.aclose()
+
+
+def test_invalid_executor_kind():
+    with pytest.raises(ValueError):
+        AsyncPasswordHasher(executor_kind="fibers")  # type: ignore[arg-type]
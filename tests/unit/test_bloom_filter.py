@@ -0,0 +1,29 @@
+import pytest
+
+from app.infrastructure.security.bloom_filter import BloomFilter
+
+
+def test_added_items_are_always_found():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    items = [f"token-{i}" for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+
+    assert all(item in bloom for item in items)
+    assert len(bloom) == 1000
+
+
+def test_false_positive_rate_stays_near_target():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"token-{i}")
+
+    false_positives = sum(f"other-{i}" in bloom for i in range(10_000))
+    assert false_positives < 300  # 1% target, generous margin
+
+
+def test_invalid_parameters():
+    with pytest.raises(ValueError):
+        BloomFilter(capacity=0)
+    with pytest.raises(ValueError):
+        BloomFilter(capacity=10, error_rate=1.0)
@@ -1,6 +1,10 @@
 import base64
 
-from app.domain.services import make_code_digest, verify_code_digest
+from app.domain.services import (
+    make_code_digest,
+    make_keyed_code_digest,
+    verify_code_digest,
+)
 
 
 def test_digest_verification_success_and_failure():
@@ -24,3 +28,12 @@ def test_outputs_are_base64_strings():
 
 def test_invalid_base64_inputs_fail():
     assert verify_code_digest("1234", "!!!", "???") is False
+
+
+def test_keyed_digest_is_deterministic_and_bound_to_user_and_secret():
+    d = make_keyed_code_digest("1234", "user-1", "secret")
+    assert d == make_keyed_code_digest("1234", "user-1", "secret")
+    assert d != make_keyed_code_digest("1235", "user-1", "secret")
+    assert d != make_keyed_code_digest("1234", "user-2", "secret")
+    assert d != make_keyed_code_digest("1234", "user-1", "other")
+    assert len(base64.b64decode(d)) == 32
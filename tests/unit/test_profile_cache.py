@@ -0,0 +1,86 @@
+import pytest
+
+from app.application.profile_cache import ProfileCache
+from app.domain.entities import User
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _user(uid: str, status: str = "active") -> User:
+    return User(id=uid, email=f"{uid}@example.com", status=status)
+
+
+def test_miss_then_hit_returns_a_copy():
+    cache = ProfileCache(max_entries=10, ttl_seconds=30)
+
+    assert cache.get("u1") is None
+    assert cache.put(_user("u1"), version=cache.version) is True
+
+    first = cache.get("u1")
+    first.status = "locked"
+    assert cache.get("u1").status == "active"
+
+    stats = cache.stats()
+    assert (stats.size, stats.hits, stats.misses) == (1, 2, 1)
+
+
+def test_entries_expire_after_ttl():
+    clock = _Clock()
+    cache = ProfileCache(max_entries=10, ttl_seconds=5, clock=clock)
+    cache.put(_user("u1"), version=cache.version)
+
+    clock.now = 4.9
+    assert cache.get("u1") is not None
+    clock.now = 5.0
+    assert cache.get("u1") is None
+    assert cache.stats().expirations == 1
+    assert cache.stats().size == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ProfileCache(max_entries=2, ttl_seconds=30)
+    cache.put(_user("u1"), version=cache.version)
+    cache.put(_user("u2"), version=cache.version)
+    cache.get("u1")  # u2 is now the least recently used
+    cache.put(_user("u3"), version=cache.version)
+
+    assert cache.get("u2") is None
+    assert cache.get("u1") is not None
+    assert cache.get("u3") is not None
+    assert cache.stats().evictions == 1
+
+
+def test_fill_started_before_an_invalidation_is_dropped():
+    cache = ProfileCache(max_entries=10, ttl_seconds=30)
+    version = cache.version  # reader misses and goes to the DB ...
+
+    cache.invalidate("u1")  # ... while the user is activated elsewhere
+
+    assert cache.put(_user("u1", status="pending"), version=version) is False
+    assert cache.get("u1") is None
+    assert cache.put(_user("u1"), version=cache.version) is True
+
+
+def test_invalidate_and_clear_drop_entries():
+    cache = ProfileCache(max_entries=10, ttl_seconds=30)
+    cache.put(_user("u1"), version=cache.version)
+    cache.put(_user("u2"), version=cache.version)
+
+    cache.invalidate("u1")
+    assert cache.get("u1") is None
+    assert cache.get("u2") is not None
+
+    cache.clear()
+    assert cache.get("u2") is None
+    assert cache.stats().invalidations == 1
+
+
+def test_max_entries_must_be_positive():
+    with pytest.raises(ValueError):
+        ProfileCache(max_entries=0)
@@ -1,4 +1,7 @@
-from app.settings import get_settings
+import pytest
+from pydantic import ValidationError
+
+from app.settings import Settings, get_settings
 
 
 def test_get_settings_is_cached():
@@ -20,3 +23,20 @@ def test_env_overrides_and_cache_clear(monkeypatch):
     get_settings.cache_clear()
     s2 = get_settings()
     assert s2.code_ttl_seconds != 123  # back to default or another env value
+
+
+@pytest.mark.parametrize("secret", ["", "dev-access-token-secret"])
+def test_signed_tokens_refuse_a_missing_or_published_secret(secret):
+    with pytest.raises(ValidationError, match="ACCESS_TOKEN_SECRET"):
+        Settings(auth_token_mode="signed", access_token_secret=secret)
+
+
+def test_signed_tokens_accept_a_private_secret():
+    s = Settings(auth_token_mode="signed", access_token_secret="s3cret-0f-our-own")
+    assert s.access_token_secret == "s3cret-0f-our-own"
+
+
+def test_code_digest_secret_refuses_the_published_value():
+    with pytest.raises(ValidationError, match="CODE_DIGEST_SECRET"):
+        Settings(code_digest_secret="dev-code-digest-secret")
+    assert Settings(code_digest_secret="").code_digest_secret == ""
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from app.application.single_flight import SingleFlight
+
+
+class FakeLock:
+    def __init__(self, held: bool = False, released_after: bool = True):
+        self.held = held
+        self.released_after = released_after
+        self.released: list[str] = []
+
+    async def acquire(self, key: str, ttl_seconds: float) -> str | None:
+        return None if self.held else "token"
+
+    async def release(self, key: str, token: str) -> None:
+        self.released.append(key)
+
+    async def wait_released(self, key: str, timeout_seconds: float) -> bool:
+        return self.released_after
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    started = asyncio.Event()
+    gate = asyncio.Event()
+    runs = 0
+
+    async def work() -> str:
+        nonlocal runs
+        runs += 1
+        started.set()
+        await gate.wait()
+        return "done"
+
+    leader = asyncio.create_task(flight.do("k", work))
+    await started.wait()
+    followers = [asyncio.create_task(flight.do("k", work)) for _ in range(3)]
+    await asyncio.sleep(0)
+    assert flight.stats().in_flight == 1
+    gate.set()
+
+    assert await asyncio.gather(leader, *followers) == ["done"] * 4
+    assert runs == 1
+    stats = flight.stats()
+    assert (stats.executed, stats.coalesced, stats.in_flight) == (1, 3, 0)
+
+    # once finished, the key runs again
+    gate.set()
+    assert await flight.do("k", work) == "done"
+    assert runs == 2
+
+
+@pytest.mark.asyncio
+async def test_followers_share_the_exception():
+    flight = SingleFlight()
+    gate = asyncio.Event()
+
+    async def boom():
+        await gate.wait()
+        raise RuntimeError("db down")
+
+    tasks = [asyncio.create_task(flight.do("k", boom)) for _ in range(2)]
+    await asyncio.sleep(0)
+    gate.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert [str(r) for r in results] == ["db down", "db down"]
+    assert flight.stats().executed == 1
+
+
+@pytest.mark.asyncio
+async def test_different_keys_do_not_coalesce():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0)
+        return 1
+
+    await asyncio.gather(flight.do("a", work), flight.do("b", work))
+    assert flight.stats().executed == 2
+    assert flight.stats().coalesced == 0
+
+
+@pytest.mark.asyncio
+async def test_lock_held_elsewhere_waits_instead_of_running():
+    lock = FakeLock(held=True)
+    flight = SingleFlight(lock=lock)
+
+    async def work():
+        raise AssertionError("another process is running it")
+
+    assert await flight.do("k", work) is None
+    assert flight.stats().remote_coalesced == 1
+    assert flight.stats().executed == 0
+
+
+@pytest.mark.asyncio
+async def test_lock_wait_timeout_runs_anyway_and_free_lock_is_released():
+    flight = SingleFlight(lock=FakeLock(held=True, released_after=False))
+
+    async def work():
+        return "ran"
+
+    assert await flight.do("k", work) == "ran"
+    assert flight.stats().lock_timeouts == 1
+
+    lock = FakeLock()
+    flight = SingleFlight(lock=lock)
+    assert await flight.do("k", work) == "ran"
+    assert lock.released == ["k"]
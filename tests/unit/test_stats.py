@@ -0,0 +1,36 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+
+import pytest
+
+from app.stats import StatsLogger
+
+
+@dataclass(frozen=True)
+class _Stats:
+    hits: int
+    misses: int
+
+
+def test_snapshot_reads_every_source_and_skips_failing_ones():
+    def broken():
+        raise RuntimeError("gone")
+
+    stats = StatsLogger(
+        {"cache": lambda: _Stats(hits=3, misses=1), "raw": dict, "broken": broken}
+    )
+
+    assert stats.snapshot() == {"cache": {"hits": 3, "misses": 1}, "raw": {}}
+
+
+@pytest.mark.asyncio
+async def test_logs_one_line_per_interval(caplog):
+    stats = StatsLogger({"cache": lambda: _Stats(hits=1, misses=0)}, interval=0.01)
+    with caplog.at_level(logging.INFO, logger="app.stats"):
+        stats.start()
+        await asyncio.sleep(0.05)
+        await stats.stop()
+
+    lines = [r for r in caplog.records if r.getMessage() == "component stats"]
+    assert lines and lines[0].cache == {"hits": 1, "misses": 0}
@@ -1,7 +1,13 @@
 import pytest
 
 from app.application.activate_user import activate_user
-from app.domain.errors import InvalidActivationCode, InvalidCredentials
+from app.domain.errors import (
+    InvalidActivationCode,
+    InvalidCredentials,
+    InvalidStatusTransition,
+    TooManyAttempts,
+)
+from tests.fakes import FakeActivationCache, FakeProfileInvalidation
 
 
 @pytest.mark.asyncio
@@ -9,6 +15,7 @@ async def test_activate_user_happy_path(uow, cache, hash_password_stub):
     uow.db_users.password_hash_by_email["jeremy@example.com"] = "hashed-s3cret"
 
     def verify_password(password: str, password_hash: str) -> bool:
+        assert uow.active is False  # bcrypt runs outside any transaction
         return password_hash == "hashed-s3cret" and password == "s3cret"
 
     await activate_user(
@@ -20,7 +27,8 @@ async def test_activate_user_happy_path(uow, cache, hash_password_stub):
         verify_password=verify_password,
     )
 
-    assert uow.db_users.set_active_calls == ["u1"]
+    assert uow.db_users.activate_if_pending_calls == ["u1"]
+    assert uow.db_users.set_active_calls == []
     assert uow.committed is True
     assert uow.rolled_back is False
 
@@ -39,9 +47,8 @@ async def test_activate_user_invalid_credentials(uow, cache):
             verify_password=lambda password, password_hash: False,
         )
 
-    assert uow.db_users.set_active_calls == []
-    assert uow.committed is False
-    assert uow.rolled_back is True
+    assert uow.db_users.activate_if_pending_calls == []
+    assert uow.commits == 1  # the lookup only
     assert getattr(cache, "calls", []) == []
 
 
@@ -49,6 +56,9 @@ async def test_activate_user_invalid_credentials(uow, cache):
 async def test_activate_user_invalid_activation_code(uow, cache_bad):
     uow.db_users.password_hash_by_email["jeremy@example.com"] = "hashed-s3cret"
 
+    def verify_password(password: str, password_hash: str) -> bool:
+        raise AssertionError("a wrong code must be rejected before bcrypt")
+
     with pytest.raises(InvalidActivationCode):
         await activate_user(
             uow=uow,
@@ -56,13 +66,13 @@ async def test_activate_user_invalid_activation_code(uow, cache_bad):
             email=" Jeremy@Example.COM ",
             password="s3cret",
             code="1234",
-            verify_password=lambda password, password_hash: True,
+            verify_password=verify_password,
         )
 
-    assert uow.db_users.set_active_calls == []
-    assert uow.committed is False
-    assert uow.rolled_back is True
-    assert getattr(cache_bad, "calls", []) == [("u1", "1234")]
+    assert uow.db_users.activate_if_pending_calls == []
+    assert uow.commits == 1  # the lookup only
+    assert cache_bad.checks == [("u1", "1234", 5)]
+    assert cache_bad.calls == []  # nothing consumed
 
 
 @pytest.mark.asyncio
@@ -78,7 +88,90 @@ async def test_activate_user_no_user_found(uow, cache):
             verify_password=lambda password, password_hash: False,
         )
 
-    assert uow.db_users.set_active_calls == []
-    assert uow.committed is False
-    assert uow.rolled_back is True
+    assert uow.db_users.activate_if_pending_calls == []
+    assert uow.commits == 1  # the lookup only
     assert getattr(cache, "calls", []) == []
+
+
+@pytest.mark.asyncio
+async def test_activate_user_lost_race(uow, cache):
+    """The status changed between the read and the conditional UPDATE."""
+    uow.db_users.password_hash_by_email["jeremy@example.com"] = "hashed-s3cret"
+    uow.db_users.still_pending = False
+
+    with pytest.raises(InvalidStatusTransition):
+        await activate_user(
+            uow=uow,
+            activation_cache=cache,
+            email="jeremy@example.com",
+            password="s3cret",
+            code="1234",
+            verify_password=lambda password, password_hash: True,
+        )
+
+    assert uow.db_users.activate_if_pending_calls == ["u1"]
+    assert uow.commits == 1  # the lookup only
+    assert uow.rolled_back is True
+
+
+@pytest.mark.asyncio
+async def test_activate_user_too_many_attempts(uow):
+    uow.db_users.password_hash_by_email["jeremy@example.com"] = "hashed-s3cret"
+    cache = FakeActivationCache(check_result="exhausted")
+
+    def verify_password(password: str, password_hash: str) -> bool:
+        raise AssertionError("a burned code must be rejected before bcrypt")
+
+    with pytest.raises(TooManyAttempts):
+        await activate_user(
+            uow=uow,
+            activation_cache=cache,
+            email="jeremy@example.com",
+            password="s3cret",
+            code="0000",
+            verify_password=verify_password,
+            max_code_attempts=3,
+        )
+
+    assert cache.checks == [("u1", "0000", 3)]
+    assert uow.db_users.add_failed_attempts_calls == [("u1", 3)]
+    assert uow.db_users.activate_if_pending_calls == []
+    assert uow.committed is True
+
+
+@pytest.mark.asyncio
+async def test_activate_user_invalidates_cached_profile_after_commit(uow, cache):
+    uow.db_users.password_hash_by_email["jeremy@example.com"] = "hashed-s3cret"
+    invalidation = FakeProfileInvalidation(uow)
+
+    await activate_user(
+        uow=uow,
+        activation_cache=cache,
+        email="jeremy@example.com",
+        password="s3cret",
+        code="1234",
+        verify_password=lambda password, password_hash: True,
+        profile_invalidation=invalidation,
+    )
+
+    assert invalidation.invalidated == ["u1"]
+    assert invalidation.after_commit == [True]
+
+
+@pytest.mark.asyncio
+async def test_activate_user_failed_activation_does_not_invalidate(uow, cache_bad):
+    uow.db_users.password_hash_by_email["jeremy@example.com"] = "hashed-s3cret"
+    invalidation = FakeProfileInvalidation(uow)
+
+    with pytest.raises(InvalidActivationCode):
+        await activate_user(
+            uow=uow,
+            activation_cache=cache_bad,
+            email="jeremy@example.com",
+            password="s3cret",
+            code="0000",
+            verify_password=lambda password, password_hash: True,
+            profile_invalidation=invalidation,
+        )
+
+    assert invalidation.invalidated == []
@@ -1,6 +1,12 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
 import pytest
 
 from app.application.register_user import register_user
+from app.application.single_flight import SingleFlight
+from app.domain.services import make_keyed_code_digest
+from tests.fakes import FakeErroredResendThrottle, FakeResendThrottle
 
 
 @pytest.mark.asyncio
@@ -20,7 +26,7 @@ async def test_register_user_happy_path(uow, cache, hash_password_stub):
     assert len(cache.calls) == 1
     user_id, salt_b64, digest_b64, ttl = cache.calls[0]
     assert (
-        user_id == "u1"
+        user_id == uow.db_users.created_id
         and isinstance(salt_b64, str)
         and isinstance(digest_b64, str)
         and ttl == 60
@@ -34,8 +40,83 @@ async def test_register_user_happy_path(uow, cache, hash_password_stub):
 
     assert (
         uow.db_users.set_last_code_calls
-        and uow.db_users.set_last_code_calls[0][0] == "u1"
+        and uow.db_users.set_last_code_calls[0][0] == uow.db_users.created_id
+    )
+    assert uow.committed is True
+
+
+@pytest.mark.asyncio
+async def test_register_user_stores_code_before_transaction(
+    uow, cache, hash_password_stub
+):
+    in_tx_at_store: list[bool] = []
+    store = cache.store_hashed_code
+
+    async def recording_store(*args):
+        in_tx_at_store.append(uow.active)
+        await store(*args)
+
+    cache.store_hashed_code = recording_store
+
+    await register_user(
+        uow=uow,
+        activation_cache=cache,
+        email="jeremy@example.com",
+        password="s3cret",
+        hash_password=hash_password_stub,
+        fused_write=True,
+    )
+
+    # new user: the generated id is used for the row and the code key
+    assert in_tx_at_store == [False]
+    assert cache.calls[0][0] == uow.db_users.created_id
+    assert uow.committed is True
+
+
+@pytest.mark.asyncio
+async def test_register_user_existing_email_stores_code_under_existing_id(
+    uow, cache, hash_password_stub
+):
+    uow.db_users.existing_id = "u1"
+
+    await register_user(
+        uow=uow,
+        activation_cache=cache,
+        email="jeremy@example.com",
+        password="s3cret",
+        hash_password=hash_password_stub,
+        fused_write=True,
     )
+
+    # found by the lookup: one write, under the existing id, before the tx
+    assert [call[0] for call in cache.calls] == ["u1"]
+    assert uow.db_users.created_id == "u1"
+    assert uow.committed is True
+
+
+@pytest.mark.asyncio
+async def test_register_user_email_registered_since_lookup_stores_code_again(
+    uow, cache, hash_password_stub
+):
+    async def not_found(email: str):
+        return None
+
+    uow.db_users.existing_id = "u1"
+    uow.db_users.get_by_email_with_hash = not_found  # committed after the lookup
+
+    await register_user(
+        uow=uow,
+        activation_cache=cache,
+        email="jeremy@example.com",
+        password="s3cret",
+        hash_password=hash_password_stub,
+        fused_write=True,
+    )
+
+    assert len(cache.calls) == 2
+    assert cache.calls[0][0] != "u1"  # pre-generated id, left to expire
+    assert cache.calls[1][0] == "u1"
+    assert cache.calls[0][1:] == cache.calls[1][1:]  # same salt/digest/ttl
     assert uow.committed is True
 
 
@@ -53,6 +134,219 @@ async def test_register_user_error_in_activation_cache(
             code_ttl_seconds=60,
         )
 
+    # Redis is written before the transaction: only the lookup ran
+    assert uow.db_users.created_email is None
     assert len(uow.outbox.enqueues) == 0
-    assert uow.committed is False
-    assert uow.rolled_back is True
+    assert uow.commits == 1
+
+
+@pytest.mark.asyncio
+async def test_register_user_accepts_async_hasher(uow, cache):
+    async def hash_password(plain: str) -> str:
+        return "async-hashed-" + plain
+
+    await register_user(
+        uow=uow,
+        activation_cache=cache,
+        email="jeremy@example.com",
+        password="s3cret",
+        hash_password=hash_password,
+        code_ttl_seconds=60,
+    )
+
+    assert uow.db_users.created_hash == "async-hashed-s3cret"
+    assert uow.committed is True
+
+
+@pytest.mark.asyncio
+async def test_register_user_fused_write(uow, cache, hash_password_stub):
+    await register_user(
+        uow=uow,
+        activation_cache=cache,
+        email=" Jeremy@Example.COM ",
+        password="s3cret",
+        hash_password=hash_password_stub,
+        code_ttl_seconds=60,
+        fused_write=True,
+    )
+
+    assert uow.db_users.created_email == "jeremy@example.com"
+    assert uow.db_users.created_hash == "hashed-s3cret"
+    # one repository call covers the outbox row and last_code_sent_at
+    assert uow.outbox.enqueues == []
+    assert len(uow.db_users.fused_enqueues) == 1
+    topic, payload = uow.db_users.fused_enqueues[0]
+    assert topic == "user.verification_code"
+    assert "1234" in payload["body"]
+    assert uow.db_users.set_last_code_calls[0][0] == uow.db_users.created_id
+    assert cache.calls[0][0] == uow.db_users.created_id
+    assert uow.committed is True
+
+
+@pytest.mark.asyncio
+async def test_register_user_keyed_digest(uow, cache, hash_password_stub):
+    uow.db_users.existing_id = "u1"
+
+    await register_user(
+        uow=uow,
+        activation_cache=cache,
+        email="jeremy@example.com",
+        password="s3cret",
+        hash_password=hash_password_stub,
+        code_secret="secret",
+    )
+
+    # no salt; the stored digest is bound to the id it is stored under
+    [(user_id, salt, digest, _)] = cache.calls
+    assert user_id == "u1"
+    assert salt == ""
+    assert digest == make_keyed_code_digest("1234", "u1", "secret")
+
+
+@pytest.mark.asyncio
+async def test_register_user_resend_throttle_short_circuits(uow, cache):
+    throttle = FakeResendThrottle()
+    hashed = []
+
+    def hash_password(plain: str) -> str:
+        hashed.append(plain)
+        return "hashed-" + plain
+
+    for _ in range(3):
+        await register_user(
+            uow=uow,
+            activation_cache=cache,
+            email=" Jeremy@Example.COM ",
+            password="s3cret",
+            hash_password=hash_password,
+            resend_throttle=throttle,
+        )
+
+    # only the first call did any work
+    assert hashed == ["s3cret"]
+    assert len(cache.calls) == 1
+    assert len(uow.outbox.enqueues) == 1
+    assert throttle.open == {"jeremy@example.com"}
+
+
+@pytest.mark.asyncio
+async def test_register_user_failure_releases_resend_throttle(
+    uow, errored_cache, hash_password_stub
+):
+    throttle = FakeResendThrottle()
+
+    with pytest.raises(RuntimeError, match="Redis down"):
+        await register_user(
+            uow=uow,
+            activation_cache=errored_cache,
+            email="jeremy@example.com",
+            password="s3cret",
+            hash_password=hash_password_stub,
+            resend_throttle=throttle,
+        )
+
+    assert throttle.released == ["jeremy@example.com"]
+    assert throttle.open == set()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "sent_ago, registers", [(timedelta(seconds=10), False), (timedelta(hours=1), True)]
+)
+async def test_register_user_throttle_falls_back_to_last_code_sent_at(
+    uow, cache, hash_password_stub, sent_ago, registers
+):
+    uow.db_users.password_hash_by_email["jeremy@example.com"] = "hashed-s3cret"
+    uow.db_users.last_code_sent_at = datetime.now(timezone.utc) - sent_ago
+
+    await register_user(
+        uow=uow,
+        activation_cache=cache,
+        email="jeremy@example.com",
+        password="s3cret",
+        hash_password=hash_password_stub,
+        resend_throttle=FakeErroredResendThrottle(),
+        resend_throttle_seconds=60,
+    )
+
+    assert (uow.db_users.created_email is not None) is registers
+    assert (len(cache.calls) == 1) is registers
+    # the lookups commit too: a rollback drops prepared statements
+    assert uow.commits == (3 if registers else 1)
+
+
+@pytest.mark.asyncio
+async def test_register_user_single_flight_coalesces_double_submit(uow, cache):
+    flight = SingleFlight()
+    hashed = []
+
+    async def hash_password(plain: str) -> str:
+        hashed.append(plain)
+        await asyncio.sleep(0.01)
+        return "hashed-" + plain
+
+    def submit(email: str, password: str):
+        return register_user(
+            uow=uow,
+            activation_cache=cache,
+            email=email,
+            password=password,
+            hash_password=hash_password,
+            single_flight=flight,
+        )
+
+    await asyncio.gather(
+        submit("jeremy@example.com", "s3cret"),
+        submit("Jeremy@example.com", "other"),
+        submit("ana@example.com", "s3cret"),
+    )
+
+    # one run per email, whatever the password; another email is not coalesced
+    assert hashed == ["s3cret", "s3cret"]
+    assert len(uow.outbox.enqueues) == 2
+    assert flight.stats().coalesced == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("fused_write", [False, True])
+async def test_register_user_idempotency_key_flows_into_outbox(
+    uow, cache, hash_password_stub, fused_write
+):
+    await register_user(
+        uow=uow,
+        activation_cache=cache,
+        email="jeremy@example.com",
+        password="s3cret",
+        hash_password=hash_password_stub,
+        fused_write=fused_write,
+        idempotency_key="register:abc",
+    )
+
+    if fused_write:
+        assert uow.db_users.fused_idempotency_keys == ["register:abc"]
+    else:
+        assert uow.outbox.enqueues[0][2] == "register:abc"
+    assert uow.committed is True
+
+
+@pytest.mark.asyncio
+async def test_register_user_known_idempotency_key_writes_nothing(
+    uow, cache, hash_password_stub
+):
+    uow.db_users.existing_id = "u1"
+    await uow.outbox.enqueue(topic="t", payload={}, idempotency_key="register:abc")
+
+    await register_user(
+        uow=uow,
+        activation_cache=cache,
+        email="jeremy@example.com",
+        password="s3cret",
+        hash_password=hash_password_stub,
+        idempotency_key="register:abc",
+    )
+
+    assert uow.db_users.created_email is None
+    assert len(uow.outbox.enqueues) == 1
+    # the code emailed the first time is left alone
+    assert cache.calls == []
+    assert uow.commits == 1  # the lookup only